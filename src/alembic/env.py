@@ -9,7 +9,9 @@ from db_schema import Base
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
-config.set_main_option("sqlalchemy.url", os.environ["DB_URL"])
+# The application sets the URL of its database, the command line takes it from DB_URL.
+if not config.get_main_option("sqlalchemy.url"):
+    config.set_main_option("sqlalchemy.url", os.environ["DB_URL"])
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
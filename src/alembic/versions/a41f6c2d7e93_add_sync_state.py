@@ -0,0 +1,36 @@
+"""add sync_state
+
+Revision ID: a41f6c2d7e93
+Revises: e990284249e4
+Create Date: 2026-10-17 09:12:41.508312
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a41f6c2d7e93"
+down_revision = "e990284249e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "sync_state",
+        sa.Column("usage_point_id", sa.Text(), nullable=False),
+        sa.Column("dataset", sa.Text(), nullable=False),
+        sa.Column("watermark", sa.DateTime(), nullable=True),
+        sa.Column("gaps", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(
+            ["usage_point_id"],
+            ["usage_points.usage_point_id"],
+        ),
+        sa.PrimaryKeyConstraint("usage_point_id", "dataset"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("sync_state")
@@ -0,0 +1,32 @@
+"""add job_lease
+
+Revision ID: b7e3f9a2c5d1
+Revises: f4b8d2e6a1c7
+Create Date: 2026-10-17 21:14:52.640917
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b7e3f9a2c5d1"
+down_revision = "f4b8d2e6a1c7"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_lease",
+        sa.Column("usage_point_id", sa.Text(), nullable=False),
+        sa.Column("target", sa.Text(), nullable=False),
+        sa.Column("holder", sa.Text(), nullable=False),
+        sa.Column("acquired_at", sa.DateTime(), nullable=False),
+        sa.Column("expires_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("usage_point_id", "target"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("job_lease")
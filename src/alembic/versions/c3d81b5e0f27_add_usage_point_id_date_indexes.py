@@ -0,0 +1,39 @@
+"""add (usage_point_id, date) indexes
+
+Revision ID: c3d81b5e0f27
+Revises: a41f6c2d7e93
+Create Date: 2026-10-17 14:02:18.734190
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3d81b5e0f27"
+down_revision = "a41f6c2d7e93"
+branch_labels = None
+depends_on = None
+
+# PostgreSQL stores the included columns in the index (covering index), other backends ignore them.
+INDEXES = {
+    "consumption_daily": ["value"],
+    "consumption_detail": ["value", "interval"],
+    "production_daily": ["value"],
+    "production_detail": ["value", "interval"],
+    "consumption_daily_max_power": ["value"],
+}
+
+
+def upgrade() -> None:
+    for table, include in INDEXES.items():
+        op.create_index(
+            op.f(f"ix_{table}_usage_point_id_date"),
+            table,
+            ["usage_point_id", "date"],
+            unique=False,
+            postgresql_include=include,
+        )
+
+
+def downgrade() -> None:
+    for table in INDEXES:
+        op.drop_index(op.f(f"ix_{table}_usage_point_id_date"), table_name=table)
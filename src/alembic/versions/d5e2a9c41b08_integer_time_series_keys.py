@@ -0,0 +1,189 @@
+"""integer time-series keys
+
+Revision ID: d5e2a9c41b08
+Revises: c3d81b5e0f27
+Create Date: 2026-10-17 16:41:09.215873
+
+"""
+import calendar
+import hashlib
+import logging
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d5e2a9c41b08"
+down_revision = "c3d81b5e0f27"
+branch_labels = None
+depends_on = None
+
+# Rows copied per statement : the tables are converted chunk by chunk instead of being loaded in memory.
+CHUNK_SIZE = 5000
+
+# Columns of the time-series tables, besides `id` and `usage_point_id`.
+TABLES = {
+    "consumption_daily": {
+        "date": sa.DateTime,
+        "value": sa.Integer,
+        "blacklist": sa.Integer,
+        "fail_count": sa.Integer,
+    },
+    "consumption_detail": {
+        "date": sa.DateTime,
+        "value": sa.Integer,
+        "interval": sa.Integer,
+        "measure_type": sa.Text,
+        "blacklist": sa.Integer,
+        "fail_count": sa.Integer,
+    },
+    "production_daily": {
+        "date": sa.DateTime,
+        "value": sa.Integer,
+        "blacklist": sa.Integer,
+        "fail_count": sa.Integer,
+    },
+    "production_detail": {
+        "date": sa.DateTime,
+        "value": sa.Integer,
+        "interval": sa.Integer,
+        "measure_type": sa.Text,
+        "blacklist": sa.Integer,
+        "fail_count": sa.Integer,
+    },
+    "consumption_daily_max_power": {
+        "date": sa.DateTime,
+        "event_date": sa.DateTime,
+        "value": sa.Integer,
+        "blacklist": sa.Integer,
+        "fail_count": sa.Integer,
+    },
+}
+NULLABLE = ["event_date"]
+INCLUDE = {
+    "consumption_daily": ["value"],
+    "consumption_detail": ["value", "interval"],
+    "production_daily": ["value"],
+    "production_detail": ["value", "interval"],
+    "consumption_daily_max_power": ["value"],
+}
+
+
+def row_id(usage_point_key, date):
+    return (usage_point_key << 32) | calendar.timegm(date.timetuple())
+
+
+def md5_id(usage_point_id, date):
+    return hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+
+
+def columns(name):
+    return [sa.column(column, column_type) for column, column_type in TABLES[name].items()]
+
+
+def create_table(name, id_type):
+    table_columns = [
+        sa.Column("id", id_type, primary_key=True, autoincrement=False),
+        sa.Column("usage_point_id", sa.Text(), nullable=False),
+    ]
+    table_columns += [
+        sa.Column(column, column_type(), nullable=column in NULLABLE) for column, column_type in TABLES[name].items()
+    ]
+    op.create_table(
+        f"_{name}",
+        *table_columns,
+        sa.ForeignKeyConstraint(["usage_point_id"], ["usage_points.usage_point_id"]),
+    )
+
+
+def copy_table(name, new_id, id_type):
+    """Copy `name` into `_name` one chunk at a time, the rows keep their values and get the key built by `new_id`."""
+    bind = op.get_bind()
+    source = sa.table(name, sa.column("id"), sa.column("usage_point_id", sa.Text), *columns(name))
+    target = sa.table(f"_{name}", sa.column("id", id_type), sa.column("usage_point_id", sa.Text), *columns(name))
+    usage_points = sa.table("usage_points", sa.column("usage_point_id", sa.Text), sa.column("id", sa.Integer))
+    if bind.dialect.name == "postgresql":
+        statement = postgresql_insert(target).on_conflict_do_nothing(index_elements=["id"])
+    else:
+        statement = sqlite_insert(target).on_conflict_do_nothing(index_elements=["id"])
+
+    query = (
+        sa.select(source, usage_points.c.id.label("usage_point_key"))
+        .join(usage_points, usage_points.c.usage_point_id == source.c.usage_point_id)
+        .order_by(source.c.id)
+        .limit(CHUNK_SIZE)
+    )
+    total = bind.execute(sa.select(sa.func.count()).select_from(source)).scalar()
+    copied = 0
+    last_id = None
+    start = time.time()
+    while True:
+        chunk = query if last_id is None else query.where(source.c.id > last_id)
+        rows = bind.execute(chunk).mappings().all()
+        if not rows:
+            break
+        bind.execute(
+            statement,
+            [
+                {
+                    **{column: row[column] for column in TABLES[name]},
+                    "id": new_id(row),
+                    "usage_point_id": row["usage_point_id"],
+                }
+                for row in rows
+            ],
+        )
+        copied += len(rows)
+        last_id = rows[-1]["id"]
+        speed = round(copied / max(time.time() - start, 0.001))
+        logging.info(f" - {name} : {copied}/{total} lignes ({speed} lignes/s)")
+    if copied != total:
+        logging.warning(f" - {name} : {total - copied} lignes sans point de livraison ignorées")
+
+
+def swap_table(name, legacy):
+    op.drop_table(name)
+    op.rename_table(f"_{name}", name)
+    op.create_index(
+        op.f(f"ix_{name}_usage_point_id_date"),
+        name,
+        ["usage_point_id", "date"],
+        unique=False,
+        postgresql_include=INCLUDE[name],
+    )
+    if legacy:
+        op.create_index(op.f(f"ix_{name}_id"), name, ["id"], unique=True)
+        op.create_index(op.f(f"ix_{name}_usage_point_id"), name, ["usage_point_id"], unique=False)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    with op.batch_alter_table("usage_points") as batch_op:
+        batch_op.add_column(sa.Column("id", sa.Integer(), nullable=True))
+        batch_op.create_unique_constraint("uq_usage_points_id", ["id"])
+    usage_points = sa.table("usage_points", sa.column("usage_point_id", sa.Text), sa.column("id", sa.Integer))
+    for key, usage_point_id in enumerate(
+        bind.execute(sa.select(usage_points.c.usage_point_id).order_by(usage_points.c.usage_point_id)).scalars(),
+        start=1,
+    ):
+        bind.execute(usage_points.update().where(usage_points.c.usage_point_id == usage_point_id).values(id=key))
+
+    id_type = sa.BigInteger().with_variant(sa.Integer(), "sqlite")
+    for name in TABLES:
+        create_table(name, id_type)
+        copy_table(name, lambda row: row_id(row["usage_point_key"], row["date"]), id_type)
+        swap_table(name, legacy=False)
+
+
+def downgrade() -> None:
+    for name in TABLES:
+        create_table(name, sa.String())
+        copy_table(name, lambda row: md5_id(row["usage_point_id"], row["date"]), sa.String)
+        swap_table(name, legacy=True)
+    with op.batch_alter_table("usage_points") as batch_op:
+        batch_op.drop_constraint("uq_usage_points_id", type_="unique")
+        batch_op.drop_column("id")
@@ -0,0 +1,42 @@
+"""add rollup
+
+Revision ID: e8b47c3a9d15
+Revises: d5e2a9c41b08
+Create Date: 2026-10-17 18:22:37.901442
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e8b47c3a9d15"
+down_revision = "d5e2a9c41b08"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rollup",
+        sa.Column("usage_point_id", sa.Text(), nullable=False),
+        sa.Column("measurement_direction", sa.Text(), nullable=False),
+        sa.Column("period", sa.Text(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("value", sa.Float(), nullable=False),
+        sa.Column("hc", sa.Float(), nullable=False),
+        sa.Column("hp", sa.Float(), nullable=False),
+        sa.Column("tempo_hc_morning", sa.Float(), nullable=False),
+        sa.Column("tempo_hp", sa.Float(), nullable=False),
+        sa.Column("tempo_hc_evening", sa.Float(), nullable=False),
+        sa.Column("count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["usage_point_id"],
+            ["usage_points.usage_point_id"],
+        ),
+        sa.PrimaryKeyConstraint("usage_point_id", "measurement_direction", "period", "date"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rollup")
@@ -0,0 +1,111 @@
+"""partition detail tables by month on PostgreSQL
+
+Revision ID: f4b8d2e6a1c7
+Revises: e8b47c3a9d15
+Create Date: 2026-10-17 20:05:43.118204
+
+"""
+import logging
+from datetime import datetime
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "f4b8d2e6a1c7"
+down_revision = "e8b47c3a9d15"
+branch_labels = None
+depends_on = None
+
+# Only PostgreSQL has declarative partitioning, the SQLite tables are left as they are.
+TABLES = ["consumption_detail", "production_detail"]
+COLUMNS = ["id", "usage_point_id", "date", "value", "interval", "measure_type", "blacklist", "fail_count"]
+# Partitions created in advance, after the current month.
+AHEAD_MONTHS = 3
+
+
+def add_months(moment, count):
+    index = moment.year * 12 + moment.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def months(begin, end):
+    month = add_months(begin, 0)
+    while month <= end:
+        yield month
+        month = add_months(month, 1)
+
+
+def create_table(name, partitioned):
+    columns = [
+        sa.Column("id", sa.BigInteger(), nullable=False, autoincrement=False),
+        sa.Column("usage_point_id", sa.Text(), nullable=False),
+        sa.Column("date", sa.DateTime(), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.Column("interval", sa.Integer(), nullable=False),
+        sa.Column("measure_type", sa.Text(), nullable=False),
+        sa.Column("blacklist", sa.Integer(), nullable=False),
+        sa.Column("fail_count", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(["usage_point_id"], ["usage_points.usage_point_id"]),
+    ]
+    if partitioned:
+        # The primary key of a partitioned table must contain the partition key.
+        op.create_table(
+            name,
+            *columns,
+            sa.PrimaryKeyConstraint("id", "date", name=f"pk_{name}"),
+            postgresql_partition_by="RANGE (date)",
+        )
+    else:
+        op.create_table(name, *columns, sa.PrimaryKeyConstraint("id"))
+
+
+def create_index(name):
+    op.create_index(
+        op.f(f"ix_{name}_usage_point_id_date"),
+        name,
+        ["usage_point_id", "date"],
+        unique=False,
+        postgresql_include=["value", "interval"],
+    )
+
+
+def copy_rows(source, target):
+    columns = ", ".join(f'"{column}"' for column in COLUMNS)
+    result = op.get_bind().execute(sa.text(f"INSERT INTO {target} ({columns}) SELECT {columns} FROM {source}"))
+    logging.info(f" - {target} : {result.rowcount} lignes")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql":
+        return
+    now = datetime.now()
+    for name in TABLES:
+        op.rename_table(name, f"{name}_unpartitioned")
+        op.drop_index(op.f(f"ix_{name}_usage_point_id_date"), table_name=f"{name}_unpartitioned")
+        create_table(name, partitioned=True)
+        first, last = bind.execute(sa.text(f"SELECT min(date), max(date) FROM {name}_unpartitioned")).one()
+        for month in months(first or now, add_months(max(last or now, now), AHEAD_MONTHS)):
+            op.execute(
+                f"CREATE TABLE {name}_{month.strftime('%Y_%m')} PARTITION OF {name} "
+                f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+            )
+        copy_rows(f"{name}_unpartitioned", name)
+        op.drop_table(f"{name}_unpartitioned")
+        create_index(name)
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != "postgresql":
+        return
+    for name in TABLES:
+        op.rename_table(name, f"{name}_partitioned")
+        op.drop_index(op.f(f"ix_{name}_usage_point_id_date"), table_name=f"{name}_partitioned")
+        create_table(f"_{name}", partitioned=False)
+        copy_rows(f"{name}_partitioned", f"_{name}")
+        # Dropping the partitioned table drops its partitions.
+        op.drop_table(f"{name}_partitioned")
+        op.rename_table(f"_{name}", name)
+        create_index(name)
@@ -8,3 +8,6 @@ cycle_minimun = 3600
 
 DAILY_MAX_DAYS = 1094
 DETAIL_MAX_DAYS = 728
+
+# Nombre d'appels gardés pour les données récentes lorsque le quota de la passerelle est presque atteint.
+QUOTA_RECENT_RESERVE = 10
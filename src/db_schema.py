@@ -1,11 +1,15 @@
 """This module defines the database schema for the application."""
 
-from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text
+from sqlalchemy import BigInteger, Boolean, Column, DateTime, Float, ForeignKey, Index, Integer, Text
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 
 Base = declarative_base()  # Required
 
+# Primary key of the time-series tables: (usage point id << 32) | epoch seconds of the reading.
+# INTEGER on SQLite so that the key is the rowid of the table and needs no index of its own.
+RowId = BigInteger().with_variant(Integer, "sqlite")
+
 
 class Config(Base):
     __tablename__ = "config"
@@ -25,6 +29,7 @@ class UsagePoints(Base):
     __tablename__ = "usage_points"
 
     usage_point_id = Column(Text, primary_key=True, unique=True, nullable=False, index=True)
+    id = Column(Integer, nullable=True, unique=True)
 
     name = Column(Text, nullable=False)
     cache = Column(Boolean, nullable=False, default=False)
@@ -80,6 +85,7 @@ class UsagePoints(Base):
         return (
             f"UsagePoints("
             f"usage_point_id={self.usage_point_id!r}, "
+            f"id={self.id!r}, "
             f"name={self.name!r}, "
             f"cache={self.cache!r}, "
             f"consumption={self.consumption!r}, "
@@ -208,9 +214,12 @@ class Contracts(Base):
 class ConsumptionDaily(Base):
     __tablename__ = "consumption_daily"
     # __table_args__ = {'sqlite_autoincrement': True}
+    __table_args__ = (
+        Index("ix_consumption_daily_usage_point_id_date", "usage_point_id", "date", postgresql_include=["value"]),
+    )
 
-    id = Column(String, primary_key=True, index=True, unique=True)
-    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
+    id = Column(RowId, primary_key=True, autoincrement=False)
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False)
     date = Column(DateTime, nullable=False)
     value = Column(Integer, nullable=False)
     blacklist = Column(Integer, nullable=False, default=0)
@@ -234,9 +243,17 @@ class ConsumptionDaily(Base):
 class ConsumptionDetail(Base):
     __tablename__ = "consumption_detail"
     # __table_args__ = {'sqlite_autoincrement': True}
+    __table_args__ = (
+        Index(
+            "ix_consumption_detail_usage_point_id_date",
+            "usage_point_id",
+            "date",
+            postgresql_include=["value", "interval"],
+        ),
+    )
 
-    id = Column(String, primary_key=True, index=True, unique=True)
-    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
+    id = Column(RowId, primary_key=True, autoincrement=False)
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False)
     date = Column(DateTime, nullable=False)
     value = Column(Integer, nullable=False)
     interval = Column(Integer, nullable=False)
@@ -264,9 +281,12 @@ class ConsumptionDetail(Base):
 class ProductionDaily(Base):
     __tablename__ = "production_daily"
     # __table_args__ = {'sqlite_autoincrement': True}
+    __table_args__ = (
+        Index("ix_production_daily_usage_point_id_date", "usage_point_id", "date", postgresql_include=["value"]),
+    )
 
-    id = Column(String, primary_key=True, index=True, unique=True)
-    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
+    id = Column(RowId, primary_key=True, autoincrement=False)
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False)
     date = Column(DateTime, nullable=False)
     value = Column(Integer, nullable=False)
     blacklist = Column(Integer, nullable=False, default=0)
@@ -290,9 +310,17 @@ class ProductionDaily(Base):
 class ProductionDetail(Base):
     __tablename__ = "production_detail"
     # __table_args__ = {'sqlite_autoincrement': True}
+    __table_args__ = (
+        Index(
+            "ix_production_detail_usage_point_id_date",
+            "usage_point_id",
+            "date",
+            postgresql_include=["value", "interval"],
+        ),
+    )
 
-    id = Column(String, primary_key=True, index=True, unique=True)
-    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
+    id = Column(RowId, primary_key=True, autoincrement=False)
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False)
     date = Column(DateTime, nullable=False)
     value = Column(Integer, nullable=False)
     interval = Column(Integer, nullable=False)
@@ -342,9 +370,17 @@ class Statistique(Base):
 class ConsumptionDailyMaxPower(Base):
     __tablename__ = "consumption_daily_max_power"
     # __table_args__ = {'sqlite_autoincrement': True}
+    __table_args__ = (
+        Index(
+            "ix_consumption_daily_max_power_usage_point_id_date",
+            "usage_point_id",
+            "date",
+            postgresql_include=["value"],
+        ),
+    )
 
-    id = Column(String, primary_key=True, index=True, unique=True)
-    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True)
+    id = Column(RowId, primary_key=True, autoincrement=False)
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), nullable=False)
     date = Column(DateTime, nullable=False)
     event_date = Column(DateTime, nullable=True)
     value = Column(Integer, nullable=False)
@@ -408,3 +444,78 @@ class Ecowatt(Base):
             f"detail={self.detail!r}, "
             f")"
         )
+
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), primary_key=True)
+    dataset = Column(Text, primary_key=True)
+    watermark = Column(DateTime, nullable=True)
+    gaps = Column(Text, nullable=False, default="[]")
+    updated_at = Column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return (
+            f"SyncState("
+            f"usage_point_id={self.usage_point_id!r}, "
+            f"dataset={self.dataset!r}, "
+            f"watermark={self.watermark!r}, "
+            f"gaps={self.gaps!r}, "
+            f"updated_at={self.updated_at!r}"
+            f")"
+        )
+
+
+class Rollup(Base):
+    __tablename__ = "rollup"
+
+    usage_point_id = Column(Text, ForeignKey("usage_points.usage_point_id"), primary_key=True)
+    measurement_direction = Column(Text, primary_key=True)
+    period = Column(Text, primary_key=True)
+    date = Column(DateTime, primary_key=True)
+    value = Column(Float, nullable=False, default=0)
+    hc = Column(Float, nullable=False, default=0)
+    hp = Column(Float, nullable=False, default=0)
+    tempo_hc_morning = Column(Float, nullable=False, default=0)
+    tempo_hp = Column(Float, nullable=False, default=0)
+    tempo_hc_evening = Column(Float, nullable=False, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (
+            f"Rollup("
+            f"usage_point_id={self.usage_point_id!r}, "
+            f"measurement_direction={self.measurement_direction!r}, "
+            f"period={self.period!r}, "
+            f"date={self.date!r}, "
+            f"value={self.value!r}, "
+            f"hc={self.hc!r}, "
+            f"hp={self.hp!r}, "
+            f"tempo_hc_morning={self.tempo_hc_morning!r}, "
+            f"tempo_hp={self.tempo_hp!r}, "
+            f"tempo_hc_evening={self.tempo_hc_evening!r}, "
+            f"count={self.count!r}"
+            f")"
+        )
+
+
+class JobLease(Base):
+    __tablename__ = "job_lease"
+
+    usage_point_id = Column(Text, primary_key=True)
+    target = Column(Text, primary_key=True)
+    holder = Column(Text, nullable=False)
+    acquired_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return (
+            f"JobLease("
+            f"usage_point_id={self.usage_point_id!r}, "
+            f"target={self.target!r}, "
+            f"holder={self.holder!r}, "
+            f"acquired_at={self.acquired_at!r}, "
+            f"expires_at={self.expires_at!r}"
+            f")"
+        )
@@ -80,10 +80,48 @@ class Ajax:
         title(f"[{self.usage_point_id}] Calcul des coûts par type d'abonnements.")
         return Stat(self.usage_point_id, "consumption").generate_price()
 
+    def rebuild_price(self):
+        title(f"[{self.usage_point_id}] Recalcul complet des coûts par type d'abonnements.")
+        Stat(self.usage_point_id, "consumption").generate_price(full=True)
+        if getattr(self.usage_point_config, "production_detail", False):
+            Stat(self.usage_point_id, "production").generate_price(full=True)
+        return {
+            "error": "false",
+            "notif": "Comparateur d'abonnements recalculé.",
+        }
+
     def get_price(self):
         title(f"[{self.usage_point_id}] Retourne le résultat du comparateur d'abonnements.")
         return Stat(self.usage_point_id, "consumption").get_price()
 
+    def rebuild_rollup(self):
+        title(f"[{self.usage_point_id}] Reconstruction des agrégats des données détaillées.")
+        days = self.db.rebuild_rollup(self.usage_point_id)
+        return {
+            "error": "false",
+            "notif": f"{days} jours recalculés.",
+        }
+
+    def check_rollup(self):
+        title(f"[{self.usage_point_id}] Vérification des agrégats par rapport aux données détaillées.")
+        errors = self.db.check_rollup(self.usage_point_id)
+        for error in errors:
+            logging.warning(
+                f" => {error['measurement_direction']} {error['period']} {error['date']} : "
+                f"attendu {error['expected']}, enregistré {error['stored']}"
+            )
+        if errors:
+            return {
+                "error": "true",
+                "notif": f"{len(errors)} agrégats incohérents, relancez leur reconstruction.",
+                "result": errors,
+            }
+        return {
+            "error": "false",
+            "notif": "Les agrégats sont cohérents avec les données détaillées.",
+            "result": [],
+        }
+
     def reset_all_data(self):
         title(f"[{self.usage_point_id}] Reset de la consommation journalière.")
         Daily(
@@ -152,6 +190,14 @@ class Ajax:
             "notif": "Toutes les données ont été supprimées.",
         }
 
+    def unlock(self):
+        title("Libération des baux d'importation de tous les jobs.")
+        locked = self.db.unlock(force=True)
+        return {
+            "error": str(locked).lower(),
+            "notif": "Baux d'importation libérés.",
+        }
+
     def reset_gateway(self):
         title(f"[{self.usage_point_id}] Reset du cache de la passerelle.")
         return Cache(headers=self.headers, usage_point_id=self.usage_point_id).reset()
@@ -404,6 +450,8 @@ class Ajax:
             }
 
     def import_data(self, target=None):
+        # Forced import : revalidate the whole history instead of starting from the sync watermark.
+        self.db.rewind_sync_state(self.usage_point_id, target)
         result = Job(self.usage_point_id).job_import_data(wait=False, target=target)
         if not result:
             return {
@@ -0,0 +1,202 @@
+"""Columnar archive of the cold detail readings, one compressed file per usage point, direction and month."""
+import calendar
+import json
+import logging
+import os
+import struct
+import sys
+import zlib
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from models.partition import add_months
+
+ArchiveRow = namedtuple("ArchiveRow", ["date", "value", "interval", "measure_type", "blacklist", "fail_count"])
+
+MAGIC = b"MEDA"
+VERSION = 1
+EPOCH = datetime(1970, 1, 1)
+# Type code and size of each column, the dates are stored as the difference in seconds with the previous reading.
+COLUMNS = {
+    "date": ("q", 8),
+    "value": ("q", 8),
+    "interval": ("h", 2),
+    "measure_type": ("B", 1),
+    "blacklist": ("B", 1),
+    "fail_count": ("h", 2),
+}
+
+
+def encode(rows):
+    """Encode readings sorted by date in the archive format.
+
+    Each column is packed in a little-endian array and the columns are compressed together with zlib, the readings of
+    a month shrink to a few kilobytes.
+
+    Args:
+        rows (list): The readings, with their `date`, `value`, `interval`, `measure_type`, `blacklist` and
+            `fail_count`.
+
+    Returns:
+        bytes: The content of the archive file.
+    """
+    measure_types = sorted({row.measure_type for row in rows})
+    timestamps = [calendar.timegm(row.date.timetuple()) for row in rows]
+    values = {
+        "date": [timestamp - previous for timestamp, previous in zip(timestamps, [0] + timestamps)],
+        "value": [row.value for row in rows],
+        "interval": [row.interval for row in rows],
+        "measure_type": [measure_types.index(row.measure_type) for row in rows],
+        "blacklist": [row.blacklist for row in rows],
+        "fail_count": [row.fail_count for row in rows],
+    }
+    body = b""
+    for column, (typecode, size) in COLUMNS.items():
+        data = array(typecode, values[column])
+        if data.itemsize != size:
+            raise ValueError(f"Taille inattendue pour la colonne {column} : {data.itemsize}")
+        if sys.byteorder == "big":
+            data.byteswap()
+        body += data.tobytes()
+    header = json.dumps({"version": VERSION, "rows": len(rows), "measure_types": measure_types}).encode("utf-8")
+    return MAGIC + struct.pack("<I", len(header)) + header + zlib.compress(body)
+
+
+def decode_header(content):
+    """Return the header of an archive file and the offset of its compressed columns."""
+    if content[:4] != MAGIC:
+        raise ValueError("Fichier d'archive invalide")
+    (length,) = struct.unpack("<I", content[4:8])
+    header = json.loads(content[8 : 8 + length])
+    if header["version"] != VERSION:
+        raise ValueError(f"Version d'archive non supportée : {header['version']}")
+    return header, 8 + length
+
+
+def decode(content):
+    """Decode the content of an archive file.
+
+    Args:
+        content (bytes): The content written by `encode`.
+
+    Returns:
+        list: The readings as ArchiveRow, sorted by date.
+    """
+    header, offset = decode_header(content)
+    body = zlib.decompress(content[offset:])
+    rows = header["rows"]
+    columns = {}
+    position = 0
+    for column, (typecode, size) in COLUMNS.items():
+        data = array(typecode)
+        data.frombytes(body[position : position + rows * size])
+        if sys.byteorder == "big":
+            data.byteswap()
+        columns[column] = data
+        position += rows * size
+    dates = [EPOCH + timedelta(seconds=timestamp) for timestamp in accumulate(columns["date"])]
+    measure_types = [header["measure_types"][index] for index in columns["measure_type"]]
+    return [
+        ArchiveRow(*row)
+        for row in zip(
+            dates,
+            columns["value"],
+            columns["interval"],
+            measure_types,
+            columns["blacklist"],
+            columns["fail_count"],
+        )
+    ]
+
+
+class Archive:
+    """The archive files of the detail readings, stored in `<path>/<usage point>/<direction>/<YYYY-MM>.meda`."""
+
+    def __init__(self, path):
+        self.path = path
+        # Number of archived readings per month, indexed by (usage point, direction), loaded on first use.
+        self.index = {}
+
+    def file(self, usage_point_id, measurement_direction, month):
+        return os.path.join(self.path, usage_point_id, measurement_direction, f"{month.strftime('%Y-%m')}.meda")
+
+    def months(self, usage_point_id, measurement_direction):
+        """Return the number of archived readings of each month of a usage point.
+
+        Returns:
+            dict: The number of readings, indexed by the first moment of the month.
+        """
+        key = (usage_point_id, measurement_direction)
+        if key not in self.index:
+            self.index[key] = {}
+            directory = os.path.join(self.path, usage_point_id, measurement_direction)
+            if os.path.isdir(directory):
+                for name in os.listdir(directory):
+                    if name.endswith(".meda"):
+                        month = datetime.strptime(name[: -len(".meda")], "%Y-%m")
+                        with open(os.path.join(directory, name), "rb") as file:
+                            content = file.read(4096)
+                        self.index[key][month] = decode_header(content)[0]["rows"]
+        return self.index[key]
+
+    def count(self, usage_point_id, measurement_direction):
+        return sum(self.months(usage_point_id, measurement_direction).values())
+
+    def read(self, usage_point_id, measurement_direction, month):
+        with open(self.file(usage_point_id, measurement_direction, month), "rb") as file:
+            return decode(file.read())
+
+    def write(self, usage_point_id, measurement_direction, month, rows):
+        """Write the readings of a month, replacing its archive file if it exists."""
+        filename = self.file(usage_point_id, measurement_direction, month)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(f"{filename}.tmp", "wb") as file:
+            file.write(encode(rows))
+        os.replace(f"{filename}.tmp", filename)
+        self.months(usage_point_id, measurement_direction)[month] = len(rows)
+
+    def delete(self, usage_point_id, measurement_direction=None, month=None):
+        """Delete the archive of a month, of a direction or of a whole usage point."""
+        for direction in [measurement_direction] if measurement_direction else ["consumption", "production"]:
+            months = self.months(usage_point_id, direction)
+            for archived in [month] if month else list(months):
+                if archived in months:
+                    logging.debug(f"Suppression de l'archive {self.file(usage_point_id, direction, archived)}")
+                    os.remove(self.file(usage_point_id, direction, archived))
+                    del months[archived]
+
+    def rows(self, usage_point_id, measurement_direction, begin=None, end=None, descending=False):
+        """Yield the archived readings between `begin` and `end` (both included), one month file at a time.
+
+        Args:
+            usage_point_id (str): The usage point.
+            measurement_direction (str): "consumption" or "production".
+            begin (datetime, optional): The first date, the first reading if None. Defaults to None.
+            end (datetime, optional): The last date, the last reading if None. Defaults to None.
+            descending (bool, optional): Yield the most recent readings first. Defaults to False.
+
+        Yields:
+            ArchiveRow: The readings, sorted by date.
+        """
+        months = [
+            month
+            for month in self.months(usage_point_id, measurement_direction)
+            if (begin is None or add_months(month, 1) > begin) and (end is None or month <= end)
+        ]
+        for month in sorted(months, reverse=descending):
+            rows = self.read(usage_point_id, measurement_direction, month)
+            for row in reversed(rows) if descending else rows:
+                if (begin is None or row.date >= begin) and (end is None or row.date <= end):
+                    yield row
+
+    def bounds(self, usage_point_id, measurement_direction):
+        """Return the dates of the first and last archived readings, (None, None) without archive."""
+        months = sorted(self.months(usage_point_id, measurement_direction))
+        if not months:
+            return None, None
+        return (
+            self.read(usage_point_id, measurement_direction, months[0])[0].date,
+            self.read(usage_point_id, measurement_direction, months[-1])[-1].date,
+        )
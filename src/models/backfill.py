@@ -0,0 +1,143 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from init import CONFIG, DB
+from models.quota import Quota
+
+# The gateway calls in flight per token, shared by the backfills of every usage point.
+TOKEN_LIMITS = {}
+TOKEN_LIMITS_LOCK = threading.Lock()
+
+
+def concurrency_per_token():
+    """Return the number of gateway calls allowed at the same time with the same token.
+
+    Returns:
+        int: `import.concurrency_per_token`, 1 by default.
+    """
+    import_config = CONFIG.import_config() or {}
+    return max(int(import_config.get("concurrency_per_token", 1)), 1)
+
+
+def backfill_workers():
+    """Return the number of windows fetched at the same time during a backfill.
+
+    Returns:
+        int: The size of the worker pool (`import.backfill_workers`, 4 by default), at most the calls allowed per
+            token.
+    """
+    import_config = CONFIG.import_config() or {}
+    return max(min(int(import_config.get("backfill_workers", 4)), concurrency_per_token()), 1)
+
+
+def token_limit(token):
+    """Return the semaphore of the gateway calls of a token."""
+    limit = concurrency_per_token()
+    with TOKEN_LIMITS_LOCK:
+        if (token, limit) not in TOKEN_LIMITS:
+            TOKEN_LIMITS[(token, limit)] = threading.BoundedSemaphore(limit)
+        return TOKEN_LIMITS[(token, limit)]
+
+
+class Backfill:
+    """Fetch the windows of a dataset over a bounded pool of workers.
+
+    The first window (the most recent data) is fetched alone, then the older windows are fanned out over the worker
+    pool. A 403 "exit", a 400/409 or a deferred window stops every worker before its next window, and the readings are
+    merged back in date order whatever the completion order was.
+
+    Example usage:
+        windows = [(begin, end), ...]  # most recent first
+        result = Backfill(usage_point_id, detail.load).run(windows)
+    """
+
+    def __init__(self, usage_point_id, fetch, workers=None, date_format="%Y-%m-%d"):
+        self.config = CONFIG
+        self.db = DB
+        self.usage_point_id = usage_point_id
+        self.fetch = fetch
+        self.workers = workers if workers is not None else backfill_workers()
+        self.date_format = date_format
+        self.stop = threading.Event()
+        self.failed = False
+        self.done = 0
+        self.total = 0
+        self.lock = threading.Lock()
+        usage_point = self.db.get_usage_point(usage_point_id)
+        self.token_limit = token_limit(getattr(usage_point, "token", None) or usage_point_id)
+
+    def run(self, windows):
+        """Fetch the windows and return their readings.
+
+        Args:
+            windows (list): The (begin, end) tuples to fetch, most recent first.
+
+        Returns:
+            list: The readings of every window, sorted by date.
+        """
+        self.total = len(windows)
+        responses = [None] * len(windows)
+        if windows:
+            responses[0] = self.window(windows[0], Quota.RECENT)
+        if len(windows) > 1 and not self.stop.is_set():
+            if self.workers > 1:
+                logging.info(f" => Récupération de {len(windows) - 1} périodes avec {self.workers} workers.")
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self.window, window, Quota.BACKFILL) for window in windows[1:]]
+                for index, future in enumerate(futures, start=1):
+                    responses[index] = future.result()
+
+        result = []
+        for response in reversed(responses):
+            if isinstance(response, list):
+                result.extend(sorted(response, key=lambda reading: reading["date"]))
+        return result
+
+    @property
+    def complete(self):
+        """True if every window was fetched without error."""
+        return not self.failed and not self.stop.is_set()
+
+    def window(self, window, priority):
+        if self.stop.is_set():
+            return None
+        begin, end = window
+        begin_str = begin.strftime(self.date_format)
+        end_str = end.strftime(self.date_format)
+        logging.info(f"Récupération des données : {begin_str} => {end_str}")
+        # The usage points importing at the same time may share the token: its calls are capped across them.
+        with self.token_limit:
+            response = self.fetch(begin, end, priority)
+
+        if isinstance(response, dict) and response.get("deferred"):
+            self.failed = True
+            self.stop.set()
+            return None
+
+        if response is None:
+            response = {
+                "error": True,
+                "description": "MyElectricalData est indisponible.",
+            }
+
+        if isinstance(response, dict):
+            if response.get("error"):
+                self.failed = True
+                logging.error("Echec de la récupération des données.")
+                logging.error(f' => {response["description"]}')
+                logging.error(f" => {begin_str} -> {end_str}")
+            if response.get("exit") or response.get("status_code") in [400, 409]:
+                if not self.stop.is_set():
+                    self.stop.set()
+                    logging.error("Arrêt de la récupération des données suite à une erreur.")
+                    logging.error(
+                        f"Prochain lancement à {datetime.now() + timedelta(seconds=self.config.get('cycle'))}"
+                    )
+
+        with self.lock:
+            self.done += 1
+            logging.info(f" => Période {self.done}/{self.total} terminée ({begin_str} => {end_str})")
+        self.db.progress(self.usage_point_id, 1)
+        return response
@@ -258,6 +258,36 @@ class Config:
             return self.config["storage_uri"]
         return False
 
+    def storage_profile_config(self):
+        """Return the tuning of the storage backend.
+
+        Returns:
+            dict: A dictionary containing the pool sizes, statement cache and SQLite pragmas.
+        """
+        if "storage_profile" in self.config:
+            return self.config["storage_profile"]
+        return False
+
+    def gateway_config(self):
+        """Return the configuration of the HTTP client used to reach the gateway.
+
+        Returns:
+            dict: A dictionary containing the pool sizes and timeouts.
+        """
+        if "gateway" in self.config:
+            return self.config["gateway"]
+        return False
+
+    def import_config(self):
+        """Return the configuration of the import job.
+
+        Returns:
+            dict: A dictionary containing the import concurrency settings.
+        """
+        if "import" in self.config:
+            return self.config["import"]
+        return False
+
     def mqtt_config(self):
         """Return the configuration for MQTT.
 
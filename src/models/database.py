@@ -1,16 +1,41 @@
 """Manage all database operations."""
-import hashlib
+import calendar
+import functools
+import heapq
 import json
 import logging
 import os
+import threading
+import time
 import traceback
 from datetime import datetime, timedelta
-from os.path import exists
 
-from sqlalchemy import asc, create_engine, delete, desc, func, inspect, select, update
+from sqlalchemy import (
+    Integer,
+    and_,
+    asc,
+    cast,
+    create_engine,
+    delete,
+    desc,
+    event,
+    extract,
+    func,
+    inspect,
+    or_,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import scoped_session, sessionmaker
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import QueuePool
 
+from alembic import command
+from alembic.config import Config as AlembicConfig
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
 from config import MAX_IMPORT_TRY
 from db_schema import (
     Addresses,
@@ -20,19 +45,148 @@ from db_schema import (
     ConsumptionDetail,
     Contracts,
     Ecowatt,
+    JobLease,
     ProductionDaily,
     ProductionDetail,
+    Rollup,
     Statistique,
+    SyncState,
     Tempo,
     TempoConfig,
     UsagePoints,
 )
 from dependencies import APPLICATION_PATH, APPLICATION_PATH_DATA, get_version, str2bool, title, title_warning
+from models import partition, rollup
+from models.archive import Archive
+from models.lease import ALL_TARGETS
+from models.migration import Migration
+from models.offpeak import offpeak_hours
+
+# Key of the PostgreSQL advisory lock which serializes the job leases of every process sharing the database.
+LEASE_LOCK_KEY = 0x4D454431
 
 # available_database = ["sqlite", "postgresql", "mysql+pymysql"]
 available_database = ["sqlite", "postgresql"]
 
 
+STORAGE_DEFAULT_PROFILE = {
+    "sqlite": {
+        "query_cache_size": 500,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -64000,
+        "busy_timeout": 5000,
+        "detail_retention_months": 0,
+        "detail_archive_months": 0,
+    },
+    "postgresql": {
+        "query_cache_size": 500,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "detail_retention_months": 0,
+        "detail_archive_months": 0,
+        "partition_ahead_months": 3,
+    },
+}
+SQLITE_PRAGMAS = ["journal_mode", "synchronous", "mmap_size", "cache_size", "busy_timeout"]
+
+
+def storage_profile(uri, custom_profile=None):
+    """Return the storage profile of a database merged with the default values.
+
+    Args:
+        uri (str): The database URI.
+        custom_profile (dict, optional): The values of `storage_profile` in the configuration. Defaults to None.
+
+    Returns:
+        dict: The pool, statement cache and (for SQLite) pragma settings.
+    """
+    backend = "sqlite" if uri.startswith("sqlite") else "postgresql"
+    profile = dict(STORAGE_DEFAULT_PROFILE[backend])
+    for key, value in (custom_profile or {}).items():
+        if key in profile and value is not None:
+            profile[key] = str2bool(value) if isinstance(profile[key], bool) else type(profile[key])(value)
+    return profile
+
+
+def storage_engine(uri, profile):
+    """Create the engine of a database from its storage profile.
+
+    SQLite connections are kept in a pool and configured with the profile pragmas (WAL journal, synchronous=NORMAL,
+    mmap, page cache and busy timeout). PostgreSQL uses a QueuePool with pre-ping.
+
+    Args:
+        uri (str): The database URI.
+        profile (dict): The storage profile returned by `storage_profile`.
+
+    Returns:
+        sqlalchemy.engine.Engine: The engine.
+    """
+    options = {
+        "echo": False,
+        "query_cache_size": profile["query_cache_size"],
+        "isolation_level": "READ UNCOMMITTED",
+        "poolclass": QueuePool,
+        "pool_size": profile["pool_size"],
+        "max_overflow": profile["max_overflow"],
+    }
+    if uri.startswith("sqlite"):
+        engine = create_engine(uri, **options)
+
+        @event.listens_for(engine, "connect")
+        def set_sqlite_pragma(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for pragma in SQLITE_PRAGMAS:
+                cursor.execute(f"PRAGMA {pragma}={profile[pragma]}")
+            cursor.close()
+
+        return engine
+    return create_engine(
+        uri,
+        pool_recycle=profile["pool_recycle"],
+        pool_pre_ping=profile["pool_pre_ping"],
+        **options,
+    )
+
+
+def row_id(usage_point_key, date):
+    """Return the primary key of a daily, detail or max power reading.
+
+    The key packs the surrogate id of the usage point in the high bits and the epoch seconds of the reading in the low
+    32 bits, so every row is keyed by one 64 bits integer instead of the md5 of "<usage_point_id>/<date>".
+
+    Args:
+        usage_point_key (int): The `id` of the usage point.
+        date (datetime): The date of the reading (naive, stored as is).
+
+    Returns:
+        int: The primary key.
+    """
+    if isinstance(date, str):
+        date = datetime.fromisoformat(date)
+    return (usage_point_key << 32) | calendar.timegm(date.timetuple())
+
+
+def writer(method):
+    """Funnel a write operation through the single database writer.
+
+    Imports of several usage points can run concurrently, but every write is serialized so that SQLite never sees
+    two writers at the same time.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.write_lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
 class Database:
     """Represents a database connection and provides methods for database operations."""
 
@@ -57,17 +211,21 @@ class Database:
             else:
                 logging.critical(f"Database {self.storage_type} not supported (only SQLite & PostgresSQL)")
 
-        os.system(f"cd {APPLICATION_PATH}; DB_URL='{self.uri}' alembic upgrade head ")
-
-        self.engine = create_engine(
-            self.uri,
-            echo=False,
-            query_cache_size=0,
-            isolation_level="READ UNCOMMITTED",
-            poolclass=NullPool,
-        )
+        self.profile = storage_profile(self.uri, self.config.storage_profile_config())
+        self.engine = storage_engine(self.uri, self.profile)
+        self.upgrade_schema()
         self.session = scoped_session(sessionmaker(self.engine, autocommit=True, autoflush=True))
         self.inspector = inspect(self.engine)
+        self.write_lock = threading.RLock()
+        self.usage_point_keys = {}
+        # Incremented on each change of the readings of a usage point, see `readings_version`.
+        self.readings_versions = {}
+        self.archive = Archive(f"{self.path}/archive")
+        self.partitions = self.load_partitions()
+        if self.partitions:
+            now = datetime.now()
+            for table in self.partitions:
+                self.ensure_partitions(table, now, partition.add_months(now, self.profile["partition_ahead_months"]))
 
         self.lock_file = f"{self.path}/.lock"
 
@@ -77,75 +235,53 @@ class Database:
             self.migratev7tov8()
 
     def migratev7tov8(self):
-        """Migrates the database from version 7 to version 8."""
-        uri = f"sqlite:///{self.path}/enedisgateway.db"
-        engine = create_engine(uri, echo=True, query_cache_size=0)
-        session = scoped_session(sessionmaker(engine, autocommit=True, autoflush=True))
-
-        for measurement_direction in ["consumption", "production"]:
-            logging.warning(f'Migration des "{measurement_direction}_daily"')
-            if measurement_direction == "consumption":
-                table = ConsumptionDaily
-            else:
-                table = ProductionDaily
-            daily_data = session.execute(f"select * from {measurement_direction}_daily order by date").all()
-            current_date = ""
-            year_value = 0
-            bulk_insert = []
-            for daily in daily_data:
-                usage_point_id = daily[0]
-                date = datetime.strptime(daily[1], "%Y-%m-%d")
-                value = daily[2]
-                year_value = year_value + value
-                bulk_insert.append(
-                    table(
-                        usage_point_id=usage_point_id,
-                        date=date,
-                        value=value,
-                        blacklist=0,
-                        fail_count=0,
-                    )
-                )
-                if current_date != date.strftime("%Y"):
-                    logging.warning(f" - {date.strftime('%Y')} => {round(year_value / 1000, 2)}kW")
-                    current_date = date.strftime("%Y")
-                    year_value = 0
-            self.session.add_all(bulk_insert)
-
-            logging.warning(f'Migration des "{measurement_direction}_detail"')
-            if measurement_direction == "consumption":
-                table = ConsumptionDetail
-            else:
-                table = ProductionDetail
-            detail_data = session.execute(f"select * from {measurement_direction}_detail order by date").all()
-            current_date = ""
-            day_value = 0
-            bulk_insert = []
-            for detail in detail_data:
-                usage_point_id = detail[0]
-                date = datetime.strptime(detail[1], "%Y-%m-%d %H:%M:%S") - timedelta(minutes=30)
-                value = detail[2]
-                interval = detail[3]
-                measure_type = detail[4]
-                day_value = day_value + value / (60 / interval)
-                bulk_insert.append(
-                    table(
-                        usage_point_id=usage_point_id,
-                        date=date,
-                        value=value,
-                        interval=interval,
-                        measure_type=measure_type,
-                        blacklist=0,
-                        fail_count=0,
-                    )
-                )
-                if current_date != date.strftime("%m"):
-                    logging.warning(f" - {date.strftime('%Y-%m')} => {round(day_value / 1000, 2)}kW")
-                    current_date = date.strftime("%m")
-                    day_value = 0
-            self.session.add_all(bulk_insert)
+        """Migrates the database from version 7 to version 8.
+
+        The readings are copied in batches with checkpoints (see `models.migration.Migration`), a migration which was
+        interrupted resumes at the next start instead of starting over.
+        """
+        Migration(self, f"{self.path}/enedisgateway.db", schema="v7").run(create_usage_points=True)
         os.replace(f"{self.path}/enedisgateway.db", f"{self.path}/enedisgateway.db.migrate")
 
+    def import_database(self, path, restart=False, batch_size=5000):
+        """Import the readings of another cache.db, for the usage points known by this database.
+
+        Args:
+            path (str): The path of the cache.db to import.
+            restart (bool, optional): Import everything again, even the tables already imported. Defaults to False.
+            batch_size (int, optional): The number of rows read and written at once. Defaults to 5000.
+
+        Returns:
+            dict: The number of rows read, indexed by table.
+        """
+        title(f"Import des données de {path}")
+        return Migration(self, path, batch_size=batch_size).run(restart=restart)
+
+    def upgrade_schema(self):
+        """Upgrade the schema of the database to the last Alembic revision, if it is not already there.
+
+        The revision of the database is compared with the head of the migration scripts in the running interpreter,
+        the migrations only run (in process as well) when they differ.
+
+        Returns:
+            bool: True if migrations were applied, False if the schema was up to date.
+        """
+        start = time.monotonic()
+        config = AlembicConfig()
+        config.set_main_option("script_location", f"{APPLICATION_PATH}/alembic")
+        # The options of an Alembic config are interpolated, a "%" of the URL (password) must be escaped.
+        config.set_main_option("sqlalchemy.url", self.uri.replace("%", "%%"))
+        heads = set(ScriptDirectory.from_config(config).get_heads())
+        with self.engine.connect() as connection:
+            current = set(MigrationContext.configure(connection).get_current_heads())
+        if current == heads:
+            logging.debug(f"Schéma de la base de données à jour ({round(time.monotonic() - start, 3)}s)")
+            return False
+        title_warning(f"Migration de la base de données : {', '.join(current) or 'vide'} => {', '.join(heads)}")
+        command.upgrade(config, "head")
+        logging.info(f" => Migration terminée en {round(time.monotonic() - start, 3)}s")
+        return True
+
     def init_database(self):
         """Initialize the database with default values."""
         try:
@@ -197,33 +333,31 @@ class Database:
             logging.info(" => No cache detected")
 
     def lock_status(self):
-        """Check the lock status of the database.
+        """Check if an import job is running.
 
         Returns:
-            bool: True if the database is locked, False otherwise.
+            bool: True if a job holds a lease which has not expired, False otherwise.
         """
-        if exists(self.lock_file):
-            return True
-        else:
-            return False
+        return len(self.get_leases()) > 0
 
-    def lock(self):
-        """Locks the database.
+    @writer
+    def unlock(self, force=False):
+        """Remove the expired leases, left by the jobs which crashed.
 
-        Returns:
-            bool: True if the database is locked, False otherwise.
-        """
-        with open(self.lock_file, "xt") as f:
-            f.write(str(datetime.now()))
-            f.close()
-        return self.lock_status()
+        At startup another process may be running a job on the same database: its leases are kept, unless `force`.
 
-    def unlock(self):
-        """Unlocks the database.
+        Args:
+            force (bool, optional): Release the leases of every job, even running. Defaults to False.
 
         Returns:
-            bool: True if the database is unlocked, False otherwise.
+            bool: True if a job still holds a lease, False otherwise.
         """
+        query = delete(JobLease)
+        if not force:
+            query = query.where(JobLease.expires_at < datetime.now())
+        self.session.execute(query)
+        self.session.flush()
+        # Lock file of the previous versions.
         if os.path.exists(self.lock_file):
             os.remove(self.lock_file)
         return self.lock_status()
@@ -245,6 +379,10 @@ class Database:
                 self.delete_daily(usage_point.usage_point_id)
                 self.delete_detail(usage_point.usage_point_id)
                 self.delete_daily_max_power(usage_point.usage_point_id)
+        if self.profile["detail_retention_months"] > 0:
+            self.purge_detail(partition.add_months(datetime.now(), -self.profile["detail_retention_months"]))
+        if self.profile["detail_archive_months"] > 0:
+            self.archive_detail(partition.add_months(datetime.now(), -self.profile["detail_archive_months"]))
         return True
 
     def refresh_object(self):
@@ -261,6 +399,7 @@ class Database:
         self.session.close()
         return data
 
+    @writer
     def set_config(self, key, value):
         query = select(Config).where(Config.key == key)
         config = self.session.scalars(query).one_or_none()
@@ -287,17 +426,70 @@ class Database:
         self.session.close()
         return data
 
+    def usage_point_key(self, usage_point_id):
+        """Return the surrogate integer id of a usage point, used to build the keys of its readings.
+
+        The ids never change once assigned, so they are cached; a usage point created before the ids existed gets one
+        on first use.
+
+        Args:
+            usage_point_id (str): The usage point.
+
+        Returns:
+            int: The id of the usage point.
+        """
+        key = self.usage_point_keys.get(usage_point_id)
+        if key is None:
+            with self.write_lock:
+                key = self.session.scalars(
+                    select(UsagePoints.id).where(UsagePoints.usage_point_id == usage_point_id)
+                ).one_or_none()
+                if key is None:
+                    if self.get_usage_point(usage_point_id) is None:
+                        raise ValueError(f"Point de livraison {usage_point_id} inconnu.")
+                    key = self.next_usage_point_key()
+                    self.session.execute(
+                        update(UsagePoints, values={UsagePoints.id: key}).where(
+                            UsagePoints.usage_point_id == usage_point_id
+                        )
+                    )
+                    self.session.flush()
+            self.usage_point_keys[usage_point_id] = key
+        return key
+
+    def next_usage_point_key(self):
+        return (self.session.scalar(select(func.max(UsagePoints.id))) or 0) + 1
+
+    def readings_version(self, usage_point_id):
+        """Return the version of the daily readings, maximum power and rollups of a usage point.
+
+        It is changed by every write on them. The statistics computed from the readings (see
+        `models.stat.StatSnapshot`) are cached with this version and recomputed when it changes. It is only kept in
+        memory: a new process starts with empty caches.
+        """
+        return self.readings_versions.get(usage_point_id, 0)
+
+    def touch_readings(self, usage_point_id):
+        self.readings_versions[usage_point_id] = self.readings_versions.get(usage_point_id, 0) + 1
+
+    def row_id(self, usage_point_id, date):
+        """Return the primary key of the reading of a usage point at a date (see `row_id`)."""
+        return row_id(self.usage_point_key(usage_point_id), date)
+
     def get_usage_point_plan(self, usage_point):
         data = self.get_usage_point(usage_point)
         if data.plan in ["HP/HC"]:
             return "HC/HP"
         return data.plan
 
+    @writer
     def set_usage_point(self, usage_point_id, data):
         query = select(UsagePoints).where(UsagePoints.usage_point_id == usage_point_id)
         usage_points = self.session.scalars(query).one_or_none()
 
+        offpeak_hours_changed = False
         if usage_points is not None:
+            previous_offpeak_hours = offpeak_hours(usage_points)
             if "enable" in data and data["enable"] is not None:
                 usage_points.enable = str2bool(data["enable"])
             if "name" in data and data["name"] is not None:
@@ -396,6 +588,7 @@ class Database:
                 usage_points.ban = str2bool(data["ban"])
             if "consentement_expiration" in data and data["consentement_expiration"] is not None:
                 usage_points.consentement_expiration = data["consentement_expiration"]
+            offpeak_hours_changed = offpeak_hours(usage_points) != previous_offpeak_hours
         else:
             if "enable" in data and data["enable"] is not None:
                 enable = data["enable"]
@@ -575,6 +768,7 @@ class Database:
             self.session.add(
                 UsagePoints(
                     usage_point_id=usage_point_id,
+                    id=self.next_usage_point_key(),
                     name=name,
                     cache=str2bool(cache),
                     consumption=str2bool(consumption),
@@ -615,13 +809,18 @@ class Database:
             )
         self.session.flush()
         self.session.close()
+        if offpeak_hours_changed or self.rollup_missing(usage_point_id):
+            # The HC/HP split of the rollups depends on the off-peak hours.
+            self.rebuild_rollup(usage_point_id)
 
+    @writer
     def progress(self, usage_point_id, increment):
         query = select(UsagePoints).where(UsagePoints.usage_point_id == usage_point_id)
         usage_points = self.session.scalars(query).one_or_none()
         usage_points.progress = usage_points.progress + increment
         self.session.close()
 
+    @writer
     def last_call_update(self, usage_point_id):
         query = select(UsagePoints).where(UsagePoints.usage_point_id == usage_point_id)
         usage_points = self.session.scalars(query).one_or_none()
@@ -629,6 +828,7 @@ class Database:
         self.session.flush()
         self.session.close()
 
+    @writer
     def usage_point_update(
         self,
         usage_point_id,
@@ -659,6 +859,7 @@ class Database:
         self.session.flush()
         self.session.close()
 
+    @writer
     def delete_usage_point(self, usage_point_id):
         self.session.execute(delete(Addresses).where(Addresses.usage_point_id == usage_point_id))
         self.session.execute(delete(Contracts).where(Contracts.usage_point_id == usage_point_id))
@@ -669,15 +870,21 @@ class Database:
         self.session.execute(delete(ConsumptionDaily).where(ConsumptionDaily.usage_point_id == usage_point_id))
         self.session.execute(delete(ProductionDetail).where(ProductionDetail.usage_point_id == usage_point_id))
         self.session.execute(delete(ProductionDaily).where(ProductionDaily.usage_point_id == usage_point_id))
+        self.session.execute(delete(SyncState).where(SyncState.usage_point_id == usage_point_id))
+        self.session.execute(delete(Rollup).where(Rollup.usage_point_id == usage_point_id))
         self.session.execute(delete(UsagePoints).where(UsagePoints.usage_point_id == usage_point_id))
         self.session.flush()
         self.session.close()
+        self.usage_point_keys.pop(usage_point_id, None)
+        self.archive.delete(usage_point_id)
+        self.touch_readings(usage_point_id)
         return True
 
     def get_error_log(self, usage_point_id):
         data = self.get_usage_point(usage_point_id)
         return data.last_error
 
+    @writer
     def set_error_log(self, usage_point_id, message):
         values = {UsagePoints.last_error: message}
         self.session.execute(update(UsagePoints, values=values).where(UsagePoints.usage_point_id == usage_point_id))
@@ -695,6 +902,7 @@ class Database:
         self.session.close()
         return data
 
+    @writer
     def set_addresse(self, usage_point_id, data, count=0):
         query = (
             select(Addresses).join(UsagePoints.relation_addressess).where(Addresses.usage_point_id == usage_point_id)
@@ -726,6 +934,7 @@ class Database:
         self.session.flush()
         self.session.close()
 
+    @writer
     def delete_addresse(self, usage_point_id):
         self.session.execute(delete(Addresses).where(Addresses.usage_point_id == usage_point_id))
         self.session.flush()
@@ -743,6 +952,7 @@ class Database:
         self.session.close()
         return data
 
+    @writer
     def set_contract(
         self,
         usage_point_id,
@@ -814,6 +1024,97 @@ class Database:
         self.session.close()
         return data
 
+    def stream_daily_all(
+        self,
+        usage_point_id,
+        begin=None,
+        end=None,
+        measurement_direction="consumption",
+        order_dir="asc",
+        batch_size=5000,
+    ):
+        """Yield the daily readings of a usage point without loading the whole history in memory.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime, optional): The first date to read, the first reading if None. Defaults to None.
+            end (datetime, optional): The last date to read (included), the last reading if None. Defaults to None.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+            order_dir (str, optional): "asc" or "desc", the order of the dates. Defaults to "asc".
+            batch_size (int, optional): The number of rows fetched at once. Defaults to 5000.
+
+        Yields:
+            Row: The `date`, `value`, `blacklist` and `fail_count` of each reading.
+        """
+        if measurement_direction == "consumption":
+            table = ConsumptionDaily
+        else:
+            table = ProductionDaily
+        return self._stream_rows(table, usage_point_id, begin, end, order_dir, batch_size)
+
+    def get_daily_totals(
+        self, usage_point_id, period="month", begin=None, end=None, measurement_direction="consumption"
+    ):
+        """Sum the daily readings of a usage point per year, month or ISO week in the database.
+
+        Only one row per period is read back, instead of every day of the range.
+
+        Args:
+            usage_point_id (str): The usage point.
+            period (str, optional): "year", "month" or "week". Defaults to "month".
+            begin (datetime, optional): The first date to sum, the first reading if None. Defaults to None.
+            end (datetime, optional): The last date to sum (included), the last reading if None. Defaults to None.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+
+        Returns:
+            list: A row per period sorted by date, with the `year` (the ISO year for the weeks), the `month` or the
+                `week` (except for "year"), the `value` in Wh, the `count` of days read and the `begin` and `end` dates
+                of the first and last days read.
+        """
+        if measurement_direction == "consumption":
+            table = ConsumptionDaily
+        else:
+            table = ProductionDaily
+        keys = [cast(key, Integer).label(name) for name, key in self._period_keys(table.date, period)]
+        query = (
+            select(
+                *keys,
+                func.sum(table.value).label("value"),
+                func.count().label("count"),
+                func.min(table.date).label("begin"),
+                func.max(table.date).label("end"),
+            )
+            .where(table.usage_point_id == usage_point_id)
+            .group_by(*keys)
+            .order_by(*keys)
+        )
+        if begin is not None:
+            query = query.where(table.date >= begin)
+        if end is not None:
+            query = query.where(table.date <= end)
+        with self.engine.connect() as connection:
+            return connection.execute(query).all()
+
+    def _period_keys(self, date, period):
+        """Return the names and the SQL expressions of the keys of a period of `get_daily_totals`."""
+        if period not in ["year", "month", "week"]:
+            raise ValueError(f"Période inconnue : {period}")
+        if self.engine.dialect.name == "postgresql":
+            if period == "week":
+                return [("year", extract("isoyear", date)), ("week", extract("week", date))]
+            keys = [("year", extract("year", date))]
+            if period == "month":
+                keys.append(("month", extract("month", date)))
+            return keys
+        if period == "week":
+            # SQLite has no ISO week : the week of a day, and its year, are the ones of the Thursday of its week.
+            thursday = func.date(date, "-3 days", "weekday 4")
+            return [("year", func.strftime("%Y", thursday)), ("week", (func.strftime("%j", thursday) - 1) / 7 + 1)]
+        keys = [("year", func.strftime("%Y", date))]
+        if period == "month":
+            keys.append(("month", func.strftime("%m", date)))
+        return keys
+
     def get_daily_datatable(
         self,
         usage_point_id,
@@ -868,7 +1169,7 @@ class Database:
         return data
 
     def get_daily_date(self, usage_point_id, date, measurement_direction="consumption"):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if measurement_direction == "consumption":
             table = ConsumptionDaily
             relation = UsagePoints.relation_consumption_daily
@@ -946,8 +1247,9 @@ class Database:
         else:
             return 0
 
+    @writer
     def daily_fail_increment(self, usage_point_id, date, measurement_direction="consumption"):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if measurement_direction == "consumption":
             table = ConsumptionDaily
             relation = UsagePoints.relation_consumption_daily
@@ -1007,42 +1309,92 @@ class Database:
         else:
             return current_data
 
-    def get_daily(self, usage_point_id, begin, end, measurement_direction="consumption"):
-        delta = end - begin
+    def get_daily_coverage(self, usage_point_id, begin, end, measurement_direction="consumption"):
+        """Return the state of every day of a period from a single range query.
+
+        Each day is reported as "present" (value stored), "zero" (the gateway returned no data), "blacklisted" or
+        "missing" (never queried). Days from today onwards can not be fetched yet and never make the period
+        incomplete.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime): The first day of the period.
+            end (datetime): The last day of the period (inclusive).
+            measurement_direction (str, optional): "consumption", "production" or "consumption_max_power".
+                Defaults to "consumption".
+
+        Returns:
+            dict: `missing_data` is True if a past day is missing or zero, `date` maps each "%Y-%m-%d" day to its
+                `state`, `status`, `value`, `blacklist` and `fail_count`.
+        """
+        if measurement_direction == "consumption":
+            table = ConsumptionDaily
+        elif measurement_direction == "consumption_max_power":
+            table = ConsumptionDailyMaxPower
+        else:
+            table = ProductionDaily
+        begin = datetime.combine(begin, datetime.min.time())
+        end = datetime.combine(end, datetime.max.time())
+        query = (
+            select(table.date, table.value, table.blacklist, table.fail_count)
+            .where(table.usage_point_id == usage_point_id)
+            .where(table.date >= begin)
+            .where(table.date <= end)
+        )
+        stored = {row.date.strftime("%Y-%m-%d"): row for row in self.session.execute(query)}
+        today = datetime.combine(datetime.now(), datetime.min.time())
         result = {"missing_data": False, "date": {}, "count": 0}
-        for i in range(delta.days + 1):
-            checkDate = begin + timedelta(days=i)
-            checkDate = datetime.combine(checkDate, datetime.min.time())
-            query_result = self.get_daily_date(usage_point_id, checkDate, measurement_direction)
-            checkDate = checkDate.strftime("%Y-%m-%d")
-            if query_result is None:
+        for i in range((end - begin).days + 1):
+            day = begin + timedelta(days=i)
+            day_str = day.strftime("%Y-%m-%d")
+            row = stored.get(day_str)
+            if row is None:
                 # NEVER QUERY
-                result["date"][checkDate] = {
-                    "status": False,
-                    "blacklist": 0,
-                    "value": 0,
-                }
-                result["missing_data"] = True
+                state = "missing"
+                value, blacklist, fail_count = 0, 0, 0
             else:
-                consumption = query_result.value
-                blacklist = query_result.blacklist
-                if consumption == 0:
+                value, blacklist, fail_count = row.value, row.blacklist, row.fail_count
+                if blacklist:
+                    state = "blacklisted"
+                elif value == 0:
                     # ENEDIS RETURN NO DATA
-                    result["date"][checkDate] = {
-                        "status": False,
-                        "blacklist": blacklist,
-                        "value": consumption,
-                    }
-                    result["missing_data"] = True
+                    state = "zero"
                 else:
-                    # SUCCESS or BLACKLIST
-                    result["date"][checkDate] = {
-                        "status": True,
-                        "blacklist": blacklist,
-                        "value": consumption,
-                    }
+                    state = "present"
+            if state in ["missing", "zero"] and day < today:
+                result["missing_data"] = True
+            result["date"][day_str] = {
+                "state": state,
+                "status": state in ["present", "blacklisted"],
+                "blacklist": blacklist,
+                "value": value,
+                "fail_count": fail_count,
+            }
         return result
 
+    def get_daily_watermark(self, usage_point_id, begin, measurement_direction="consumption"):
+        """Return the first day since `begin` that is still missing or zero, or today if every day is covered.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime): The first day to check.
+            measurement_direction (str, optional): "consumption", "production" or "consumption_max_power".
+                Defaults to "consumption".
+
+        Returns:
+            datetime: The new sync watermark of the dataset.
+        """
+        today = datetime.combine(datetime.now(), datetime.min.time())
+        coverage = self.get_daily_coverage(usage_point_id, begin, today - timedelta(days=1), measurement_direction)
+        for date, data in coverage["date"].items():
+            if data["state"] in ["missing", "zero"]:
+                return datetime.strptime(date, "%Y-%m-%d")
+        return today
+
+    def get_daily(self, usage_point_id, begin, end, measurement_direction="consumption"):
+        return self.get_daily_coverage(usage_point_id, begin, end, measurement_direction)
+
+    @writer
     def insert_daily(
         self,
         usage_point_id,
@@ -1052,7 +1404,7 @@ class Database:
         fail_count=0,
         measurement_direction="consumption",
     ):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if measurement_direction == "consumption":
             table = ConsumptionDaily
             relation = UsagePoints.relation_consumption_daily
@@ -1081,7 +1433,63 @@ class Database:
                 )
             )
         self.session.flush()
+        self.touch_readings(usage_point_id)
 
+    @writer
+    def insert_daily_bulk(self, usage_point_id, data, measurement_direction="consumption", batch_size=1000):
+        """Insert or update many daily readings at once (see `insert_detail_bulk`).
+
+        Args:
+            usage_point_id (str): The usage point.
+            data (list): The readings, as dictionaries with the `date` and `value` keys, and optionally `blacklist`,
+                `fail_count` and, for the maximum power, `event_date`.
+            measurement_direction (str, optional): "consumption", "production" or "consumption_max_power".
+                Defaults to "consumption".
+            batch_size (int, optional): The number of readings sent per statement. Defaults to 1000.
+
+        Returns:
+            int: The number of readings written.
+        """
+        if measurement_direction == "consumption":
+            table = ConsumptionDaily.__table__
+        elif measurement_direction == "consumption_max_power":
+            table = ConsumptionDailyMaxPower.__table__
+        else:
+            table = ProductionDaily.__table__
+        columns = ["date", "value", "blacklist", "fail_count"]
+        if measurement_direction == "consumption_max_power":
+            columns.append("event_date")
+        usage_point_key = self.usage_point_key(usage_point_id)
+        rows = [
+            {
+                "id": row_id(usage_point_key, item["date"]),
+                "usage_point_id": usage_point_id,
+                "date": item["date"],
+                "value": item["value"],
+                "blacklist": item.get("blacklist", 0),
+                "fail_count": item.get("fail_count", 0),
+                **({"event_date": item.get("event_date")} if "event_date" in columns else {}),
+            }
+            for item in data
+        ]
+        if not rows:
+            return 0
+        if self.engine.dialect.name == "postgresql":
+            statement = postgresql_insert(table)
+        else:
+            statement = sqlite_insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.id],
+            set_={column: statement.excluded[column] for column in columns},
+        )
+        with self.engine.begin() as connection:
+            for index in range(0, len(rows), batch_size):
+                connection.execute(statement, rows[index : index + batch_size])
+        self.session.expire_all()
+        self.touch_readings(usage_point_id)
+        return len(rows)
+
+    @writer
     def reset_daily(self, usage_point_id, date=None, mesure_type="consumption"):
         data = self.get_daily_date(usage_point_id, date, mesure_type)
         if mesure_type == "consumption":
@@ -1094,28 +1502,32 @@ class Database:
                 table.blacklist: 0,
                 table.fail_count: 0,
             }
-            unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+            unique_id = self.row_id(usage_point_id, date)
             self.session.execute(update(table, values=values).where(table.id == unique_id))
             self.session.flush()
+            self.touch_readings(usage_point_id)
             return True
         else:
             return False
 
+    @writer
     def delete_daily(self, usage_point_id, date=None, measurement_direction="consumption"):
         if measurement_direction == "consumption":
             table = ConsumptionDaily
         else:
             table = ProductionDaily
         if date is not None:
-            unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+            unique_id = self.row_id(usage_point_id, date)
             self.session.execute(delete(table).where(table.id == unique_id))
         else:
             self.session.execute(delete(table).where(table.usage_point_id == usage_point_id))
         self.session.flush()
+        self.touch_readings(usage_point_id)
         return True
 
+    @writer
     def blacklist_daily(self, usage_point_id, date, action=True, measurement_direction="consumption"):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if measurement_direction == "consumption":
             table = ConsumptionDaily
             relation = UsagePoints.relation_consumption_daily
@@ -1146,6 +1558,39 @@ class Database:
             "end": self.get_daily_first_date(usage_point_id),
         }
 
+    def _stream_rows(self, table, usage_point_id, begin, end, order_dir, batch_size):
+        """Yield the rows of a time-series table, `batch_size` rows at a time.
+
+        PostgreSQL reads them through a server-side cursor. SQLite has none, so the rows are paged on the
+        (usage_point_id, date) index, each page in its own short read : the writer is never blocked while the caller
+        works on the rows.
+        """
+        columns = [column for column in table.__table__.columns if column.name not in ["id", "usage_point_id"]]
+        query = select(*columns).where(table.usage_point_id == usage_point_id)
+        if begin is not None:
+            query = query.where(table.date >= begin)
+        if end is not None:
+            query = query.where(table.date <= end)
+        descending = order_dir == "desc"
+        query = query.order_by(table.date.desc() if descending else table.date.asc())
+        if self.engine.dialect.name == "postgresql":
+            with self.engine.connect() as connection:
+                result = connection.execution_options(stream_results=True, max_row_buffer=batch_size).execute(query)
+                for rows in result.partitions(batch_size):
+                    yield from rows
+            return
+        last_date = None
+        while True:
+            page = query.limit(batch_size)
+            if last_date is not None:
+                page = page.where(table.date < last_date if descending else table.date > last_date)
+            with self.engine.connect() as connection:
+                rows = connection.execute(page).all()
+            yield from rows
+            if len(rows) < batch_size:
+                return
+            last_date = rows[-1].date
+
     # -----------------------------------------------------------------------------------------------------------------
     # DETAIL CONSUMPTION
     # -----------------------------------------------------------------------------------------------------------------
@@ -1164,35 +1609,50 @@ class Database:
             table = ProductionDetail
             relation = UsagePoints.relation_production_detail
         sort = asc("date") if order_dir == "desc" else desc("date")
-        if begin is None and end is None:
-            return self.session.scalars(
-                select(table).join(relation).where(table.usage_point_id == usage_point_id).order_by(sort)
-            ).all()
-        elif begin is not None and end is None:
-            return self.session.scalars(
-                select(table)
-                .join(relation)
-                .where(table.usage_point_id == usage_point_id)
-                .filter(table.date >= begin)
-                .order_by(sort)
-            ).all()
-        elif end is not None and begin is None:
-            return self.session.scalars(
-                select(table)
-                .join(relation)
-                .where(table.usage_point_id == usage_point_id)
-                .filter(table.date <= end)
-                .order_by(sort)
-            ).all()
+        query = select(table).join(relation).where(table.usage_point_id == usage_point_id)
+        if begin is not None:
+            query = query.filter(table.date >= begin)
+        if end is not None:
+            query = query.filter(table.date <= end)
+        data = self.session.scalars(query.order_by(sort)).all()
+        archived = list(self.archive.rows(usage_point_id, measurement_direction, begin, end))
+        if archived:
+            return sorted(data + archived, key=lambda row: row.date, reverse=order_dir != "desc")
+        return data
+
+    def stream_detail_all(
+        self,
+        usage_point_id,
+        begin=None,
+        end=None,
+        measurement_direction="consumption",
+        order_dir="asc",
+        batch_size=5000,
+    ):
+        """Yield the detail readings of a usage point without loading the whole history in memory.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime, optional): The first date to read, the first reading if None. Defaults to None.
+            end (datetime, optional): The last date to read (included), the last reading if None. Defaults to None.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+            order_dir (str, optional): "asc" or "desc", the order of the dates. Defaults to "asc".
+            batch_size (int, optional): The number of rows fetched at once. Defaults to 5000.
+
+        Yields:
+            Row: The `date`, `value`, `interval`, `measure_type`, `blacklist` and `fail_count` of each reading, the
+                archived months are read from their archive files.
+        """
+        if measurement_direction == "consumption":
+            table = ConsumptionDetail
         else:
-            return self.session.scalars(
-                select(table)
-                .join(relation)
-                .where(table.usage_point_id == usage_point_id)
-                .filter(table.date <= end)
-                .filter(table.date >= begin)
-                .order_by(sort)
-            ).all()
+            table = ProductionDetail
+        rows = self._stream_rows(table, usage_point_id, begin, end, order_dir, batch_size)
+        if not self.archive.months(usage_point_id, measurement_direction):
+            return rows
+        descending = order_dir == "desc"
+        archived = self.archive.rows(usage_point_id, measurement_direction, begin, end, descending)
+        return heapq.merge(archived, rows, key=lambda row: row.date, reverse=descending)
 
     def get_detail_datatable(
         self,
@@ -1227,7 +1687,15 @@ class Database:
                 .where(table.date <= yesterday)
                 .order_by(sort)
             )
-        return result.all()
+        data = result.all()
+        archived = [
+            row
+            for row in self.archive.rows(usage_point_id, measurement_direction, end=yesterday)
+            if not search or search in str(row.date) or search in str(row.value)
+        ]
+        if archived:
+            return sorted(data + archived, key=lambda row: getattr(row, order_column), reverse=order_dir != "desc")
+        return data
 
     def get_detail_count(self, usage_point_id, measurement_direction="consumption"):
         if measurement_direction == "consumption":
@@ -1236,22 +1704,26 @@ class Database:
         else:
             table = ProductionDetail
             relation = UsagePoints.relation_production_detail
-        return self.session.scalars(
+        count = self.session.scalars(
             select([func.count()])
             .select_from(table)
             .join(relation)
             .where(UsagePoints.usage_point_id == usage_point_id)
         ).one_or_none()
+        return count + self.archive.count(usage_point_id, measurement_direction)
 
     def get_detail_date(self, usage_point_id, date, measurement_direction="consumption"):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if measurement_direction == "consumption":
             table = ConsumptionDetail
             relation = UsagePoints.relation_consumption_detail
         else:
             table = ProductionDetail
             relation = UsagePoints.relation_production_detail
-        return self.session.scalars(select(table).join(relation).where(table.id == unique_id)).first()
+        data = self.session.scalars(select(table).join(relation).where(table.id == unique_id)).first()
+        if data is None and self.archive.months(usage_point_id, measurement_direction):
+            data = next(self.archive.rows(usage_point_id, measurement_direction, date, date), None)
+        return data
 
     def get_detail_range(
         self,
@@ -1267,7 +1739,8 @@ class Database:
         else:
             table = ProductionDetail
             relation = UsagePoints.relation_production_detail
-        if order == "desc":
+        descending = order == "desc"
+        if descending:
             order = table.date.desc()
         else:
             order = table.date.asc()
@@ -1281,10 +1754,43 @@ class Database:
         )
         logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
         current_data = self.session.scalars(query).all()
-        if current_data is None:
-            return False
+        archived = list(self.archive.rows(usage_point_id, measurement_direction, begin, end))
+        if archived:
+            current_data = sorted(current_data + archived, key=lambda row: row.date, reverse=descending)
+        return current_data
+
+    def get_detail_timestamps(self, usage_point_id, begin, end, measurement_direction="consumption"):
+        """Return the start date and interval of every detail reading of a period, in one query.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime): The start of the period (inclusive).
+            end (datetime): The end of the period (exclusive).
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+
+        Returns:
+            list: The (date, interval) tuples sorted by date.
+        """
+        if measurement_direction == "consumption":
+            table = ConsumptionDetail
         else:
-            return current_data
+            table = ProductionDetail
+        query = (
+            select(table.date, table.interval)
+            .where(table.usage_point_id == usage_point_id)
+            .where(table.date >= begin)
+            .where(table.date < end)
+            .order_by(table.date.asc())
+        )
+        result = [(date, interval) for date, interval in self.session.execute(query)]
+        archived = [
+            (row.date, row.interval)
+            for row in self.archive.rows(usage_point_id, measurement_direction, begin, end)
+            if row.date < end
+        ]
+        if archived:
+            result = sorted(result + archived)
+        return result
 
     def get_detail(self, usage_point_id, begin, end, measurement_direction="consumption"):
         # begin = datetime.combine(begin, datetime.min.time())
@@ -1320,7 +1826,7 @@ class Database:
             return result
 
     def get_detail_state(self, usage_point_id, date, measurement_direction="consumption"):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if measurement_direction == "consumption":
             table = ConsumptionDetail
             relation = UsagePoints.relation_consumption_detail
@@ -1328,27 +1834,74 @@ class Database:
             table = ProductionDetail
             relation = UsagePoints.relation_production_detail
         current_data = self.session.scalars(select(table).join(relation).where(table.id == unique_id)).one_or_none()
+        if current_data is None and self.archive.months(usage_point_id, measurement_direction):
+            current_data = next(self.archive.rows(usage_point_id, measurement_direction, date, date), None)
         if current_data is None:
             return False
         else:
             return True
 
-    # def insert_detail_bulk(self, data, mesure_type="consumption"):
-    #     if mesure_type == "consumption":
-    #         table = ConsumptionDetail
-    #     else:
-    #         table = ProductionDetail
-    #     begin = ""
-    #     end = ""
-    #     for scalar in data:
-    #         if begin == "":
-    #             begin = scalar.date
-    #         end = scalar.date
-    #     self.session.execute(
-    #         table.__table__.delete().filter(ConsumptionDetail.date.between(begin, end))
-    #     )
-    #     self.session.add_all(data)
+    @writer
+    def insert_detail_bulk(self, usage_point_id, data, mesure_type="consumption", batch_size=1000):
+        """Insert or update many detail readings at once.
+
+        The readings are written with `INSERT ... ON CONFLICT DO UPDATE` statements sent in batches, all of them in a
+        single transaction, instead of one SELECT and one flush per reading.
 
+        Args:
+            usage_point_id (str): The usage point.
+            data (list): The readings, as dictionaries with the `date`, `value` and `interval` keys, and optionally
+                `measure_type`, `blacklist` and `fail_count`.
+            mesure_type (str, optional): "consumption" or "production". Defaults to "consumption".
+            batch_size (int, optional): The number of readings sent per statement. Defaults to 1000.
+
+        Returns:
+            int: The number of readings written.
+        """
+        if mesure_type == "consumption":
+            table = ConsumptionDetail.__table__
+        else:
+            table = ProductionDetail.__table__
+        usage_point_key = self.usage_point_key(usage_point_id)
+        rows = [
+            {
+                "id": row_id(usage_point_key, item["date"]),
+                "usage_point_id": usage_point_id,
+                "date": item["date"],
+                "value": item["value"],
+                "interval": item["interval"],
+                "measure_type": item.get("measure_type", ""),
+                "blacklist": item.get("blacklist", 0),
+                "fail_count": item.get("fail_count", 0),
+            }
+            for item in data
+        ]
+        if not rows:
+            return 0
+        if self.engine.dialect.name == "postgresql":
+            statement = postgresql_insert(table)
+        else:
+            statement = sqlite_insert(table)
+        # The primary key of a partitioned table also holds the partition key.
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.id, table.c.date] if table.name in self.partitions else [table.c.id],
+            set_={
+                column: statement.excluded[column]
+                for column in ["date", "value", "interval", "measure_type", "blacklist", "fail_count"]
+            },
+        )
+        dates = [row["date"] for row in rows]
+        self.restore_detail(usage_point_id, min(dates), max(dates), mesure_type)
+        self.ensure_partitions(table.name, min(dates), max(dates))
+        with self.engine.begin() as connection:
+            for index in range(0, len(rows), batch_size):
+                connection.execute(statement, rows[index : index + batch_size])
+            self.refresh_rollup(usage_point_id, min(dates), max(dates), mesure_type, connection)
+        # Objects already loaded by the ORM session must not hide the new values.
+        self.session.expire_all()
+        return len(rows)
+
+    @writer
     def insert_detail(
         self,
         usage_point_id,
@@ -1360,11 +1913,13 @@ class Database:
         fail_count=0,
         mesure_type="consumption",
     ):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         if mesure_type == "consumption":
             table = ConsumptionDetail
         else:
             table = ProductionDetail
+        self.restore_detail(usage_point_id, date, date, mesure_type)
+        self.ensure_partitions(table.__tablename__, date, date)
         detail = self.get_detail_date(usage_point_id, date, mesure_type)
         if detail is not None:
             detail.id = unique_id
@@ -1389,8 +1944,11 @@ class Database:
                 )
             )
         self.session.flush()
+        self.refresh_rollup(usage_point_id, date, date, mesure_type)
 
+    @writer
     def reset_detail(self, usage_point_id, date=None, mesure_type="consumption"):
+        self.restore_detail(usage_point_id, date, date, mesure_type)
         detail = self.get_detail_date(usage_point_id, date, mesure_type)
         if detail is not None:
             detail.value = 0
@@ -1398,11 +1956,14 @@ class Database:
             detail.blacklist = 0
             detail.fail_count = 0
             self.session.flush()
+            self.refresh_rollup(usage_point_id, date, date, mesure_type)
             return True
         else:
             return False
 
+    @writer
     def reset_detail_range(self, usage_point_id, begin, end, mesure_type="consumption"):
+        self.restore_detail(usage_point_id, begin, end, mesure_type)
         detail = self.get_detail_range(usage_point_id, begin, end, mesure_type)
         if detail is not None:
             for row in detail:
@@ -1411,34 +1972,49 @@ class Database:
                 row.blacklist = 0
                 row.fail_count = 0
             self.session.flush()
+            self.refresh_rollup(usage_point_id, begin, end, mesure_type)
             return True
         else:
             return False
 
+    @writer
     def delete_detail(self, usage_point_id, date=None, mesure_type="consumption"):
         if mesure_type == "consumption":
             table = ConsumptionDetail
         else:
             table = ProductionDetail
         if date is not None:
-            unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+            self.restore_detail(usage_point_id, date, date, mesure_type)
+            unique_id = self.row_id(usage_point_id, date)
             self.session.execute(delete(table).where(table.id == unique_id))
         else:
             self.session.execute(delete(table).where(table.usage_point_id == usage_point_id))
+            self.archive.delete(usage_point_id, mesure_type)
         self.session.flush()
+        if date is not None:
+            self.refresh_rollup(usage_point_id, date, date, mesure_type)
+        else:
+            self.delete_rollup(usage_point_id, mesure_type)
         return True
 
+    @writer
     def delete_detail_range(self, usage_point_id, date, mesure_type="consumption"):
         if mesure_type == "consumption":
             table = ConsumptionDetail
         else:
             table = ProductionDetail
         if date is not None:
-            unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+            self.restore_detail(usage_point_id, date, date, mesure_type)
+            unique_id = self.row_id(usage_point_id, date)
             self.session.execute(delete(table).where(table.id == unique_id))
         else:
             self.session.execute(delete(table).where(table.usage_point_id == usage_point_id))
+            self.archive.delete(usage_point_id, mesure_type)
         self.session.flush()
+        if date is not None:
+            self.refresh_rollup(usage_point_id, date, date, mesure_type)
+        else:
+            self.delete_rollup(usage_point_id, mesure_type)
         return True
 
     def get_ratio_hc_hp(self, usage_point_id, begin, end, mesure_type="consumption"):
@@ -1459,8 +2035,10 @@ class Database:
     def get_detail_fail_count(self, usage_point_id, date, mesure_type="consumption"):
         return self.get_detail_date(usage_point_id, date, mesure_type).fail_count
 
+    @writer
     def detail_fail_increment(self, usage_point_id, date, mesure_type="consumption"):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        self.restore_detail(usage_point_id, date, date, mesure_type)
+        unique_id = self.row_id(usage_point_id, date)
         if mesure_type == "consumption":
             table = ConsumptionDetail
             relation = UsagePoints.relation_consumption_detail
@@ -1498,6 +2076,7 @@ class Database:
                 )
             )
         self.session.flush()
+        self.refresh_rollup(usage_point_id, date, date, mesure_type)
         return fail_count
 
     def get_detail_last_date(self, usage_point_id, mesure_type="consumption"):
@@ -1510,6 +2089,9 @@ class Database:
         current_data = self.session.scalars(
             select(table).join(relation).where(table.usage_point_id == usage_point_id).order_by(table.date)
         ).first()
+        archived = self.archive.bounds(usage_point_id, mesure_type)[0]
+        if archived is not None and (current_data is None or archived < current_data.date):
+            return archived
         if current_data is None:
             return False
         else:
@@ -1525,6 +2107,9 @@ class Database:
         query = select(table).join(relation).where(table.usage_point_id == usage_point_id).order_by(table.date.desc())
         logging.debug(query.compile(compile_kwargs={"literal_binds": True}))
         current_data = self.session.scalars(query).first()
+        archived = self.archive.bounds(usage_point_id, mesure_type)[1]
+        if archived is not None and (current_data is None or archived > current_data.date):
+            return archived
         if current_data is None:
             return False
         else:
@@ -1568,40 +2153,7 @@ class Database:
             return current_data
 
     def get_daily_power(self, usage_point_id, begin, end):
-        delta = end - begin
-        result = {"missing_data": False, "date": {}, "count": 0}
-        for i in range(delta.days + 1):
-            checkDate = begin + timedelta(days=i)
-            checkDate = datetime.combine(checkDate, datetime.min.time())
-            query_result = self.get_daily_max_power_date(usage_point_id, checkDate)
-            checkDate = checkDate.strftime("%Y-%m-%d")
-            if query_result is None:
-                # NEVER QUERY
-                result["date"][checkDate] = {
-                    "status": False,
-                    "blacklist": 0,
-                    "value": 0,
-                }
-                result["missing_data"] = True
-            else:
-                consumption = query_result.value
-                blacklist = query_result.blacklist
-                if consumption == 0:
-                    # ENEDIS RETURN NO DATA
-                    result["date"][checkDate] = {
-                        "status": False,
-                        "blacklist": blacklist,
-                        "value": consumption,
-                    }
-                    result["missing_data"] = True
-                else:
-                    # SUCCESS or BLACKLIST
-                    result["date"][checkDate] = {
-                        "status": True,
-                        "blacklist": blacklist,
-                        "value": consumption,
-                    }
-        return result
+        return self.get_daily_coverage(usage_point_id, begin, end, "consumption_max_power")
 
     def get_daily_max_power_last_date(self, usage_point_id):
         current_data = self.session.scalars(
@@ -1616,15 +2168,16 @@ class Database:
             return current_data.date
 
     def get_daily_max_power_date(self, usage_point_id, date):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         return self.session.scalars(
             select(ConsumptionDailyMaxPower)
             .join(UsagePoints.relation_consumption_daily_max_power)
             .where(ConsumptionDailyMaxPower.id == unique_id)
         ).one_or_none()
 
+    @writer
     def insert_daily_max_power(self, usage_point_id, date, event_date, value, blacklist=0, fail_count=0):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         daily = self.get_daily_max_power_date(usage_point_id, date)
         if daily is not None:
             daily.id = unique_id
@@ -1647,6 +2200,7 @@ class Database:
                 )
             )
         self.session.flush()
+        self.touch_readings(usage_point_id)
 
     def get_daily_max_power_count(self, usage_point_id):
         return self.session.scalars(
@@ -1681,8 +2235,9 @@ class Database:
             )
         return result.all()
 
+    @writer
     def daily_max_power_fail_increment(self, usage_point_id, date):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         daily = self.get_daily_max_power_date(usage_point_id, date)
         if daily is not None:
             fail_count = int(daily.fail_count) + 1
@@ -1712,8 +2267,10 @@ class Database:
                 )
             )
         self.session.flush()
+        self.touch_readings(usage_point_id)
         return fail_count
 
+    @writer
     def reset_daily_max_power(self, usage_point_id, date=None):
         daily = self.get_daily_max_power_date(usage_point_id, date)
         if daily is not None:
@@ -1722,23 +2279,27 @@ class Database:
             daily.blacklist = 0
             daily.fail_count = 0
             self.session.flush()
+            self.touch_readings(usage_point_id)
             return True
         else:
             return False
 
+    @writer
     def delete_daily_max_power(self, usage_point_id, date=None):
         if date is not None:
-            unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+            unique_id = self.row_id(usage_point_id, date)
             self.session.execute(delete(ConsumptionDailyMaxPower).where(ConsumptionDailyMaxPower.id == unique_id))
         else:
             self.session.execute(
                 delete(ConsumptionDailyMaxPower).where(ConsumptionDailyMaxPower.usage_point_id == usage_point_id)
             )
         self.session.flush()
+        self.touch_readings(usage_point_id)
         return True
 
+    @writer
     def blacklist_daily_max_power(self, usage_point_id, date, action=True):
-        unique_id = hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest()
+        unique_id = self.row_id(usage_point_id, date)
         daily = self.get_daily_max_power_date(usage_point_id, date)
         if daily is not None:
             daily.blacklist = action
@@ -1754,6 +2315,7 @@ class Database:
                 )
             )
         self.session.flush()
+        self.touch_readings(usage_point_id)
         return True
 
     def get_daily_max_power_fail_count(self, usage_point_id, date):
@@ -1782,6 +2344,7 @@ class Database:
             select(Tempo).where(Tempo.date >= begin).where(Tempo.date <= end).order_by(order)
         ).all()
 
+    @writer
     def set_tempo(self, date, color):
         date = datetime.combine(date, datetime.min.time())
         tempo = self.get_tempo_range(date, date)
@@ -1804,6 +2367,7 @@ class Database:
         self.session.close()
         return data
 
+    @writer
     def set_tempo_config(self, key, value):
         query = select(TempoConfig).where(TempoConfig.key == key)
         config = self.session.scalars(query).one_or_none()
@@ -1833,6 +2397,7 @@ class Database:
             select(Ecowatt).where(Ecowatt.date >= begin).where(Ecowatt.date <= end).order_by(order)
         ).all()
 
+    @writer
     def set_ecowatt(self, date, value, message, detail):
         date = datetime.combine(date, datetime.min.time())
         ecowatt = self.get_ecowatt_range(date, date)
@@ -1857,6 +2422,7 @@ class Database:
             .where(Statistique.key == key)
         ).all()
 
+    @writer
     def set_stat(self, usage_point_id, key, value):
         current_value = self.get_stat(usage_point_id, key)
         if current_value:
@@ -1867,5 +2433,627 @@ class Database:
         self.session.flush()
         return True
 
+    @writer
     def del_stat(self, usage_point_id):
         self.session.execute(delete(Statistique).where(Statistique.usage_point_id == usage_point_id))
+
+    def get_sync_state(self, usage_point_id, dataset):
+        """Return the synchronization state of a dataset.
+
+        Args:
+            usage_point_id (str): The usage point.
+            dataset (str): The dataset, e.g. "consumption", "consumption_detail" or "consumption_max_power".
+
+        Returns:
+            dict: `watermark`, the date up to which the dataset is complete (None if unknown), and `gaps`, the known
+                missing periods before it, as dictionaries with `begin`, `end` and `tries`.
+        """
+        query = select(SyncState).where(SyncState.usage_point_id == usage_point_id).where(SyncState.dataset == dataset)
+        state = self.session.scalars(query).one_or_none()
+        if state is None:
+            return {"watermark": None, "gaps": []}
+        gaps = [
+            {
+                "begin": datetime.fromisoformat(gap["begin"]),
+                "end": datetime.fromisoformat(gap["end"]),
+                "tries": gap["tries"],
+            }
+            for gap in json.loads(state.gaps)
+        ]
+        return {"watermark": state.watermark, "gaps": gaps}
+
+    @writer
+    def set_sync_state(self, usage_point_id, dataset, watermark, gaps=None):
+        """Save the synchronization state of a dataset in a single statement.
+
+        Args:
+            usage_point_id (str): The usage point.
+            dataset (str): The dataset.
+            watermark (datetime): The date up to which the dataset is complete.
+            gaps (list, optional): The known missing periods before the watermark. Defaults to None.
+        """
+        gaps = [
+            {"begin": gap["begin"].isoformat(), "end": gap["end"].isoformat(), "tries": gap["tries"]}
+            for gap in gaps or []
+        ]
+        self.session.merge(
+            SyncState(
+                usage_point_id=usage_point_id,
+                dataset=dataset,
+                watermark=watermark,
+                gaps=json.dumps(gaps),
+                updated_at=datetime.now(),
+            )
+        )
+        self.session.flush()
+
+    @writer
+    def rewind_sync_state(self, usage_point_id, dataset=None, date=None):
+        """Move the watermark of a dataset back, so that the next import revalidates the data after `date`.
+
+        Args:
+            usage_point_id (str): The usage point.
+            dataset (str, optional): The dataset, every dataset of the usage point if None. Defaults to None.
+            date (datetime, optional): The first date to revalidate, the whole history if None. Defaults to None.
+        """
+        if date is None:
+            query = delete(SyncState).where(SyncState.usage_point_id == usage_point_id)
+            if dataset is not None:
+                query = query.where(SyncState.dataset == dataset)
+            self.session.execute(query)
+        else:
+            date = datetime.combine(date, datetime.min.time())
+            query = (
+                update(SyncState)
+                .where(SyncState.usage_point_id == usage_point_id)
+                .where(SyncState.watermark > date)
+                .values(watermark=date)
+            )
+            if dataset is not None:
+                query = query.where(SyncState.dataset == dataset)
+            self.session.execute(query)
+        self.session.flush()
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # JOB LEASES
+    # ----------------------------------------------------------------------------------------------------------------
+    def get_leases(self):
+        """Return the leases which have not expired."""
+        query = select(JobLease).where(JobLease.expires_at >= datetime.now()).order_by(JobLease.acquired_at)
+        data = self.session.scalars(query).all()
+        self.session.close()
+        return data
+
+    @writer
+    def acquire_lease(self, usage_point_id, target, holder, ttl):
+        """Take the lease of an import job on a usage point and a target, unless a running job overlaps it.
+
+        Two leases overlap when they are on the same usage point and on the same target, or when one of them is on
+        every target. The expired leases, left by a job which crashed, are removed first.
+
+        Args:
+            usage_point_id (str): The usage point, or `models.lease.SHARED` for the data shared by the usage points.
+            target (str): The target, or `models.lease.ALL_TARGETS`.
+            holder (str): The job which takes the lease.
+            ttl (int): The lifetime of the lease in seconds, unless it is renewed.
+
+        Returns:
+            bool: True if the lease is taken, False if another job holds an overlapping lease.
+        """
+        now = datetime.now()
+        with self.engine.begin() as connection:
+            if self.engine.dialect.name == "postgresql":
+                connection.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": LEASE_LOCK_KEY})
+            connection.execute(delete(JobLease).where(JobLease.expires_at < now))
+            query = select(JobLease).where(JobLease.usage_point_id == usage_point_id)
+            if target != ALL_TARGETS:
+                query = query.where(JobLease.target.in_([target, ALL_TARGETS]))
+            current = connection.execute(query).first()
+            if current is not None:
+                logging.debug(f"Bail {usage_point_id}/{target} refusé, détenu par {current.holder} ({current.target})")
+                return False
+            connection.execute(
+                JobLease.__table__.insert().values(
+                    usage_point_id=usage_point_id,
+                    target=target,
+                    holder=holder,
+                    acquired_at=now,
+                    expires_at=now + timedelta(seconds=ttl),
+                )
+            )
+        return True
+
+    @writer
+    def renew_leases(self, holder, ttl):
+        """Push back the expiry of every lease of a job.
+
+        Returns:
+            int: The number of leases renewed.
+        """
+        with self.engine.begin() as connection:
+            result = connection.execute(
+                update(JobLease)
+                .where(JobLease.holder == holder)
+                .values(expires_at=datetime.now() + timedelta(seconds=ttl))
+            )
+        return result.rowcount
+
+    @writer
+    def release_lease(self, holder, usage_point_id=None, target=None):
+        """Release the leases of a job, all of them or only those of a usage point and a target."""
+        query = delete(JobLease).where(JobLease.holder == holder)
+        if usage_point_id is not None:
+            query = query.where(JobLease.usage_point_id == usage_point_id)
+        if target is not None:
+            query = query.where(JobLease.target == target)
+        with self.engine.begin() as connection:
+            connection.execute(query)
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # PARTITIONS
+    # ----------------------------------------------------------------------------------------------------------------
+    def load_partitions(self):
+        """Return the monthly partitions of the detail tables, empty if they are not partitioned (e.g. SQLite).
+
+        Returns:
+            dict: The months which have a partition, as a set indexed by partitioned table.
+        """
+        if self.engine.dialect.name != "postgresql":
+            return {}
+        with self.engine.connect() as connection:
+            return partition.list_partitions(connection)
+
+    @writer
+    def ensure_partitions(self, table, begin, end):
+        """Create the missing monthly partitions of `table` between `begin` and `end`, if it is partitioned.
+
+        Args:
+            table (str): The name of the detail table.
+            begin (datetime): A date of the first month.
+            end (datetime): A date of the last month.
+        """
+        if table not in self.partitions:
+            return
+        missing = [month for month in partition.months(begin, end) if month not in self.partitions[table]]
+        if missing:
+            with self.engine.begin() as connection:
+                for month in missing:
+                    logging.info(f"Création de la partition {partition.partition_name(table, month)}")
+                    connection.execute(partition.create_partition(table, month))
+            self.partitions[table].update(missing)
+
+    @writer
+    def purge_detail(self, before, measurement_direction=None):
+        """Delete the detail readings older than `before` for every usage point.
+
+        On a partitioned table the months which end before `before` are dropped with their partition instead of
+        being deleted row by row, only the readings of the remaining month are deleted.
+
+        Args:
+            before (datetime): The first date to keep.
+            measurement_direction (str, optional): "consumption" or "production", both if None. Defaults to None.
+
+        Returns:
+            int: The number of partitions dropped.
+        """
+        dropped = 0
+        for direction in [measurement_direction] if measurement_direction else ["consumption", "production"]:
+            if direction == "consumption":
+                table = ConsumptionDetail
+            else:
+                table = ProductionDetail
+            first = self.session.scalar(select(func.min(table.date)))
+            for usage_point in self.get_usage_point_all():
+                archived_first = self.archive.bounds(usage_point.usage_point_id, direction)[0]
+                if archived_first is None or archived_first >= before:
+                    continue
+                first = archived_first if first is None else min(first, archived_first)
+                # The archived month cut by `before` goes back to the table, older ones are dropped with their file.
+                if before > partition.add_months(before, 0):
+                    self.restore_detail(usage_point.usage_point_id, before, before, direction)
+                archived = self.archive.months(usage_point.usage_point_id, direction)
+                for month in [month for month in archived if partition.add_months(month, 1) <= before]:
+                    self.archive.delete(usage_point.usage_point_id, direction, month)
+            if first is None or first >= before:
+                continue
+            logging.info(f"Suppression des données détaillées de {direction} antérieures au {before:%Y-%m-%d}")
+            with self.engine.begin() as connection:
+                for month in sorted(self.partitions.get(table.__tablename__, [])):
+                    if partition.add_months(month, 1) <= before:
+                        logging.info(f" - {partition.partition_name(table.__tablename__, month)}")
+                        connection.execute(partition.drop_partition(table.__tablename__, month))
+                        self.partitions[table.__tablename__].discard(month)
+                        dropped += 1
+                connection.execute(delete(table).where(table.date < before))
+                for usage_point_id in connection.execute(select(UsagePoints.usage_point_id)).scalars().all():
+                    self.refresh_rollup(usage_point_id, first, before - timedelta(days=1), direction, connection)
+            self.session.expire_all()
+        return dropped
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # ARCHIVE
+    # ----------------------------------------------------------------------------------------------------------------
+    @writer
+    def archive_detail(self, before, usage_point_id=None, measurement_direction=None):
+        """Move the detail readings of the months which end before `before` to the archive files.
+
+        The archived readings are still returned by the detail read methods, and a month is moved back to the table
+        before one of its readings is modified. Their rollups are kept.
+
+        Args:
+            before (datetime): The first date to keep in the table, only whole months before it are archived.
+            usage_point_id (str, optional): The usage point, all of them if None. Defaults to None.
+            measurement_direction (str, optional): "consumption" or "production", both if None. Defaults to None.
+
+        Returns:
+            int: The number of readings archived.
+        """
+        limit = partition.add_months(before, 0)
+        if usage_point_id is None:
+            usage_points = [usage_point.usage_point_id for usage_point in self.get_usage_point_all()]
+        else:
+            usage_points = [usage_point_id]
+        archived = 0
+        for usage_point in usage_points:
+            for direction in [measurement_direction] if measurement_direction else ["consumption", "production"]:
+                if direction == "consumption":
+                    table = ConsumptionDetail
+                else:
+                    table = ProductionDetail
+                first = self.session.scalar(
+                    select(func.min(table.date)).where(table.usage_point_id == usage_point).where(table.date < limit)
+                )
+                if first is None:
+                    continue
+                logging.info(f"[{usage_point}] Archivage des données détaillées de {direction} avant {limit:%Y-%m}")
+                for month in partition.months(first, limit - timedelta(days=1)):
+                    condition = and_(
+                        table.usage_point_id == usage_point,
+                        table.date >= month,
+                        table.date < partition.add_months(month, 1),
+                    )
+                    with self.engine.begin() as connection:
+                        rows = connection.execute(
+                            select(
+                                table.date,
+                                table.value,
+                                table.interval,
+                                table.measure_type,
+                                table.blacklist,
+                                table.fail_count,
+                            )
+                            .where(condition)
+                            .order_by(table.date.asc())
+                        ).all()
+                        if not rows:
+                            continue
+                        if month in self.archive.months(usage_point, direction):
+                            dates = {row.date for row in rows}
+                            archived_rows = self.archive.read(usage_point, direction, month)
+                            rows = rows + [row for row in archived_rows if row.date not in dates]
+                            rows.sort(key=lambda row: row.date)
+                        self.archive.write(usage_point, direction, month, rows)
+                        connection.execute(delete(table).where(condition))
+                    logging.info(f" - {month:%Y-%m} : {len(rows)} lignes")
+                    archived += len(rows)
+        self.session.expire_all()
+        if archived and self.engine.dialect.name == "sqlite":
+            # The pages freed by the archived rows are given back to the file system (after a checkpoint in WAL mode).
+            with self.engine.connect() as connection:
+                connection.exec_driver_sql("VACUUM")
+                connection.exec_driver_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+        return archived
+
+    @writer
+    def restore_detail(self, usage_point_id, begin, end, measurement_direction="consumption"):
+        """Move the archived months between `begin` and `end` back to the detail table, before they are modified.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime): A date of the first month.
+            end (datetime): A date of the last month.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+
+        Returns:
+            int: The number of readings restored.
+        """
+        if begin is None or end is None:
+            return 0
+        archived = self.archive.months(usage_point_id, measurement_direction)
+        months = [month for month in archived if partition.add_months(month, 1) > begin and month <= end]
+        if not months:
+            return 0
+        if measurement_direction == "consumption":
+            table = ConsumptionDetail
+        else:
+            table = ProductionDetail
+        self.ensure_partitions(table.__tablename__, min(months), max(months))
+        usage_point_key = self.usage_point_key(usage_point_id)
+        restored = 0
+        with self.engine.begin() as connection:
+            for month in months:
+                rows = self.archive.read(usage_point_id, measurement_direction, month)
+                connection.execute(
+                    table.__table__.insert(),
+                    [
+                        {"id": row_id(usage_point_key, row.date), "usage_point_id": usage_point_id, **row._asdict()}
+                        for row in rows
+                    ],
+                )
+                logging.info(f"[{usage_point_id}] Restauration de l'archive {month:%Y-%m} ({len(rows)} lignes)")
+                restored += len(rows)
+        for month in months:
+            self.archive.delete(usage_point_id, measurement_direction, month)
+        self.session.expire_all()
+        return restored
+
+    # ----------------------------------------------------------------------------------------------------------------
+    # ROLLUP
+    # ----------------------------------------------------------------------------------------------------------------
+    @writer
+    def refresh_rollup(self, usage_point_id, begin, end, measurement_direction="consumption", connection=None):
+        """Recompute the rollups of the days between `begin` and `end` from their detail readings.
+
+        The hourly and daily rollups of these days are rebuilt from the raw readings, then the monthly and yearly
+        rollups which contain them are summed again from the daily and monthly rows, in one transaction.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime): A date of the first day to refresh.
+            end (datetime): A date of the last day to refresh.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+            connection (Connection, optional): The connection of a running transaction. Defaults to None.
+        """
+        if connection is None:
+            with self.engine.begin() as connection:
+                return self.refresh_rollup(usage_point_id, begin, end, measurement_direction, connection)
+        self.touch_readings(usage_point_id)
+        if measurement_direction == "consumption":
+            table = ConsumptionDetail
+        else:
+            table = ProductionDetail
+        first_day = rollup.period_start(begin, "day")
+        end_day = rollup.period_end(rollup.period_start(end, "day"), "day")
+        readings = connection.execute(
+            select(table.date, table.value, table.interval)
+            .where(table.usage_point_id == usage_point_id)
+            .where(table.date >= first_day)
+            .where(table.date < end_day)
+        ).all()
+        readings += [
+            row
+            for row in self.archive.rows(usage_point_id, measurement_direction, first_day, end_day)
+            if row.date < end_day
+        ]
+        usage_point = connection.execute(
+            select(UsagePoints).where(UsagePoints.usage_point_id == usage_point_id)
+        ).one_or_none()
+        self._replace_rollup(
+            connection,
+            usage_point_id,
+            measurement_direction,
+            ["hour", "day"],
+            first_day,
+            end_day,
+            rollup.aggregate(readings, offpeak_hours(usage_point)),
+        )
+        for period, finer in [("month", "day"), ("year", "month")]:
+            first_day = rollup.period_start(first_day, period)
+            end_day = rollup.period_end(rollup.period_start(end_day - timedelta(days=1), period), period)
+            rows = connection.execute(
+                select(Rollup)
+                .where(Rollup.usage_point_id == usage_point_id)
+                .where(Rollup.measurement_direction == measurement_direction)
+                .where(Rollup.period == finer)
+                .where(Rollup.date >= first_day)
+                .where(Rollup.date < end_day)
+            ).all()
+            self._replace_rollup(
+                connection,
+                usage_point_id,
+                measurement_direction,
+                [period],
+                first_day,
+                end_day,
+                rollup.roll_up(rows, period),
+            )
+
+    @staticmethod
+    def _replace_rollup(connection, usage_point_id, measurement_direction, periods, begin, end, rows):
+        connection.execute(
+            delete(Rollup)
+            .where(Rollup.usage_point_id == usage_point_id)
+            .where(Rollup.measurement_direction == measurement_direction)
+            .where(Rollup.period.in_(periods))
+            .where(Rollup.date >= begin)
+            .where(Rollup.date < end)
+        )
+        if rows:
+            connection.execute(
+                Rollup.__table__.insert(),
+                [
+                    {
+                        "usage_point_id": usage_point_id,
+                        "measurement_direction": measurement_direction,
+                        "period": period,
+                        "date": date,
+                        **columns,
+                    }
+                    for (period, date), columns in rows.items()
+                ],
+            )
+
+    @writer
+    def delete_rollup(self, usage_point_id, measurement_direction=None):
+        self.touch_readings(usage_point_id)
+        query = delete(Rollup).where(Rollup.usage_point_id == usage_point_id)
+        if measurement_direction is not None:
+            query = query.where(Rollup.measurement_direction == measurement_direction)
+        self.session.execute(query)
+        self.session.flush()
+
+    def rollup_missing(self, usage_point_id):
+        """Return True if a usage point has detail readings but no rollup, e.g. after an upgrade of the database."""
+        for direction, table in [("consumption", ConsumptionDetail), ("production", ProductionDetail)]:
+            has_detail = self.session.scalars(
+                select(table.id).where(table.usage_point_id == usage_point_id).limit(1)
+            ).first()
+            has_rollup = self.session.scalars(
+                select(Rollup.date)
+                .where(Rollup.usage_point_id == usage_point_id)
+                .where(Rollup.measurement_direction == direction)
+                .limit(1)
+            ).first()
+            if has_detail is not None and has_rollup is None:
+                return True
+        return False
+
+    @writer
+    def rebuild_rollup(self, usage_point_id, measurement_direction=None):
+        """Rebuild every rollup of a usage point from its detail readings.
+
+        Args:
+            usage_point_id (str): The usage point.
+            measurement_direction (str, optional): "consumption" or "production", both if None. Defaults to None.
+
+        Returns:
+            int: The number of days rebuilt.
+        """
+        days = 0
+        for direction in [measurement_direction] if measurement_direction else ["consumption", "production"]:
+            if direction == "consumption":
+                table = ConsumptionDetail
+            else:
+                table = ProductionDetail
+            logging.info(f"[{usage_point_id}] Reconstruction des agrégats de {direction}")
+            self.delete_rollup(usage_point_id, direction)
+            begin, end = self.session.execute(
+                select(func.min(table.date), func.max(table.date)).where(table.usage_point_id == usage_point_id)
+            ).one()
+            archived_begin, archived_end = self.archive.bounds(usage_point_id, direction)
+            if archived_begin is not None:
+                begin = archived_begin if begin is None else min(begin, archived_begin)
+                end = archived_end if end is None else max(end, archived_end)
+            if begin is not None:
+                self.refresh_rollup(usage_point_id, begin, end, direction)
+                days += (end.date() - begin.date()).days + 1
+        return days
+
+    def check_rollup(self, usage_point_id, measurement_direction=None, tolerance=0.01):
+        """Compare the rollups of a usage point with the aggregates of its detail readings.
+
+        Args:
+            usage_point_id (str): The usage point.
+            measurement_direction (str, optional): "consumption" or "production", both if None. Defaults to None.
+            tolerance (float, optional): The accepted difference between two values, in Wh. Defaults to 0.01.
+
+        Returns:
+            list: The rollups which differ, as dictionaries with `measurement_direction`, `period`, `date`, and the
+                `expected` and `stored` columns (None when the row is missing).
+        """
+        errors = []
+        usage_point = self.get_usage_point(usage_point_id)
+        for direction in [measurement_direction] if measurement_direction else ["consumption", "production"]:
+            if direction == "consumption":
+                table = ConsumptionDetail
+            else:
+                table = ProductionDetail
+            readings = self.session.execute(
+                select(table.date, table.value, table.interval).where(table.usage_point_id == usage_point_id)
+            ).all()
+            readings += list(self.archive.rows(usage_point_id, direction))
+            expected = rollup.aggregate(readings, offpeak_hours(usage_point))
+            days = [{"date": date, **columns} for (period, date), columns in expected.items() if period == "day"]
+            months = rollup.roll_up(days, "month")
+            expected.update(months)
+            expected.update(
+                rollup.roll_up([{"date": date, **columns} for (period, date), columns in months.items()], "year")
+            )
+            stored = {
+                (row.period, row.date): {column: getattr(row, column) for column in rollup.COLUMNS}
+                for row in self.session.scalars(
+                    select(Rollup)
+                    .where(Rollup.usage_point_id == usage_point_id)
+                    .where(Rollup.measurement_direction == direction)
+                )
+            }
+            for key in sorted(set(expected) | set(stored), key=lambda item: (rollup.PERIODS.index(item[0]), item[1])):
+                if key in expected and key in stored:
+                    if all(abs(expected[key][column] - stored[key][column]) <= tolerance for column in rollup.COLUMNS):
+                        continue
+                errors.append(
+                    {
+                        "measurement_direction": direction,
+                        "period": key[0],
+                        "date": key[1],
+                        "expected": expected.get(key),
+                        "stored": stored.get(key),
+                    }
+                )
+        self.session.close()
+        return errors
+
+    def get_rollup(self, usage_point_id, begin, end, measurement_direction="consumption"):
+        """Sum the rollups of the whole days between `begin` and `end`.
+
+        The range is read from the fewest rows : whole years, then whole months, then the remaining days.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime): The start of the range, a day which starts after midnight is left out.
+            end (datetime): The end of the range, its day is included.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+
+        Returns:
+            dict: The summed columns (`value`, `hc`, `hp`, `tempo_hc_morning`, `tempo_hp`, `tempo_hc_evening`, in Wh,
+                and `count`).
+        """
+        first_day = begin.date()
+        if begin.time() != datetime.min.time():
+            first_day = first_day + timedelta(days=1)
+        segments = rollup.cover(first_day, end.date())
+        total = rollup.empty()
+        conditions = [
+            and_(Rollup.period == period, Rollup.date.in_(dates)) for period, dates in segments.items() if dates
+        ]
+        if conditions:
+            query = (
+                select(Rollup)
+                .where(Rollup.usage_point_id == usage_point_id)
+                .where(Rollup.measurement_direction == measurement_direction)
+                .where(or_(*conditions))
+            )
+            for row in self.session.scalars(query):
+                rollup.add(total, row)
+        self.session.close()
+        return total
+
+    def get_rollup_range(
+        self, usage_point_id, begin=None, end=None, measurement_direction="consumption", period="day"
+    ):
+        """Return the rollups of a period type between `begin` and `end` (included), sorted by date.
+
+        Args:
+            usage_point_id (str): The usage point.
+            begin (datetime, optional): The start of the range, the first rollup if None. Defaults to None.
+            end (datetime, optional): The end of the range, the last rollup if None. Defaults to None.
+            measurement_direction (str, optional): "consumption" or "production". Defaults to "consumption".
+            period (str, optional): "hour", "day", "month" or "year". Defaults to "day".
+
+        Returns:
+            list: The Rollup rows.
+        """
+        query = (
+            select(Rollup)
+            .where(Rollup.usage_point_id == usage_point_id)
+            .where(Rollup.measurement_direction == measurement_direction)
+            .where(Rollup.period == period)
+            .order_by(Rollup.date.asc())
+        )
+        if begin is not None:
+            query = query.where(Rollup.date >= begin)
+        if end is not None:
+            query = query.where(Rollup.date <= end)
+        data = self.session.scalars(query).all()
+        self.session.close()
+        return data
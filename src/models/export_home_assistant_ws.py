@@ -213,9 +213,9 @@ class HomeAssistantWs:
                 if "max_date" in self.config:
                     logging.warning("Max date détectée %s", self.config["max_date"])
                     begin = datetime.strptime(self.config["max_date"], "%Y-%m-%d")
-                    detail = DB.get_detail_all(begin=begin, usage_point_id=self.usage_point_id, order_dir="desc")
+                    detail = DB.stream_detail_all(begin=begin, usage_point_id=self.usage_point_id)
                 else:
-                    detail = DB.get_detail_all(usage_point_id=self.usage_point_id, order_dir="desc")
+                    detail = DB.stream_detail_all(usage_point_id=self.usage_point_id)
 
                 cost = 0
                 last_year = None
@@ -421,15 +421,14 @@ class HomeAssistantWs:
                 if "max_date" in self.config:
                     logging.warning("Max date détectée %s", self.config["max_date"])
                     begin = datetime.strptime(self.config["max_date"], "%Y-%m-%d")
-                    detail = DB.get_detail_all(
+                    detail = DB.stream_detail_all(
                         begin=begin,
                         usage_point_id=self.usage_point_id,
                         measurement_direction="production",
-                        order_dir="desc",
                     )
                 else:
-                    detail = DB.get_detail_all(
-                        usage_point_id=self.usage_point_id, measurement_direction="production", order_dir="desc"
+                    detail = DB.stream_detail_all(
+                        usage_point_id=self.usage_point_id, measurement_direction="production"
                     )
 
                 cost = 0
@@ -39,8 +39,7 @@ class ExportInfluxDB:
         else:
             price = self.usage_point_config.production_price
         logging.info(f'Envoi des données "{measurement_direction.upper()}" dans influxdb')
-        get_daily_all = self.db.get_daily_all(self.usage_point_id)
-        get_daily_all_count = len(get_daily_all)
+        get_daily_all_count = self.db.get_daily_count(self.usage_point_id)
         last_data = self.db.get_daily_last_date(self.usage_point_id, measurement_direction)
         first_data = self.db.get_daily_first_date(self.usage_point_id, measurement_direction)
         if last_data and first_data:
@@ -53,7 +52,7 @@ class ExportInfluxDB:
                     count += record.get_value()
             if get_daily_all_count != count:
                 logging.info(f" Cache : {get_daily_all_count} / InfluxDb : {count}")
-                for daily in get_daily_all:
+                for daily in self.db.stream_daily_all(self.usage_point_id, order_dir="desc"):
                     date = daily.date
                     # start = datetime.strftime(date, "%Y-%m-%dT00:00:00Z")
                     # end = datetime.strftime(date, "%Y-%m-%dT23:59:59Z")
@@ -88,10 +87,7 @@ class ExportInfluxDB:
         current_month = ""
         measurement = f"{measurement_direction}_detail"
         logging.info(f'Envoi des données "{measurement.upper()}" dans influxdb')
-        get_detail_all = self.db.get_detail_all(
-            usage_point_id=self.usage_point_id, measurement_direction=measurement_direction
-        )
-        get_detail_all_count = len(get_detail_all)
+        get_detail_all_count = self.db.get_detail_count(self.usage_point_id, measurement_direction)
         last_data = self.db.get_detail_last_date(self.usage_point_id, measurement_direction)
         first_data = self.db.get_detail_first_date(self.usage_point_id, measurement_direction)
         if last_data and first_data:
@@ -103,20 +99,15 @@ class ExportInfluxDB:
                 for record in data.records:
                     count += record.get_value()
 
-            # print(len(get_detail_all))
-            # print(count)
             if get_detail_all_count != count:
                 logging.info(f" Cache : {get_detail_all_count} / InfluxDb : {count}")
-                for index, detail in enumerate(get_detail_all):
+                for detail in self.db.stream_detail_all(
+                    self.usage_point_id, measurement_direction=measurement_direction
+                ):
                     date = detail.date
                     # start = datetime.strftime(date, self.time_format)
                     if current_month != date.strftime("%m"):
                         logging.info(f" - {date.strftime('%Y')}-{date.strftime('%m')}")
-                    # if index < (len(get_detail_all) - 1):
-                    #     next_item = get_detail_all[index + 1]
-                    #     end = datetime.strftime(next_item.date, self.time_format)
-                    # else:
-                    #     end = datetime.strftime(date, "%Y-%m-%dT23:59:59Z")
                     # if len(INFLUXDB.get(start, end, measurement)) == 0:
                     watt = detail.value
                     kwatt = watt / 1000
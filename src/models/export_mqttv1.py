@@ -1,5 +1,6 @@
 import logging
 from datetime import datetime
+from itertools import islice
 
 from dateutil.relativedelta import relativedelta
 
@@ -137,53 +138,37 @@ class ExportMqtt:
         week_euro = {}
         week_begin = datetime.now()
         week_end = datetime.now()
-        week_idx = 0
-        current_month_year = ""
-        current_this_month_year = ""
 
-        for data in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            date = data.date
-            watt = data.value
-            kwatt = data.value / 1000
-            euro = kwatt * price
-            this_year_begin = date
-            if this_year_end == "":
-                this_year_end = date
-            this_year_watt = this_year_watt + watt
+        # The months are summed by the database, only the year of the last reading is detailed.
+        months = self.db.get_daily_totals(self.usage_point_id, "month", begin, end, self.measurement_direction)
+        if months:
+            this_year_begin = months[0].begin
+            current_year = months[-1].year
+        for data in months:
+            euro = data.value / 1000 * price
+            this_year_watt = this_year_watt + data.value
             this_year_euro = this_year_euro + euro
+            if data.year == current_year:
+                month = f"{data.month:02d}"
+                month_watt[month] = data.value
+                month_euro[month] = euro
+                month_end[month] = data.end
+                if data.count > 1:
+                    month_begin[month] = data.begin
+                if data.month == datetime.now().month:
+                    this_month_begin = data.begin
+                    this_month_watt = data.value
+                    this_month_euro = euro
 
-            if current_month_year == "":
-                current_month_year = date.strftime("%Y")
-            if date.strftime("%Y") == current_month_year:
-                if date.strftime("%m") not in month_watt:
-                    month_watt[date.strftime("%m")] = watt
-                    month_euro[date.strftime("%m")] = euro
-                    month_end[date.strftime("%m")] = date
-                else:
-                    month_watt[date.strftime("%m")] = month_watt[date.strftime("%m")] + watt
-                    month_euro[date.strftime("%m")] = month_euro[date.strftime("%m")] + euro
-                    month_begin[date.strftime("%m")] = date
-
-            if week_idx < 7:
-                week_begin = date
-                if week_end == "":
-                    week_end = date
-                if date not in week_watt:
-                    week_watt[date] = watt
-                    week_euro[date] = euro
-                else:
-                    week_watt[date] = week_watt[date] + watt
-                    week_euro[date] = week_euro[date] + euro
+        # The last 7 days read.
+        last_days = self.db.stream_daily_all(
+            self.usage_point_id, begin, end, self.measurement_direction, order_dir="desc", batch_size=7
+        )
+        for data in islice(last_days, 7):
+            week_begin = data.date
+            week_watt[data.date] = data.value
+            week_euro[data.date] = data.value / 1000 * price
 
-            if current_this_month_year == "":
-                current_this_month_year = date.strftime("%Y")
-            if date.strftime("%m") == datetime.now().strftime("%m") and date.strftime("%Y") == current_this_month_year:
-                this_month_begin = date
-                if this_month_end == "":
-                    this_month_end = date
-                this_month_watt = this_month_watt + watt
-                this_month_euro = this_month_euro + euro
-            week_idx = week_idx + 1
         # MQTT FORMATTING
         mqtt_data = {
             f"{prefix}/thisYear/dateBegin": this_year_begin.strftime(self.date_format),
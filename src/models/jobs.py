@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import time
 import traceback
@@ -9,6 +10,7 @@ from models.export_home_assistant import HomeAssistant
 from models.export_home_assistant_ws import HomeAssistantWs
 from models.export_influxdb import ExportInfluxDB
 from models.export_mqtt import ExportMqtt
+from models.lease import ALL_TARGETS, SHARED, Leases
 from models.query_address import Address
 from models.query_contract import Contract
 from models.query_daily import Daily
@@ -19,6 +21,9 @@ from models.query_status import Status
 from models.query_tempo import Tempo
 from models.stat import Stat
 
+# Targets of the data shared by every usage point, imported once per job.
+SHARED_TARGETS = ["gateway_status", "tempo", "ecowatt"]
+
 
 class Job:
     def __init__(self, usage_point_id=None):
@@ -32,6 +37,10 @@ class Job:
         self.influxdb_config = self.config.influxdb_config()
         self.wait_job_start = 10
         self.tempo_enable = False
+        import_config = self.config.import_config() or {}
+        self.import_concurrency = int(import_config.get("concurrency", 1))
+        self.import_concurrency_per_token = int(import_config.get("concurrency_per_token", 1))
+        self.lease_ttl = int(import_config.get("lease_ttl", 900))
 
         if self.usage_point_id is None:
             self.usage_points = self.db.get_usage_point_all()
@@ -45,10 +54,21 @@ class Job:
             self.job_import_data()
 
     def job_import_data(self, wait=True, target=None):
-        if self.db.lock_status():
-            return {"status": False, "notif": "Importation déjà en cours..."}
-        else:
-            self.db.lock()
+        with Leases(self.db, self.lease_ttl) as leases:
+            # The data shared by every usage point and each usage point are leased apart, so that an import of
+            # another usage point or of another target runs at the same time instead of being rejected.
+            shared = (target is None or target in SHARED_TARGETS) and leases.acquire(SHARED, target or ALL_TARGETS)
+            busy = (target is None or target in SHARED_TARGETS) and not shared
+            usage_points = []
+            if target not in SHARED_TARGETS:
+                for usage_point in self.usage_points:
+                    if not usage_point.enable or leases.acquire(usage_point.usage_point_id, target or ALL_TARGETS):
+                        usage_points.append(usage_point)
+                    else:
+                        logging.warning(f"[{usage_point.usage_point_id}] Importation déjà en cours, ignoré.")
+                        busy = True
+            if busy and not leases.held:
+                return {"status": False, "notif": "Importation déjà en cours..."}
 
             if wait:
                 title("Démarrage du job d'importation dans 10s")
@@ -58,55 +78,31 @@ class Job:
                     time.sleep(1)
                     i = i - 1
 
-            if target == "gateway_status" or target is None:
+            if shared and (target == "gateway_status" or target is None):
                 self.get_gateway_status()
 
             # ######################################################################################################
             # FETCH TEMPO DATA
-            if target == "tempo" or target is None:
+            if shared and (target == "tempo" or target is None):
                 self.get_tempo()
 
             # ######################################################################################################
             # FETCH ECOWATT DATA
-            if target == "ecowatt" or target is None:
+            if shared and (target == "ecowatt" or target is None):
                 self.get_ecowatt()
 
-            for self.usage_point_config in self.usage_points:
+            enabled_usage_points = [usage_point for usage_point in usage_points if usage_point.enable]
+            concurrent = self.import_concurrency > 1 and len(enabled_usage_points) > 1
+            if concurrent:
+                self.fetch_usage_points_concurrently(enabled_usage_points, target)
+
+            for self.usage_point_config in usage_points:
                 self.usage_point_id = self.usage_point_config.usage_point_id
                 log_usage_point_id(self.usage_point_id)
-                self.db.last_call_update(self.usage_point_id)
                 if self.usage_point_config.enable:
-                    #######################################################################################################
-                    # CHECK ACCOUNT DATA
-                    if target == "account_status" or target is None:
-                        self.get_account_status()
-
-                    #######################################################################################################
-                    # CONTRACT
-                    if target == "contract" or target is None:
-                        self.get_contract()
-
-                    #######################################################################################################
-                    # ADDRESSE
-                    if target == "addresses" or target is None:
-                        self.get_addresses()
-
-                    #######################################################################################################
-                    # CONSUMPTION / PRODUCTION
-                    if target == "consumption" or target is None:
-                        self.get_consumption()
-
-                    if target == "consumption_detail" or target is None:
-                        self.get_consumption_detail()
-
-                    if target == "production" or target is None:
-                        self.get_production()
-
-                    if target == "production_detail" or target is None:
-                        self.get_production_detail()
-
-                    if target == "consumption_max_power" or target is None:
-                        self.get_consumption_max_power()
+                    if not concurrent:
+                        self.db.last_call_update(self.usage_point_id)
+                        self.fetch_usage_point(target)
 
                     #######################################################################################################
                     # STATISTIQUES
@@ -132,7 +128,9 @@ class Job:
                     # INFLUXDB
                     if target == "influxdb" or target is None:
                         self.export_influxdb()
+                    leases.release(self.usage_point_id)
                 else:
+                    self.db.last_call_update(self.usage_point_id)
                     logging.info(
                         f" => Point de livraison Désactivé dans la configuration (Exemple: https://tinyurl.com/2kbd62s9)."
                     )
@@ -140,9 +138,85 @@ class Job:
             finish()
 
             self.usage_point_id = None
-            self.db.unlock()
             return {"status": True, "notif": "Importation terminée"}
 
+    def fetch_usage_point(self, target=None):
+        """Fetch every gateway dataset of the current usage point, one after the other."""
+        #######################################################################################################
+        # CHECK ACCOUNT DATA
+        if target == "account_status" or target is None:
+            self.get_account_status()
+
+        #######################################################################################################
+        # CONTRACT
+        if target == "contract" or target is None:
+            self.get_contract()
+
+        #######################################################################################################
+        # ADDRESSE
+        if target == "addresses" or target is None:
+            self.get_addresses()
+
+        #######################################################################################################
+        # CONSUMPTION / PRODUCTION
+        if target == "consumption" or target is None:
+            self.get_consumption()
+
+        if target == "consumption_detail" or target is None:
+            self.get_consumption_detail()
+
+        if target == "production" or target is None:
+            self.get_production()
+
+        if target == "production_detail" or target is None:
+            self.get_production_detail()
+
+        if target == "consumption_max_power" or target is None:
+            self.get_consumption_max_power()
+
+    def fetch_usage_points_concurrently(self, usage_points, target=None):
+        """Fetch the gateway data of several usage points at the same time.
+
+        Each usage point runs its own fetch pipeline in a worker thread, scheduled by an asyncio event loop under a
+        global concurrency cap and a per-token cap. Database writes are serialized by the database writer, so the
+        wall-clock time of the cycle follows the slowest usage point instead of the sum of all of them.
+
+        Args:
+            usage_points (list): The enabled usage points to import.
+            target (str, optional): Restrict the import to a single dataset. Defaults to None.
+        """
+        title(
+            f"Importation simultanée de {len(usage_points)} points de livraison "
+            f"(max {self.import_concurrency}, {self.import_concurrency_per_token} par token)"
+        )
+        start = time.time()
+        results = asyncio.run(self._fetch_usage_points(usage_points, target))
+        for usage_point, result in zip(usage_points, results):
+            if isinstance(result, Exception):
+                logging.error(f"[{usage_point.usage_point_id}] Erreur lors de l'importation")
+                logging.error(result)
+        logging.info(f"Importation simultanée terminée en {round(time.time() - start, 2)}s")
+
+    async def _fetch_usage_points(self, usage_points, target):
+        global_limit = asyncio.Semaphore(self.import_concurrency)
+        token_limits = {}
+
+        async def fetch(usage_point):
+            token_limit = token_limits.setdefault(
+                usage_point.token, asyncio.Semaphore(self.import_concurrency_per_token)
+            )
+            async with global_limit, token_limit:
+                await asyncio.to_thread(self._fetch_usage_point_worker, usage_point.usage_point_id, target)
+
+        return await asyncio.gather(*[fetch(usage_point) for usage_point in usage_points], return_exceptions=True)
+
+    @staticmethod
+    def _fetch_usage_point_worker(usage_point_id, target):
+        job = Job(usage_point_id)
+        job.usage_point_config = job.usage_points[0]
+        job.db.last_call_update(usage_point_id)
+        job.fetch_usage_point(target)
+
     def header_generate(self, token=True):
         output = {
             "Content-Type": "application/json",
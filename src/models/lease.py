@@ -0,0 +1,68 @@
+"""Leases of the import jobs on a usage point and a target."""
+import logging
+import os
+import socket
+import threading
+import uuid
+
+# Target of a lease which covers every target of the usage point.
+ALL_TARGETS = "*"
+# Usage point of the leases on the data shared by every usage point (gateway status, Tempo, EcoWatt).
+SHARED = "*"
+
+
+class Leases:
+    """The leases held by an import job, renewed in the background until they are released.
+
+    A job takes a lease per (usage point, target) before importing it: jobs on other usage points or other targets run
+    at the same time, and the lease of a job which crashed expires after `ttl` seconds instead of blocking the next
+    imports until a restart.
+
+    Example usage:
+        with Leases(DB, ttl=900) as leases:
+            if leases.acquire("pdl1", "consumption"):
+                ...
+                leases.release("pdl1")
+    """
+
+    def __init__(self, db, ttl=900):
+        self.db = db
+        self.ttl = ttl
+        self.holder = f"{socket.gethostname()}/{os.getpid()}/{uuid.uuid4().hex[:8]}"
+        self.held = set()
+        self.stop = threading.Event()
+        self.heartbeat = None
+
+    def acquire(self, usage_point_id, target):
+        """Take the lease of a usage point and a target, return False if another job holds an overlapping one."""
+        if self.db.acquire_lease(usage_point_id, target, self.holder, self.ttl):
+            self.held.add((usage_point_id, target))
+            return True
+        return False
+
+    def release(self, usage_point_id, target=None):
+        """Release the leases of a usage point, all of them or only the one of `target`."""
+        self.db.release_lease(self.holder, usage_point_id, target)
+        self.held = {lease for lease in self.held if lease[0] != usage_point_id or target not in [None, lease[1]]}
+
+    def release_all(self):
+        self.db.release_lease(self.holder)
+        self.held = set()
+
+    def renew(self):
+        while not self.stop.wait(self.ttl / 3):
+            if self.held:
+                try:
+                    self.db.renew_leases(self.holder, self.ttl)
+                except Exception as e:
+                    logging.error(f"Erreur lors du renouvellement des baux d'importation : {e}")
+
+    def __enter__(self):
+        self.heartbeat = threading.Thread(target=self.renew, name="lease-heartbeat", daemon=True)
+        self.heartbeat.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop.set()
+        self.heartbeat.join()
+        self.release_all()
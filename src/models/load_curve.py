@@ -0,0 +1,95 @@
+"""Parse the load curves returned by the gateway."""
+import functools
+import re
+from array import array
+from datetime import datetime, timedelta
+
+EPOCH = datetime(1970, 1, 1)
+
+
+@functools.lru_cache(maxsize=64)
+def parse_interval(interval_length):
+    """Return the length of an interval in minutes (e.g. "PT30M" => 30).
+
+    The gateway only uses a handful of different values, so every parsed value is cached.
+
+    Args:
+        interval_length (str): The `interval_length` of a reading.
+
+    Returns:
+        int: The number of minutes.
+    """
+    return int(re.findall(r"\d+", interval_length)[0])
+
+
+@functools.lru_cache(maxsize=4096)
+def _day_epoch(day):
+    return (datetime(int(day[0:4]), int(day[5:7]), int(day[8:10])) - EPOCH).days * 86400
+
+
+def parse_epoch(date):
+    """Return the epoch seconds of a "%Y-%m-%d %H:%M:%S" date, without timezone conversion.
+
+    Every reading of a day shares the same date part, which is converted once and cached; the time part is computed
+    from its digits. Other ISO 8601 formats fall back on `datetime.fromisoformat`.
+
+    Args:
+        date (str): The date of a reading.
+
+    Returns:
+        int: The number of seconds since 1970-01-01 00:00:00.
+    """
+    if len(date) == 19 and date[10] in " T" and date[13] == ":" and date[16] == ":":
+        return _day_epoch(date[0:10]) + int(date[11:13]) * 3600 + int(date[14:16]) * 60 + int(date[17:19])
+    return int((datetime.fromisoformat(date).replace(tzinfo=None) - EPOCH).total_seconds())
+
+
+def parse_datetime(date):
+    """Return the datetime of a "%Y-%m-%d %H:%M:%S" date through the fast path of `parse_epoch`."""
+    return EPOCH + timedelta(seconds=parse_epoch(date))
+
+
+class LoadCurve:
+    """Columnar view of a load curve: start epoch seconds, value and interval of every reading.
+
+    The gateway dates a reading at the end of its interval; the load curve stores the start of the interval, which is
+    the date saved in the database.
+
+    Example usage:
+        curve = LoadCurve.parse(meter_reading["interval_reading"])
+        DB.insert_detail_bulk(usage_point_id, curve, "consumption")
+    """
+
+    def __init__(self):
+        self.epochs = array("q")
+        self.values = array("q")
+        self.intervals = array("H")
+
+    @classmethod
+    def parse(cls, interval_reading):
+        """Parse the `interval_reading` list of a gateway payload in one pass.
+
+        Args:
+            interval_reading (list): The readings, with their `date`, `value` and `interval_length`.
+
+        Returns:
+            LoadCurve: The parsed load curve.
+        """
+        curve = cls()
+        epochs = curve.epochs.append
+        values = curve.values.append
+        intervals = curve.intervals.append
+        for reading in interval_reading:
+            interval = parse_interval(reading["interval_length"])
+            epochs(parse_epoch(reading["date"]) - interval * 60)
+            values(int(reading["value"]))
+            intervals(interval)
+        return curve
+
+    def __len__(self):
+        return len(self.epochs)
+
+    def __iter__(self):
+        """Yield the readings as the dictionaries expected by `Database.insert_detail_bulk`."""
+        for epoch, value, interval in zip(self.epochs, self.values, self.intervals):
+            yield {"date": EPOCH + timedelta(seconds=epoch), "value": value, "interval": interval}
@@ -0,0 +1,174 @@
+"""Streaming import of the readings of another database, the enedisgateway.db of the v7 or another cache.db."""
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from functools import partial
+
+from sqlalchemy import create_engine, inspect, text
+
+# A table of the source database: the kind of readings it holds, the columns read and the conversion of a row.
+Step = namedtuple("Step", ["table", "kind", "measurement_direction", "columns", "convert"])
+
+
+def parse_date(value):
+    """Return a date read from SQLite, where SQLAlchemy stores them as text."""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+def v7_daily(row):
+    return {"usage_point_id": row[0], "date": parse_date(row[1]), "value": row[2]}
+
+
+def v7_detail(row):
+    return {
+        "usage_point_id": row[0],
+        # The v7 dated a reading at the end of its interval.
+        "date": parse_date(row[1]) - timedelta(minutes=30),
+        "value": row[2],
+        "interval": row[3],
+        "measure_type": row[4],
+    }
+
+
+def cache_reading(columns, row):
+    reading = dict(zip(columns, row))
+    for column in ["date", "event_date"]:
+        if column in reading:
+            reading[column] = parse_date(reading[column])
+    return reading
+
+
+DAILY = ["usage_point_id", "date", "value", "blacklist", "fail_count"]
+DETAIL = ["usage_point_id", "date", "value", "interval", "measure_type", "blacklist", "fail_count"]
+MAX_POWER = DAILY + ["event_date"]
+
+SCHEMAS = {
+    "v7": [
+        Step("consumption_daily", "daily", "consumption", ["*"], v7_daily),
+        Step("consumption_detail", "detail", "consumption", ["*"], v7_detail),
+        Step("production_daily", "daily", "production", ["*"], v7_daily),
+        Step("production_detail", "detail", "production", ["*"], v7_detail),
+    ],
+    "cache": [
+        Step("consumption_daily", "daily", "consumption", DAILY, partial(cache_reading, DAILY)),
+        Step("consumption_detail", "detail", "consumption", DETAIL, partial(cache_reading, DETAIL)),
+        Step("production_daily", "daily", "production", DAILY, partial(cache_reading, DAILY)),
+        Step("production_detail", "detail", "production", DETAIL, partial(cache_reading, DETAIL)),
+        Step(
+            "consumption_daily_max_power",
+            "daily",
+            "consumption_max_power",
+            MAX_POWER,
+            partial(cache_reading, MAX_POWER),
+        ),
+    ],
+}
+
+
+class Migration:
+    """Copy the readings of a SQLite database into the current one, in batches and resuming after an interruption.
+
+    Each table is read in pages of `batch_size` rows following its rowid, and the rowid of the last page written is
+    checkpointed in the config table: the memory used does not depend on the size of the source, and an import which
+    was interrupted (power cut, out of memory, restart) carries on with the next page. A page written twice is
+    harmless, the readings are upserted.
+
+    Example usage:
+        Migration(DB, "/data/enedisgateway.db", schema="v7").run(create_usage_points=True)
+    """
+
+    def __init__(self, db, path, schema="cache", batch_size=5000):
+        self.db = db
+        self.path = path
+        self.schema = schema
+        self.batch_size = batch_size
+        self.usage_points = {}
+
+    def checkpoint_key(self, table):
+        return f"import:{os.path.abspath(self.path)}:{table}"
+
+    def checkpoint(self, table):
+        """Return the progress of the import of a table: the last rowid written, the rows read and if it is done."""
+        config = self.db.get_config(self.checkpoint_key(table))
+        if config is None:
+            return {"rowid": 0, "rows": 0, "done": False}
+        return json.loads(config.value)
+
+    def run(self, restart=False, create_usage_points=False):
+        """Import every table of the source database.
+
+        Args:
+            restart (bool, optional): Ignore the checkpoints and import everything again. Defaults to False.
+            create_usage_points (bool, optional): Create the usage points unknown to the current database (disabled),
+                otherwise their readings are skipped. Defaults to False.
+
+        Returns:
+            dict: The number of rows read, indexed by table.
+        """
+        engine = create_engine(f"sqlite:///{self.path}")
+        result = {}
+        try:
+            with engine.connect() as connection:
+                tables = inspect(connection).get_table_names()
+                for step in SCHEMAS[self.schema]:
+                    if step.table not in tables:
+                        logging.warning(f' - "{step.table}" absente de {self.path}, ignorée.')
+                        continue
+                    result[step.table] = self.import_table(connection, step, restart, create_usage_points)
+        finally:
+            engine.dispose()
+        return result
+
+    def import_table(self, connection, step, restart, create_usage_points):
+        progress = {"rowid": 0, "rows": 0, "done": False} if restart else self.checkpoint(step.table)
+        if progress["done"]:
+            logging.info(f' - "{step.table}" déjà importée ({progress["rows"]} lignes)')
+            return progress["rows"]
+        total = connection.execute(text(f"SELECT count(*) FROM {step.table}")).scalar()
+        logging.warning(f'Import des "{step.table}" ({total} lignes, reprise après {progress["rows"]})')
+        query = text(
+            f"SELECT rowid, {', '.join(step.columns)} FROM {step.table} "
+            "WHERE rowid > :rowid ORDER BY rowid LIMIT :limit"
+        )
+        start = time.monotonic()
+        imported = 0
+        while True:
+            rows = connection.execute(query, {"rowid": progress["rowid"], "limit": self.batch_size}).fetchall()
+            if not rows:
+                break
+            readings = {}
+            for row in rows:
+                reading = step.convert(tuple(row)[1:])
+                readings.setdefault(reading.pop("usage_point_id"), []).append(reading)
+            for usage_point_id, data in readings.items():
+                if self.known(usage_point_id, create_usage_points):
+                    if step.kind == "detail":
+                        self.db.insert_detail_bulk(usage_point_id, data, step.measurement_direction)
+                    else:
+                        self.db.insert_daily_bulk(usage_point_id, data, step.measurement_direction)
+            progress["rowid"] = rows[-1][0]
+            progress["rows"] += len(rows)
+            imported += len(rows)
+            self.db.set_config(self.checkpoint_key(step.table), progress)
+            rate = imported / max(time.monotonic() - start, 1e-6)
+            logging.info(f' - "{step.table}" : {progress["rows"]}/{total} lignes ({round(rate)} lignes/s)')
+        progress["done"] = True
+        self.db.set_config(self.checkpoint_key(step.table), progress)
+        return progress["rows"]
+
+    def known(self, usage_point_id, create_usage_points):
+        """Check if the readings of a usage point can be imported, creating it if allowed."""
+        if usage_point_id not in self.usage_points:
+            known = self.db.get_usage_point(usage_point_id) is not None
+            if not known and create_usage_points:
+                self.db.set_usage_point(usage_point_id, {"enable": False})
+                known = True
+            elif not known:
+                logging.warning(f"[{usage_point_id}] Point de livraison inconnu, ses données ne sont pas importées.")
+            self.usage_points[usage_point_id] = known
+        return self.usage_points[usage_point_id]
@@ -0,0 +1,138 @@
+"""Classify the readings of a usage point in peak (HP) / off-peak (HC) hours."""
+import functools
+from datetime import datetime
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def offpeak_hours(usage_point):
+    """Return the off-peak hours of a usage point per weekday.
+
+    Args:
+        usage_point (UsagePoints): The usage point.
+
+    Returns:
+        dict: The `offpeak_hours_<weekday>` values (e.g. "22H00-6H00;12H00-14H00"), indexed by weekday (0 = Monday).
+    """
+    return {weekday: getattr(usage_point, f"offpeak_hours_{weekday}", None) for weekday in range(0, 7)}
+
+
+def is_between(time, time_range):
+    """Check if a given time is between a specified time range.
+
+    Args:
+        time (str): The time to check ("%H:%M").
+        time_range (tuple): The (begin, end) times of the range ("%H:%M"), the range may span midnight.
+
+    Returns:
+        bool: True if the time is between the time range, False otherwise.
+    """
+    time = time.replace(":", "")
+    start = time_range[0].replace(":", "")
+    end = time_range[1].replace(":", "")
+    if end < start:
+        return time >= start or time < end
+    return start <= time < end
+
+
+def offpeak_ranges(day_offpeak_hour):
+    """Parse the off-peak hours of a day.
+
+    Args:
+        day_offpeak_hour (str): The off-peak hours of the day, e.g. "22H00-6H00;12H00-14H00".
+
+    Returns:
+        list: The (begin, end) minutes of the day of each range, the end is excluded and may be before the begin when
+            the range spans midnight.
+    """
+    ranges = []
+    if day_offpeak_hour is not None:
+        for offpeak_hour in day_offpeak_hour.split(";"):
+            if offpeak_hour != "None" and offpeak_hour != "" and offpeak_hour is not None:
+                minutes = []
+                for bound in offpeak_hour.split("-")[:2]:
+                    moment = datetime.strptime(bound.replace("h", ":").replace("H", ":"), "%H:%M")
+                    minutes.append(moment.hour * 60 + moment.minute)
+                ranges.append(tuple(minutes))
+    return ranges
+
+
+def minute_of_week(date):
+    return date.weekday() * MINUTES_PER_DAY + date.hour * 60 + date.minute
+
+
+class OffpeakCalendar:
+    """The off-peak hours of a usage point compiled in a table of every minute of the week.
+
+    The off-peak hours strings are parsed once, then a date is classified with a single lookup in the table instead of
+    parsing them again for each reading.
+
+    Example usage:
+        calendar = offpeak_calendar(offpeak_hours(usage_point))
+        calendar.mesure_type(datetime(2024, 1, 1, 23, 30))  # "HC"
+    """
+
+    def __init__(self, day_offpeak_hours):
+        # 1 for the off-peak minutes, indexed by weekday * 1440 + minute of the day.
+        self.table = bytearray(7 * MINUTES_PER_DAY)
+        for weekday in range(0, 7):
+            offset = weekday * MINUTES_PER_DAY
+            for begin, end in offpeak_ranges(day_offpeak_hours.get(weekday)):
+                if end < begin:
+                    self.table[offset + begin : offset + MINUTES_PER_DAY] = b"\x01" * (MINUTES_PER_DAY - begin)
+                    self.table[offset : offset + end] = b"\x01" * end
+                elif begin < end:
+                    self.table[offset + begin : offset + end] = b"\x01" * (end - begin)
+
+    def is_offpeak(self, measurement_date):
+        return self.table[minute_of_week(measurement_date)] == 1
+
+    def mesure_type(self, measurement_date):
+        """Return the measurement type of a date, "HC" (off-peak) or "HP" (peak)."""
+        return "HC" if self.is_offpeak(measurement_date) else "HP"
+
+    def classify(self, dates):
+        """Return the measurement type of each date of a sequence.
+
+        Args:
+            dates (iterable): The dates of the readings.
+
+        Returns:
+            list: "HC" or "HP" for each date, in the same order.
+        """
+        table = self.table
+        types = ("HP", "HC")
+        return [types[table[minute_of_week(date)]] for date in dates]
+
+
+@functools.lru_cache(maxsize=64)
+def compile_offpeak_hours(day_offpeak_hours):
+    return OffpeakCalendar(dict(enumerate(day_offpeak_hours)))
+
+
+def offpeak_calendar(day_offpeak_hours):
+    """Return the compiled off-peak hours of a usage point.
+
+    The calendars are cached by the off-peak hours themselves: a change of the configuration of the usage point
+    compiles a new one, there is nothing to invalidate.
+
+    Args:
+        day_offpeak_hours (dict): The off-peak hours per weekday, as returned by `offpeak_hours`.
+
+    Returns:
+        OffpeakCalendar: The compiled off-peak hours.
+    """
+    return compile_offpeak_hours(tuple(day_offpeak_hours.get(weekday) for weekday in range(0, 7)))
+
+
+def mesure_type(day_offpeak_hours, measurement_date):
+    """Determine the measurement type (HP or HC) of a date.
+
+    Args:
+        day_offpeak_hours (dict): The off-peak hours per weekday, as returned by `offpeak_hours`.
+        measurement_date (datetime): The date of the reading.
+
+    Returns:
+        str: The measurement type, either "HP" (peak) or "HC" (off-peak).
+    """
+    return offpeak_calendar(day_offpeak_hours).mesure_type(measurement_date)
@@ -0,0 +1,85 @@
+"""Monthly range partitions of the detail tables on PostgreSQL."""
+import re
+from datetime import datetime
+
+from sqlalchemy import text
+
+PARTITIONED_TABLES = ["consumption_detail", "production_detail"]
+
+PARTITION_SUFFIX = re.compile(r"_(\d{4})_(\d{2})$")
+
+
+def add_months(moment, count):
+    """Return the first moment of the month `count` months after the one which contains `moment`."""
+    index = moment.year * 12 + moment.month - 1 + count
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def months(begin, end):
+    """Return the first moment of every month between `begin` and `end` (both included)."""
+    result = []
+    month = add_months(begin, 0)
+    while month <= end:
+        result.append(month)
+        month = add_months(month, 1)
+    return result
+
+
+def partition_name(table, month):
+    """Return the name of the partition of `table` which holds `month`, e.g. consumption_detail_2024_01."""
+    return f"{table}_{month.strftime('%Y_%m')}"
+
+
+def partition_month(name):
+    """Return the month held by a partition from its name, None if the name is not one of a monthly partition."""
+    match = PARTITION_SUFFIX.search(name)
+    if match is None:
+        return None
+    return datetime(int(match.group(1)), int(match.group(2)), 1)
+
+
+def create_partition(table, month):
+    """Return the statement creating the partition of `table` which holds `month`, if it does not exist yet."""
+    return text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat(' ')}') TO ('{add_months(month, 1).isoformat(' ')}')"
+    )
+
+
+def drop_partition(table, month):
+    """Return the statement dropping the partition of `table` which holds `month` with all its rows."""
+    return text(f"DROP TABLE IF EXISTS {partition_name(table, month)}")
+
+
+def list_partitions(connection):
+    """Return the monthly partitions of the partitioned detail tables.
+
+    Args:
+        connection (Connection): A connection to a PostgreSQL database.
+
+    Returns:
+        dict: The months which have a partition, as a set indexed by table. Only the partitioned tables are listed.
+    """
+    partitioned = connection.execute(
+        text(
+            "SELECT parent.relname FROM pg_partitioned_table "
+            "JOIN pg_class parent ON parent.oid = pg_partitioned_table.partrelid "
+            "WHERE parent.relname = ANY(:tables)"
+        ),
+        {"tables": PARTITIONED_TABLES},
+    ).scalars()
+    result = {table: set() for table in partitioned}
+    rows = connection.execute(
+        text(
+            "SELECT parent.relname, child.relname FROM pg_inherits "
+            "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE parent.relname = ANY(:tables)"
+        ),
+        {"tables": PARTITIONED_TABLES},
+    )
+    for parent, child in rows:
+        month = partition_month(child)
+        if parent in result and month is not None:
+            result[parent].add(month)
+    return result
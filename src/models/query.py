@@ -1,15 +1,181 @@
+import codecs
+import json
 import logging
+import threading
 
 import requests
+from requests.adapters import HTTPAdapter
 
 from dependencies import str2bool
 from init import CONFIG
 
+GATEWAY_DEFAULT_CONFIG = {
+    "pool_connections": 4,
+    "pool_maxsize": 10,
+    "connect_timeout": 10,
+    "timeout": 60,
+}
+
+DEBUG_BODY_LIMIT = 1000
+STREAM_CHUNK_SIZE = 64 * 1024
+# The rest of a streamed body shorter than this is read, to give its connection back to the keep-alive pool. A longer
+# one is dropped with its connection.
+STREAM_DRAIN_LIMIT = 256 * 1024
+
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def gateway_config():
+    """Return the HTTP client configuration merged with the default values.
+
+    Returns:
+        dict: The pool sizes and timeouts used to reach the gateway.
+    """
+    config = dict(GATEWAY_DEFAULT_CONFIG)
+    custom_config = CONFIG.gateway_config()
+    if custom_config:
+        for key, value in custom_config.items():
+            if key in config and value is not None:
+                config[key] = int(value)
+    return config
+
+
+def get_session():
+    """Return the process-wide HTTP session shared by every Query.
+
+    The session keeps a keep-alive connection pool per host, so consecutive calls to the gateway reuse the same
+    TCP/TLS connection instead of opening a new one.
+
+    Returns:
+        requests.Session: The shared session.
+    """
+    global _SESSION
+    if _SESSION is None:
+        with _SESSION_LOCK:
+            if _SESSION is None:
+                config = gateway_config()
+                adapter = HTTPAdapter(
+                    pool_connections=config["pool_connections"],
+                    pool_maxsize=config["pool_maxsize"],
+                )
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _SESSION = session
+    return _SESSION
+
+
+def close_session():
+    """Close the shared HTTP session and release its pooled connections."""
+    global _SESSION
+    with _SESSION_LOCK:
+        if _SESSION is not None:
+            _SESSION.close()
+            _SESSION = None
+
+
+def truncate(text, limit=DEBUG_BODY_LIMIT):
+    """Shorten a response body before it is written to the debug log.
+
+    Args:
+        text (str): The body.
+        limit (int, optional): The maximum number of characters kept. Defaults to DEBUG_BODY_LIMIT.
+
+    Returns:
+        str: The body, cut after `limit` characters.
+    """
+    if text is None or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} caractères)"
+
+
+def iter_json_items(response, key, chunk_size=STREAM_CHUNK_SIZE):
+    """Yield the items of the first JSON array named `key` while the body is read from the socket.
+
+    Only the current chunk and the item being decoded are kept in memory, instead of the whole body and the whole
+    decoded document. Responses that were not requested with `stream=True` are decoded from their text.
+
+    Args:
+        response (requests.Response): The gateway response.
+        key (str): The name of the array, e.g. "interval_reading".
+        chunk_size (int, optional): The number of bytes read from the socket at once. Defaults to 64 KiB.
+
+    Yields:
+        dict: The next item of the array.
+
+    Raises:
+        ValueError: The body does not contain the array or is not valid JSON.
+    """
+    if not hasattr(response, "iter_content"):
+        yield from _iter_json_items([response.text or ""], key)
+        return
+    content = response.iter_content(chunk_size=chunk_size)
+    decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")()
+    try:
+        yield from _iter_json_items((decoder.decode(chunk) for chunk in content), key)
+    finally:
+        release(response, content)
+
+
+def release(response, content):
+    """Read the rest of a streamed body (up to `STREAM_DRAIN_LIMIT` bytes) then close the response.
+
+    urllib3 only puts a connection back in the pool once its body has been read entirely.
+    """
+    drained = 0
+    for chunk in content:
+        drained += len(chunk)
+        if drained > STREAM_DRAIN_LIMIT:
+            break
+    response.close()
+
+
+def _iter_json_items(chunks, key):
+    """Decode the items of the array `key` from the text chunks of a body."""
+    json_decoder = json.JSONDecoder()
+    marker = f'"{key}"'
+    buffer = ""
+    position = None
+    for chunk in chunks:
+        buffer += chunk
+        if position is None:
+            index = buffer.find(marker)
+            if index == -1:
+                buffer = buffer[-len(marker) :]
+                continue
+            start = buffer.find("[", index + len(marker))
+            if start == -1:
+                buffer = buffer[index:]
+                continue
+            buffer = buffer[start + 1 :]
+            position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if buffer[position] == "]":
+                return
+            try:
+                item, position = json_decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # Incomplete item : wait for the next chunk.
+                break
+            yield item
+        buffer = buffer[position:]
+        position = 0
+    if position is None:
+        raise ValueError(f"{key} absent de la réponse.")
+    raise ValueError(f"{key} incomplet dans la réponse.")
+
 
 class Query(object):
     def __init__(self, endpoint, headers=None):
         self.endpoint = endpoint
-        self.timeout = 60
+        config = gateway_config()
+        self.timeout = (config["connect_timeout"], config["timeout"])
+        self.session = get_session()
         check_ssl = CONFIG.get("ssl")
         if check_ssl and "gateway" in check_ssl:
             self.ssl_valid = str2bool(check_ssl["gateway"])
@@ -20,23 +186,25 @@ class Query(object):
         else:
             self.headers = headers
 
-    def get(self, params=None):
+    def get(self, params=None, stream=False):
         logging.debug(f"[GET] Endpoint {self.endpoint}")
         logging.debug(f" - url : {self.endpoint}")
         logging.debug(f" - headers : {self.headers}")
         logging.debug(f" - params : {params}")
         response = {}
         try:
-            response = requests.request(
+            response = self.session.request(
                 "GET",
                 headers=self.headers,
                 params=params,
                 url=self.endpoint,
                 timeout=self.timeout,
                 verify=self.ssl_valid,
+                stream=stream,
             )
             logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
+            if not stream:
+                logging.debug(f" => {truncate(response.text)}")
         except Exception as e:
             logging.error(e)
         return response
@@ -49,7 +217,7 @@ class Query(object):
         logging.debug(f" - data : {data}")
         response = {}
         try:
-            response = requests.request(
+            response = self.session.request(
                 "POST",
                 headers=self.headers,
                 params=params,
@@ -59,7 +227,7 @@ class Query(object):
                 verify=self.ssl_valid,
             )
             logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
+            logging.debug(f" => {truncate(response.text)}")
         except Exception as e:
             logging.error(response)
         return response
@@ -71,7 +239,7 @@ class Query(object):
         logging.debug(f" - data : {data}")
         response = {}
         try:
-            response = requests.request(
+            response = self.session.request(
                 "DELETE",
                 headers=self.headers,
                 params=params,
@@ -81,7 +249,7 @@ class Query(object):
                 verify=self.ssl_valid,
             )
             logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
+            logging.debug(f" => {truncate(response.text)}")
             return response
         except Exception as e:
             logging.error(response)
@@ -94,7 +262,7 @@ class Query(object):
         logging.debug(f" - data : {data}")
         response = {}
         try:
-            response = requests.request(
+            response = self.session.request(
                 "UPDATE",
                 headers=self.headers,
                 params=params,
@@ -104,7 +272,7 @@ class Query(object):
                 verify=self.ssl_valid,
             )
             logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
+            logging.debug(f" => {truncate(response.text)}")
             return response
         except Exception as e:
             logging.error(response)
@@ -117,7 +285,7 @@ class Query(object):
         logging.debug(f" - data : {data}")
         response = {}
         try:
-            response = requests.request(
+            response = self.session.request(
                 "PUT",
                 headers=self.headers,
                 params=params,
@@ -127,7 +295,7 @@ class Query(object):
                 verify=self.ssl_valid,
             )
             logging.debug(f"[RESPONSE] : status_code {response.status_code}")
-            logging.debug(f" => {response.text}...")
+            logging.debug(f" => {truncate(response.text)}")
         except Exception as e:
             logging.error(response)
         return response
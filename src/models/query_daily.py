@@ -6,7 +6,9 @@ from dateutil.relativedelta import relativedelta
 
 from config import DAILY_MAX_DAYS, URL
 from init import CONFIG, DB
-from models.query import Query
+from models.backfill import Backfill
+from models.query import Query, iter_json_items
+from models.quota import Quota
 from models.stat import Stat
 
 
@@ -76,6 +78,7 @@ class Daily:
         self.date_detail_format = "%Y-%m-%d %H:%M:%S"
         self.headers = headers
         self.usage_point_id = usage_point_id
+        self.quota = Quota(self.usage_point_id)
         self.usage_point_config = self.db.get_usage_point(self.usage_point_id)
         self.contract = self.db.get_contract(self.usage_point_id)
         self.daily_max_days = int(DAILY_MAX_DAYS)
@@ -111,7 +114,7 @@ class Daily:
             if hasattr(self.usage_point_config, "production_price"):
                 self.base_price = self.usage_point_config.production_price
 
-    def run(self, begin, end):
+    def run(self, begin, end, priority=Quota.RECENT):
         begin_str = begin.strftime(self.date_format)
         end_str = end.strftime(self.date_format)
         logging.info(f"Récupération des données : {begin_str} => {end_str}")
@@ -120,16 +123,19 @@ class Daily:
         if hasattr(self.usage_point_config, "cache") and self.usage_point_config.cache:
             endpoint += "/cache"
         try:
-            current_data = self.db.get_daily(self.usage_point_id, begin, end, self.measure_type)
+            current_data = self.db.get_daily_coverage(self.usage_point_id, begin, end, self.measure_type)
             if not current_data["missing_data"]:
                 logging.info(" => Toutes les données sont déjà en cache.")
                 output = []
                 for date, data in current_data["date"].items():
-                    output.append({"date": date, "value": data["value"]})
+                    if data["state"] != "missing":
+                        output.append({"date": date, "value": data["value"]})
                 return output
             else:
+                if not self.quota.acquire(priority):
+                    return self.quota.deferred(begin, end, self.date_format)
                 logging.info(f" Chargement des données depuis MyElectricalData {begin_str} => {end_str}")
-                data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
+                data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get(stream=True)
                 if data.status_code == 403:
                     if hasattr(data, "text"):
                         description = json.loads(data.text)["detail"]
@@ -150,8 +156,7 @@ class Daily:
                     max_histo = datetime.combine(datetime.now(), datetime.max.time()) - timedelta(days=1)
                     if hasattr(data, "status_code"):
                         if data.status_code == 200:
-                            meter_reading = json.loads(data.text)["meter_reading"]
-                            interval_reading = meter_reading["interval_reading"]
+                            interval_reading = list(iter_json_items(data, "interval_reading"))
                             interval_reading_tmp = {}
                             for interval_reading_data in interval_reading:
                                 interval_reading_tmp[interval_reading_data["date"]] = interval_reading_data["value"]
@@ -224,57 +229,43 @@ class Daily:
         """
         end = datetime.combine((datetime.now() + timedelta(days=2)), datetime.max.time())
         begin = datetime.combine(end - relativedelta(days=self.max_daily), datetime.min.time())
-        finish = True
-        result = []
-        while finish:
+        start = self.activation_date
+        watermark = self.db.get_sync_state(self.usage_point_id, self.measure_type)["watermark"]
+        if watermark is not None and (not start or watermark > start):
+            # Already complete up to the watermark.
+            start = watermark
+        windows = []
+        while True:
             if self.max_days_date > begin:
                 # Max day reached
-                begin = self.max_days_date
-                finish = False
-                response = self.run(begin, end)
-            elif self.activation_date and self.activation_date > begin:
-                # Activation date reached
-                begin = self.activation_date
-                finish = False
-                response = self.run(begin, end)
-            else:
-                response = self.run(begin, end)
-                begin = begin - relativedelta(months=self.max_daily)
-                end = end - relativedelta(months=self.max_daily)
-            if "exit" in response:
-                finish = False
-                response = {
-                    "error": True,
-                    "description": response["description"],
-                    "status_code": response["status_code"],
-                }
-            if response is not None:
-                result = [*result, *response]
-            else:
-                response = {
-                    "error": True,
-                    "description": "MyElectricalData est indisponible.",
-                }
-            if "error" in response and response["error"]:
-                logging.error("Echec de la récupération des données")
-                logging.error(f'=> {response["description"]}')
-                logging.error(f"=> {begin.strftime(self.date_format)} -> {end.strftime(self.date_format)}")
-            if "status_code" in response and (response["status_code"] == 409 or response["status_code"] == 400):
-                finish = False
-                logging.error("Arrêt de la récupération des données suite à une erreur.")
-                logging.error(f"Prochain lancement à {datetime.now() + timedelta(seconds=self.config.get('cycle'))}")
+                windows.append((self.max_days_date, end))
+                break
+            elif start and start > begin:
+                # Activation date or watermark reached
+                windows.append((start, end))
+                break
+            windows.append((begin, end))
+            end = begin
+            begin = begin - relativedelta(days=self.max_daily)
+        backfill = Backfill(self.usage_point_id, self.run, date_format=self.date_format)
+        result = backfill.run(windows)
+        if backfill.complete:
+            watermark = self.db.get_daily_watermark(self.usage_point_id, windows[-1][0], self.measure_type)
+            self.db.set_sync_state(self.usage_point_id, self.measure_type, watermark)
         return result
 
     def reset(self, date=None):
         if date is not None:
             date = datetime.strptime(date, self.date_format)
         self.db.reset_daily(self.usage_point_id, date, self.measure_type)
+        self.db.rewind_sync_state(self.usage_point_id, self.measure_type, date)
         return True
 
     def delete(self, date=None):
         if date is not None:
             date = datetime.strptime(date, self.date_format)
         self.db.delete_daily(self.usage_point_id, date, self.measure_type)
+        self.db.rewind_sync_state(self.usage_point_id, self.measure_type, date)
         return True
 
     def fetch(self, date):
@@ -288,7 +279,7 @@ class Daily:
             return {
                 "error": True,
                 "notif": result["description"],
-                "fail_count": self.db.get_daily_fail_count(self.usage_point_id, date, self.measure_type),
+                "fail_count": self.fail_count(date),
             }
         for item in result:
             if date.strftime(self.date_format) in item["date"]:
@@ -298,9 +289,13 @@ class Daily:
         return {
             "error": True,
             "notif": f"Aucune donnée n'est disponible chez Enedis sur cette date ({date})",
-            "fail_count": self.db.get_daily_fail_count(self.usage_point_id, date, self.measure_type),
+            "fail_count": self.fail_count(date),
         }
 
+    def fail_count(self, date):
+        coverage = self.db.get_daily_coverage(self.usage_point_id, date, date, self.measure_type)
+        return coverage["date"][date.strftime(self.date_format)]["fail_count"]
+
     def blacklist(self, date, action):
         if date is not None:
             date = datetime.strptime(date, self.date_format)
@@ -1,12 +1,15 @@
+import functools
 import json
 import logging
-import re
 from datetime import datetime, timedelta
 
-from config import DETAIL_MAX_DAYS, URL
+from config import DETAIL_MAX_DAYS, MAX_IMPORT_TRY, URL
 from init import CONFIG, DB
+from models.backfill import Backfill
 from models.database import ConsumptionDetail, ProductionDetail
-from models.query import Query
+from models.load_curve import LoadCurve
+from models.query import Query, iter_json_items
+from models.quota import Quota
 
 
 def daterange(start_date, end_date):
@@ -14,16 +17,83 @@ def daterange(start_date, end_date):
         yield start_date + timedelta(n)
 
 
+def missing_ranges(readings, begin, end, tolerance=timedelta(0)):
+    """Return the periods of [begin, end) that are not covered by the stored readings.
+
+    Args:
+        readings (list): The (date, interval) tuples of the stored readings, sorted by date.
+        begin (datetime): The start of the period.
+        end (datetime): The end of the period.
+        tolerance (timedelta, optional): Holes shorter than this are ignored (e.g. DST change). Defaults to 0.
+
+    Returns:
+        list: The (begin, end) tuples of the missing periods, sorted by date.
+    """
+    gaps = []
+    cursor = begin
+    for date, interval in readings:
+        if date - cursor > tolerance:
+            gaps.append((cursor, date))
+        cursor = max(cursor, date + timedelta(minutes=int(interval)))
+    if end - cursor > tolerance:
+        gaps.append((cursor, end))
+    return gaps
+
+
+def plan_requests(gaps, max_days):
+    """Merge the missing periods into the smallest list of gateway requests.
+
+    Missing periods are widened to whole days, then covered from the most recent one backwards with windows of at
+    most `max_days` days, so that a single request fills every gap it overlaps.
+
+    Args:
+        gaps (list): The (begin, end) tuples returned by `missing_ranges`, sorted by date.
+        max_days (int): The maximum number of days of a request.
+
+    Returns:
+        list: The (begin, end) tuples of the requests, most recent first.
+    """
+    days = []
+    for gap_begin, gap_end in gaps:
+        day_begin = datetime.combine(gap_begin.date(), datetime.min.time())
+        day_end = datetime.combine(gap_end.date(), datetime.min.time())
+        if gap_end > day_end:
+            day_end = day_end + timedelta(days=1)
+        if days and day_begin <= days[-1][1]:
+            days[-1][1] = max(days[-1][1], day_end)
+        else:
+            days.append([day_begin, day_end])
+
+    windows = []
+    index = len(days) - 1
+    while index >= 0:
+        end = days[index][1]
+        limit = end - timedelta(days=max_days)
+        begin = end
+        while index >= 0 and days[index][1] > limit:
+            if days[index][0] < limit:
+                begin = limit
+                days[index][1] = limit
+                break
+            begin = days[index][0]
+            index -= 1
+        windows.append((begin, end))
+    return windows
+
+
 class Detail:
     def __init__(self, headers, usage_point_id, measure_type="consumption"):
         self.config = CONFIG
         self.db = DB
         self.url = URL
         self.max_detail = 7
+        self.chunk_size = 2000
+        self.gap_tolerance = timedelta(minutes=300)
         self.date_format = "%Y-%m-%d"
         self.date_detail_format = "%Y-%m-%d %H:%M:%S"
         self.headers = headers
         self.usage_point_id = usage_point_id
+        self.quota = Quota(self.usage_point_id)
         self.usage_point_config = self.db.get_usage_point(self.usage_point_id)
         self.contract = self.db.get_contract(self.usage_point_id)
         self.daily_max_days = int(DETAIL_MAX_DAYS)
@@ -59,6 +129,7 @@ class Detail:
             6: self.usage_point_config.offpeak_hours_6,
         }
         self.measure_type = measure_type
+        self.dataset = f"{measure_type}_detail"
         self.base_price = 0
         if measure_type == "consumption":
             self.detail_table = ConsumptionDetail
@@ -79,17 +150,13 @@ class Detail:
             logging.warning(f"Réponse non JSON ou invalide : {text[:200]}")
             return {}
 
-    def run(self, begin, end):
+    def run(self, begin, end, priority=Quota.RECENT):
         if begin.strftime(self.date_format) == end.strftime(self.date_format):
             end = end + timedelta(days=1)
         begin_str = begin.strftime(self.date_format)
         end_str = end.strftime(self.date_format)
         logging.info(f"Récupération des données : {begin_str} => {end_str}")
 
-        endpoint = f"{self.measure_type}_load_curve/{self.usage_point_id}/start/{begin_str}/end/{end_str}"
-        if hasattr(self.usage_point_config, "cache") and self.usage_point_config.cache:
-            endpoint += "/cache"
-
         try:
             current_data = self.db.get_detail(self.usage_point_id, begin, end, self.measure_type)
 
@@ -99,11 +166,67 @@ class Detail:
                 for date, data in current_data["date"].items():
                     output.append({"date": date, "value": data["value"]})
                 return output
+        except Exception as e:
+            logging.exception(e)
+            logging.error(e)
+            return {
+                "error": True,
+                "description": str(e),
+                "status_code": 500,
+            }
+        return self.load(begin, end, priority)
+
+    def load(self, begin, end, priority=Quota.RECENT, collect=True):
+        """Fetch a window from the gateway and store its readings, without looking at the cache first.
+
+        The load curve is decoded while it is read from the socket and stored by chunks of `chunk_size` readings.
+
+        Args:
+            begin (datetime): The start of the window.
+            end (datetime): The end of the window.
+            priority (str, optional): The quota priority of the window. Defaults to `Quota.RECENT`.
+            collect (bool, optional): Return the readings; a backfill only stores them. Defaults to True.
+
+        Returns:
+            list|dict: The readings of the window (empty if `collect` is False), or an error.
+        """
+        begin_str = begin.strftime(self.date_format)
+        end_str = end.strftime(self.date_format)
+        endpoint = f"{self.measure_type}_load_curve/{self.usage_point_id}/start/{begin_str}/end/{end_str}"
+        if hasattr(self.usage_point_config, "cache") and self.usage_point_config.cache:
+            endpoint += "/cache"
 
+        try:
+            if not self.quota.acquire(priority):
+                return self.quota.deferred(begin, end, self.date_format)
             logging.info(f" Chargement des données depuis MyElectricalData {begin_str} => {end_str}")
-            data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
+            data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get(stream=True)
 
             if hasattr(data, "status_code"):
+                if data.status_code == 200:
+                    result = []
+                    chunk = []
+                    try:
+                        for interval_reading in iter_json_items(data, "interval_reading"):
+                            chunk.append(interval_reading)
+                            if len(chunk) == self.chunk_size:
+                                self.store(chunk)
+                                if collect:
+                                    result.extend(chunk)
+                                chunk = []
+                    except ValueError as e:
+                        logging.error(e)
+                        return {
+                            "error": True,
+                            "description": "Réponse invalide de MyElectricalData",
+                            "status_code": 200,
+                        }
+                    if chunk:
+                        self.store(chunk)
+                        if collect:
+                            result.extend(chunk)
+                    return result
+
                 parsed = self.safe_json_loads(getattr(data, "text", ""))
                 if data.status_code == 403:
                     description = parsed.get("detail", "Accès interdit")
@@ -114,32 +237,6 @@ class Detail:
                         "exit": True,
                     }
 
-                if data.status_code == 200:
-                    if "meter_reading" not in parsed:
-                        return {
-                            "error": True,
-                            "description": "Réponse invalide de MyElectricalData",
-                            "status_code": 200,
-                        }
-                    meter_reading = parsed["meter_reading"]
-                    for interval_reading in meter_reading.get("interval_reading", []):
-                        value = interval_reading["value"]
-                        interval = re.findall(r"\d+", interval_reading["interval_length"])[0]
-                        date = interval_reading["date"]
-                        date_object = datetime.strptime(date, self.date_detail_format)
-                        date = date_object - timedelta(minutes=int(interval))
-
-                        self.db.insert_detail(
-                            usage_point_id=self.usage_point_id,
-                            date=date,
-                            value=value,
-                            interval=interval,
-                            measure_type="",
-                            blacklist=0,
-                            mesure_type=self.measure_type,
-                        )
-                    return meter_reading.get("interval_reading", [])
-
                 return {
                     "error": True,
                     "description": parsed.get("detail", "Erreur inconnue"),
@@ -163,76 +260,91 @@ class Detail:
                 "status_code": 500,
             }
 
-    def get(self):
-        end = datetime.combine((datetime.now() + timedelta(days=2)), datetime.max.time())
-        begin = datetime.combine(end - timedelta(days=self.max_detail), datetime.min.time())
-        finish = True
-        result = []
-
-        while finish:
-            if self.max_days_date > begin:
-                begin = self.max_days_date
-                finish = False
-                response = self.run(begin, end)
-            elif self.activation_date and self.activation_date > begin:
-                begin = self.activation_date
-                finish = False
-                response = self.run(begin, end)
-            else:
-                response = self.run(begin, end)
-                begin = begin - timedelta(days=self.max_detail)
-                end = end - timedelta(days=self.max_detail)
-
-            if not response:
-                response = {
-                    "error": True,
-                    "description": "MyElectricalData est indisponible.",
-                }
-
-            if isinstance(response, dict) and response.get("exit"):
-                finish = False
-                response = {
-                    "error": True,
-                    "description": response.get("description", "Sortie forcée"),
-                    "status_code": response.get("status_code", 500),
-                }
-
-            if isinstance(response, list):
-                result.extend(response)
-            elif isinstance(response, dict):
-                if response.get("error"):
-                    logging.error("Echec de la récupération des données.")
-                    logging.error(f' => {response["description"]}')
-                    logging.error(f" => {begin.strftime(self.date_format)} -> {end.strftime(self.date_format)}")
-                if response.get("status_code") in [400, 409]:
-                    finish = False
-                    logging.error("Arrêt de la récupération des données suite à une erreur.")
-                    logging.error(f"Prochain lancement à {datetime.now() + timedelta(seconds=self.config.get('cycle'))}")
+    def store(self, interval_reading):
+        self.db.insert_detail_bulk(self.usage_point_id, LoadCurve.parse(interval_reading), self.measure_type)
 
+    def get(self):
+        """Fetch the readings missing since the sync watermark, plus the known gaps that can still be retried.
+
+        Returns:
+            list: The readings fetched from the gateway.
+        """
+        end = datetime.combine(datetime.now(), datetime.min.time())
+        begin = max(self.max_days_date, self.activation_date)
+        if begin.time() != datetime.min.time():
+            begin = datetime.combine(begin + timedelta(days=1), datetime.min.time())
+        state = self.db.get_sync_state(self.usage_point_id, self.dataset)
+        start = begin
+        if state["watermark"] is not None and state["watermark"] > begin:
+            start = min(state["watermark"], end)
+        readings = self.db.get_detail_timestamps(self.usage_point_id, start, end, self.measure_type)
+        gaps = missing_ranges(readings, start, end, self.gap_tolerance)
+        retry = [
+            (gap["begin"], gap["end"])
+            for gap in state["gaps"]
+            if gap["tries"] < MAX_IMPORT_TRY and gap["end"] > begin and gap["begin"] < start
+        ]
+        windows = plan_requests(sorted(retry + gaps), self.max_detail)
+        if not windows:
+            logging.info(" => Toutes les données sont déjà en cache.")
+            self.sync(start, end, state)
+            return []
+        logging.info(f" => {len(windows)} requête(s) nécessaire(s) pour compléter les données manquantes.")
+        # Readings are stored while they are streamed, a backfill does not keep them in memory.
+        load = functools.partial(self.load, collect=False)
+        backfill = Backfill(self.usage_point_id, load, date_format=self.date_format)
+        result = backfill.run(windows)
+        if backfill.complete:
+            self.sync(min(start, windows[-1][0]), end, state)
         return result
 
+    def sync(self, begin, end, state):
+        """Move the sync watermark forward once the period [begin, end) was fetched without error.
+
+        The holes the gateway did not fill become known gaps, retried on the next cycles until they reach
+        MAX_IMPORT_TRY tries. A hole at the end of the period is data not published yet: the watermark stops before it.
+        """
+        readings = self.db.get_detail_timestamps(self.usage_point_id, begin, end, self.measure_type)
+        remaining = missing_ranges(readings, begin, end, self.gap_tolerance)
+        watermark = end
+        if remaining and remaining[-1][1] == end:
+            watermark = remaining.pop()[0]
+        gaps = [gap for gap in state["gaps"] if gap["end"] <= begin or gap["begin"] >= end]
+        for gap_begin, gap_end in remaining:
+            tries = max(
+                [gap["tries"] for gap in state["gaps"] if gap["begin"] < gap_end and gap["end"] > gap_begin],
+                default=0,
+            )
+            gaps.append({"begin": gap_begin, "end": gap_end, "tries": tries + 1})
+        gaps.sort(key=lambda gap: gap["begin"])
+        self.db.set_sync_state(self.usage_point_id, self.dataset, watermark, gaps)
+
     def reset_daily(self, date):
         begin = datetime.combine(datetime.strptime(date, self.date_format), datetime.min.time())
         end = datetime.combine(datetime.strptime(date, self.date_format), datetime.max.time())
         self.db.reset_detail_range(self.usage_point_id, begin, end, self.measure_type)
+        self.db.rewind_sync_state(self.usage_point_id, self.dataset, begin)
         return True
 
     def delete_daily(self, date):
         begin = datetime.combine(datetime.strptime(date, self.date_format), datetime.min.time())
         end = datetime.combine(datetime.strptime(date, self.date_format), datetime.max.time())
         self.db.delete_detail_range(self.usage_point_id, begin, end, self.measure_type)
+        self.db.rewind_sync_state(self.usage_point_id, self.dataset, begin)
         return True
 
     def reset(self, date=None):
         if date is not None:
             date = datetime.strptime(date, self.date_detail_format)
         self.db.reset_detail(self.usage_point_id, date, self.measure_type)
+        self.db.rewind_sync_state(self.usage_point_id, self.dataset, date)
         return True
 
     def delete(self, date=None):
         if date is not None:
             date = datetime.strptime(date, self.date_detail_format)
         self.db.delete_detail(self.usage_point_id, date, self.measure_type)
+        self.db.rewind_sync_state(self.usage_point_id, self.dataset, date)
         return True
 
     def fetch(self, date):
@@ -4,7 +4,10 @@ from datetime import datetime, timedelta
 
 from config import DAILY_MAX_DAYS, URL
 from init import CONFIG, DB
+from models.backfill import Backfill
+from models.load_curve import parse_datetime
 from models.query import Query
+from models.quota import Quota
 
 
 def daterange(start_date, end_date):
@@ -22,6 +25,8 @@ class Power:
         self.date_format_detail = "%Y-%m-%d %H:%M:%S"
         self.headers = headers
         self.usage_point_id = usage_point_id
+        self.dataset = "consumption_max_power"
+        self.quota = Quota(self.usage_point_id)
         self.usage_point_config = self.db.get_usage_point(self.usage_point_id)
         self.contract = self.db.get_contract(self.usage_point_id)
         self.daily_max_days = DAILY_MAX_DAYS
@@ -49,7 +54,7 @@ class Power:
             logging.warning(f"Réponse non JSON ou invalide : {text[:200]}")
             return {}
 
-    def run(self, begin, end):
+    def run(self, begin, end, priority=Quota.RECENT):
         begin_str = begin.strftime(self.date_format)
         end_str = end.strftime(self.date_format)
         logging.info(f"Récupération des données : {begin_str} => {end_str}")
@@ -67,6 +72,8 @@ class Power:
                     output.append({"date": date, "value": data["value"]})
                 return output
 
+            if not self.quota.acquire(priority):
+                return self.quota.deferred(begin, end, self.date_format)
             logging.info(f" Chargement des données depuis MyElectricalData {begin_str} => {end_str}")
             data = Query(endpoint=f"{self.url}/{endpoint}/", headers=self.headers).get()
             max_histo = datetime.combine(datetime.now(), datetime.max.time()) - timedelta(days=1)
@@ -86,13 +93,9 @@ class Power:
                     interval_reading = meter_reading.get("interval_reading", [])
                     interval_reading_tmp = {}
                     for interval_reading_data in interval_reading:
-                        date = datetime.strptime(interval_reading_data["date"], self.date_format_detail)
-                        date = datetime.combine(date, datetime.min.time())
-                        interval_reading_tmp[date.strftime(self.date_format)] = {
-                            "date": datetime.strptime(
-                                interval_reading_data["date"],
-                                self.date_format_detail,
-                            ),
+                        # "%Y-%m-%d %H:%M:%S" : the day is the date part of the event date.
+                        interval_reading_tmp[interval_reading_data["date"][0:10]] = {
+                            "date": parse_datetime(interval_reading_data["date"]),
                             "value": interval_reading_data["value"],
                         }
 
@@ -144,48 +147,41 @@ class Power:
     def get(self):
         end = datetime.combine((datetime.now() + timedelta(days=2)), datetime.max.time())
         begin = datetime.combine(end - timedelta(days=self.max_daily), datetime.min.time())
-        finish = True
-        result = []
-
-        while finish:
+        start = self.activation_date
+        watermark = self.db.get_sync_state(self.usage_point_id, self.dataset)["watermark"]
+        if watermark is not None and (not start or watermark > start):
+            # Already complete up to the watermark.
+            start = watermark
+        windows = []
+        while True:
             if self.max_days_date > begin:
-                begin = self.max_days_date
-                finish = False
-                response = self.run(begin, end)
-            elif self.activation_date and self.activation_date > begin:
-                begin = self.activation_date
-                finish = False
-                response = self.run(begin, end)
-            else:
-                response = self.run(begin, end)
-                begin = begin - timedelta(days=self.max_daily)
-                end = end - timedelta(days=self.max_daily)
-
-            if not response:
-                response = {
-                    "error": True,
-                    "description": "MyElectricalData est indisponible.",
-                }
-
-            if isinstance(response, list):
-                result.extend(response)
-            elif isinstance(response, dict) and response.get("error"):
-                logging.error("Echec de la récupération des données.")
-                logging.error(f' => {response["description"]}')
-                logging.error(f" => {begin.strftime(self.date_format)} -> {end.strftime(self.date_format)}")
-
+                windows.append((self.max_days_date, end))
+                break
+            elif start and start > begin:
+                windows.append((start, end))
+                break
+            windows.append((begin, end))
+            end = begin
+            begin = begin - timedelta(days=self.max_daily)
+        backfill = Backfill(self.usage_point_id, self.run, date_format=self.date_format)
+        result = backfill.run(windows)
+        if backfill.complete:
+            watermark = self.db.get_daily_watermark(self.usage_point_id, windows[-1][0], self.dataset)
+            self.db.set_sync_state(self.usage_point_id, self.dataset, watermark)
         return result
 
     def reset(self, date=None):
         if date is not None:
             date = datetime.strptime(date, self.date_format)
         self.db.reset_daily_max_power(self.usage_point_id, date)
+        self.db.rewind_sync_state(self.usage_point_id, self.dataset, date)
         return True
 
     def delete(self, date=None):
         if date is not None:
             date = datetime.strptime(date, self.date_format)
         self.db.delete_daily_max_power(self.usage_point_id, date)
+        self.db.rewind_sync_state(self.usage_point_id, self.dataset, date)
         return True
 
     def blacklist(self, date, action):
@@ -0,0 +1,115 @@
+import logging
+import threading
+from datetime import datetime
+
+from config import QUOTA_RECENT_RESERVE
+from init import DB
+
+_BUCKETS = {}
+_BUCKETS_LOCK = threading.Lock()
+
+
+class Quota:
+    """Token bucket of the gateway calls allowed for a usage point.
+
+    The bucket is filled from the account status stored on the usage point (`quota_limit`, `call_number`,
+    `quota_reached` and `quota_reset_at`) and refilled when `quota_reset_at` is reached. Every call sent to the gateway
+    takes a token; when the bucket is empty the remaining windows are deferred to the next cycle instead of being
+    rejected by the gateway.
+
+    Recent windows may use every token left, while backfill windows always leave `QUOTA_RECENT_RESERVE` tokens so that
+    the freshest data of the other datasets can still be fetched.
+    """
+
+    RECENT = "recent"
+    BACKFILL = "backfill"
+
+    def __init__(self, usage_point_id):
+        self.db = DB
+        self.usage_point_id = usage_point_id
+        self.reserve = QUOTA_RECENT_RESERVE
+
+    def _bucket(self):
+        usage_point = self.db.get_usage_point(self.usage_point_id)
+        source = (
+            getattr(usage_point, "quota_limit", None),
+            getattr(usage_point, "call_number", None),
+            getattr(usage_point, "quota_reached", None),
+            getattr(usage_point, "quota_reset_at", None),
+        )
+        bucket = _BUCKETS.get(self.usage_point_id)
+        if bucket is None or bucket["source"] != source:
+            # New account status : the gateway counters already include the calls consumed so far.
+            bucket = {"source": source, "consumed": 0, "refilled": False}
+            _BUCKETS[self.usage_point_id] = bucket
+        return bucket
+
+    @staticmethod
+    def _tokens(bucket):
+        quota_limit, call_number, quota_reached, quota_reset_at = bucket["source"]
+        if not quota_limit:
+            return None
+        if not bucket["refilled"] and quota_reset_at is not None and datetime.utcnow() >= quota_reset_at:
+            # Quota window expired since the last account status : refill the bucket.
+            bucket["consumed"] = 0
+            bucket["refilled"] = True
+        if bucket["refilled"]:
+            return quota_limit - bucket["consumed"]
+        if quota_reached:
+            return 0
+        return quota_limit - (call_number or 0) - bucket["consumed"]
+
+    def remaining(self):
+        """Return the number of calls left before the quota is reached.
+
+        Returns:
+            int: The remaining calls, or None when the quota of the usage point is unknown.
+        """
+        with _BUCKETS_LOCK:
+            tokens = self._tokens(self._bucket())
+        if tokens is None:
+            return None
+        return max(tokens, 0)
+
+    def acquire(self, priority=RECENT):
+        """Take a token from the bucket before sending a call to the gateway.
+
+        Args:
+            priority (str, optional): `Quota.RECENT` for the most recent window of a dataset, `Quota.BACKFILL` for
+                older windows. Defaults to `Quota.RECENT`.
+
+        Returns:
+            bool: True if the call can be sent, False if it must be deferred to the next cycle.
+        """
+        with _BUCKETS_LOCK:
+            bucket = self._bucket()
+            tokens = self._tokens(bucket)
+            if tokens is None:
+                return True
+            floor = self.reserve if priority == self.BACKFILL else 0
+            if tokens <= floor:
+                return False
+            bucket["consumed"] += 1
+            return True
+
+    def deferred(self, begin, end, date_format="%Y-%m-%d"):
+        """Build the response of a window deferred to the next cycle.
+
+        Args:
+            begin (datetime): The start of the deferred window.
+            end (datetime): The end of the deferred window.
+            date_format (str, optional): The format used to log the dates. Defaults to "%Y-%m-%d".
+
+        Returns:
+            dict: An error response flagged with `deferred`.
+        """
+        logging.warning(
+            f" => Quota d'appels presque atteint ({self.remaining()} restants), "
+            f"{begin.strftime(date_format)} => {end.strftime(date_format)} reporté au prochain cycle."
+        )
+        return {
+            "error": True,
+            "description": "Quota d'appels atteint, récupération reportée au prochain cycle.",
+            "status_code": 429,
+            "deferred": True,
+        }
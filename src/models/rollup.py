@@ -0,0 +1,159 @@
+"""Aggregate the detail readings of a usage point per hour, day, month and year."""
+from datetime import date, datetime, time, timedelta
+
+from models.offpeak import MINUTES_PER_DAY, offpeak_calendar
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, the readings are then aggregated in pure Python.
+    numpy = None
+
+PERIODS = ["hour", "day", "month", "year"]
+
+# Energy (Wh) of the readings of a period: in total, in off-peak / peak hours, in the Tempo off-peak hours before 6h
+# and after 22h, in the Tempo peak hours (6h-22h), and the number of readings.
+COLUMNS = ["value", "hc", "hp", "tempo_hc_morning", "tempo_hp", "tempo_hc_evening", "count"]
+
+
+def empty():
+    return dict.fromkeys(COLUMNS, 0)
+
+
+def add(total, row):
+    """Add the columns of `row` (a dict or a Rollup row) to `total`, in place."""
+    for column in COLUMNS:
+        total[column] += row[column] if isinstance(row, dict) else getattr(row, column)
+    return total
+
+
+def period_start(moment, period):
+    """Return the first moment of the period which contains `moment`."""
+    if period == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    day = datetime.combine(moment.date() if isinstance(moment, datetime) else moment, time.min)
+    if period == "day":
+        return day
+    if period == "month":
+        return day.replace(day=1)
+    return day.replace(month=1, day=1)
+
+
+def period_end(start, period):
+    """Return the first moment of the period following the one starting at `start`."""
+    if period == "hour":
+        return start + timedelta(hours=1)
+    if period == "day":
+        return start + timedelta(days=1)
+    if period == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start.replace(year=start.year + 1)
+
+
+def aggregate(readings, offpeak_hours, backend=None):
+    """Aggregate detail readings per hour and per day.
+
+    Args:
+        readings (iterable): The readings, with their `date`, `value` (W) and `interval` (minutes).
+        offpeak_hours (dict): The off-peak hours of the usage point, as returned by `offpeak.offpeak_hours`.
+        backend (str, optional): "numpy" (see `aggregate_numpy`) or "python". Defaults to "numpy" when NumPy is
+            installed.
+
+    Returns:
+        dict: The aggregated columns, indexed by (period, period start).
+    """
+    if (backend or ("numpy" if numpy is not None else "python")) == "numpy":
+        return aggregate_numpy(readings, offpeak_hours)
+    result = {}
+    calendar = offpeak_calendar(offpeak_hours)
+    for reading in readings:
+        wh = reading.value / (60 / reading.interval) if reading.interval else 0
+        hour = reading.date.hour
+        columns = {
+            "value": wh,
+            "count": 1,
+            calendar.mesure_type(reading.date).lower(): wh,
+            "tempo_hc_morning" if hour < 6 else "tempo_hc_evening" if hour >= 22 else "tempo_hp": wh,
+        }
+        for period in ["hour", "day"]:
+            key = (period, period_start(reading.date, period))
+            if key not in result:
+                result[key] = empty()
+            total = result[key]
+            for column, value in columns.items():
+                total[column] += value
+    return result
+
+
+def aggregate_numpy(readings, offpeak_hours):
+    """Same as `aggregate`, the readings are loaded in arrays and summed per hour and per day with NumPy.
+
+    A reading is off-peak when the minute of the week it starts in is set in the table of the off-peak calendar (see
+    `offpeak.OffpeakCalendar`), and a Tempo off-peak hour when it starts before 6h or from 22h.
+    """
+    readings = list(readings)
+    if not readings:
+        return {}
+    # Minutes since 1970-01-01, a Thursday (weekday 3).
+    minutes = numpy.array([reading.date for reading in readings], dtype="datetime64[m]").astype(numpy.int64)
+    values = numpy.array([reading.value for reading in readings], dtype=numpy.float64)
+    intervals = numpy.array([reading.interval or 0 for reading in readings], dtype=numpy.float64)
+    # As `aggregate`: value / (60 / interval), 0 for a reading without interval.
+    per_hour = numpy.divide(60, intervals, out=numpy.ones(len(readings)), where=intervals != 0)
+    wh = numpy.where(intervals != 0, values / per_hour, 0)
+    table = numpy.frombuffer(bytes(offpeak_calendar(offpeak_hours).table), dtype=numpy.uint8)
+    offpeak = table[(minutes + 3 * MINUTES_PER_DAY) % (7 * MINUTES_PER_DAY)] == 1
+    hour = minutes // 60 % 24
+    weights = {
+        "value": wh,
+        "hc": numpy.where(offpeak, wh, 0),
+        "hp": numpy.where(offpeak, 0, wh),
+        "tempo_hc_morning": numpy.where(hour < 6, wh, 0),
+        "tempo_hp": numpy.where((hour >= 6) & (hour < 22), wh, 0),
+        "tempo_hc_evening": numpy.where(hour >= 22, wh, 0),
+    }
+    result = {}
+    for period, length in [("hour", 60), ("day", MINUTES_PER_DAY)]:
+        starts, index = numpy.unique(minutes // length, return_inverse=True)
+        columns = {column: numpy.bincount(index, weights=weight).tolist() for column, weight in weights.items()}
+        columns["count"] = numpy.bincount(index).tolist()
+        for position, start in enumerate((starts * length).astype("datetime64[m]").tolist()):
+            result[(period, start)] = {column: columns[column][position] for column in COLUMNS}
+    return result
+
+
+def roll_up(rows, period):
+    """Sum finer rollup rows into the rows of a coarser `period` ("month" or "year")."""
+    result = {}
+    for row in rows:
+        row_date = row["date"] if isinstance(row, dict) else row.date
+        key = (period, period_start(row_date, period))
+        if key not in result:
+            result[key] = empty()
+        add(result[key], row)
+    return result
+
+
+def cover(first_day, last_day):
+    """Split a range of days in the fewest whole years, whole months and days.
+
+    Args:
+        first_day (date): The first day of the range.
+        last_day (date): The last day of the range (included).
+
+    Returns:
+        dict: The starts of the periods to read, indexed by period ("year", "month" and "day").
+    """
+    segments = {"year": [], "month": [], "day": []}
+    day = first_day
+    while day <= last_day:
+        start = datetime.combine(day, time.min)
+        if day.month == 1 and day.day == 1 and date(day.year, 12, 31) <= last_day:
+            segments["year"].append(start)
+            day = date(day.year + 1, 1, 1)
+        elif day.day == 1 and period_end(start, "month").date() - timedelta(days=1) <= last_day:
+            segments["month"].append(start)
+            day = period_end(start, "month").date()
+        else:
+            segments["day"].append(start)
+            day = day + timedelta(days=1)
+    return segments
@@ -7,12 +7,192 @@ import pytz
 from dateutil.relativedelta import relativedelta
 
 from init import CONFIG, DB
+from models import offpeak, rollup
+
+try:
+    import numpy
+except ImportError:  # NumPy is optional, the snapshots are then computed in pure Python.
+    numpy = None
 
 utc = pytz.UTC
 
 now_date = datetime.now(timezone.utc)
 yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
 
+# The snapshots of the statistics, indexed by (usage point, measurement direction).
+SNAPSHOTS = {}
+
+
+class StatSnapshot:
+    """The daily energy of a usage point, loaded once and summed over any period without another query.
+
+    The daily readings and the daily rollups (HC/HP) are read in a single pass into cumulative sums indexed by day:
+    the energy of a range of days is the difference of two of them. The snapshot of the consumption also keeps the
+    maximum power of each day. A snapshot is shared by every `Stat` of the usage point until its readings change (see
+    `Database.readings_version`).
+
+    The rows are grouped per day with NumPy when it is installed (backend "numpy"), in pure Python otherwise (backend
+    "python"); both give the same values.
+    """
+
+    ROLLUP_COLUMNS = ["value", "hc", "hp"]
+
+    def __init__(self, db, usage_point_id, measurement_direction, backend=None):
+        self.backend = backend or ("numpy" if numpy is not None else "python")
+        if self.backend == "numpy":
+            cumulate, peaks = self.cumulate_numpy, self.peaks_numpy
+        else:
+            cumulate, peaks = self.cumulate, self.peaks
+        # The writes hold the lock until they are committed: the version is read between two of them. The readings
+        # are loaded without the lock, a write during the load changes the version and the next `stat_snapshot`
+        # loads them again.
+        with db.write_lock:
+            self.version = db.readings_version(usage_point_id)
+        # As `Database.get_daily_range`, any other direction than "consumption" reads the production.
+        daily_direction = "consumption" if measurement_direction == "consumption" else "production"
+        self.daily_first, self.daily = cumulate(
+            db.stream_daily_all(usage_point_id, measurement_direction=daily_direction), ["value"]
+        )
+        self.rollup_first, self.rollup = cumulate(
+            db.get_rollup_range(usage_point_id, measurement_direction=measurement_direction),
+            self.ROLLUP_COLUMNS,
+        )
+        self.max_power_first, self.max_power_values, self.max_power_times = None, [], []
+        if measurement_direction == "consumption":
+            self.max_power_first, self.max_power_values, self.max_power_times = peaks(
+                db.get_daily_max_power_all(usage_point_id, order="asc")
+            )
+
+    @staticmethod
+    def cumulate(rows, columns):
+        """Return the ordinal of the first day and the cumulative sums of the columns of rows sorted by date.
+
+        The sum `n` of a column is the total of the `n` first days, the days without row count as 0.
+        """
+        first = None
+        sums = {column: [0] for column in columns}
+        for row in rows:
+            ordinal = row.date.toordinal()
+            if first is None:
+                first = ordinal
+            for column, values in sums.items():
+                while len(values) < ordinal - first + 2:
+                    values.append(values[-1])
+                values[-1] += getattr(row, column)
+        return first, sums
+
+    @staticmethod
+    def cumulate_numpy(rows, columns):
+        """Same as `cumulate`, the rows are grouped per day with `numpy.bincount`."""
+        rows = list(rows)
+        if not rows:
+            return None, {column: [0] for column in columns}
+        days = numpy.fromiter((row.date.toordinal() for row in rows), dtype=numpy.int64, count=len(rows))
+        first = int(days[0])
+        days -= first
+        sums = {}
+        for column in columns:
+            values = numpy.array([getattr(row, column) for row in rows])
+            per_day = numpy.bincount(days, weights=values)
+            if values.dtype.kind in "iu":
+                # The weights are summed as floats, the integer readings (Wh) stay integers.
+                per_day = per_day.astype(numpy.int64)
+            sums[column] = numpy.concatenate(([0], numpy.cumsum(per_day)))
+        return first, sums
+
+    @staticmethod
+    def peaks(rows):
+        """Return the ordinal of the first day, then the maximum power of each day and the time it was reached.
+
+        The days without reading have no maximum (None), a reading without event date was reached at its date.
+        """
+        first = None
+        values = []
+        times = []
+        for row in rows:
+            ordinal = row.date.toordinal()
+            if first is None:
+                first = ordinal
+            while len(values) <= ordinal - first:
+                values.append(None)
+                times.append(None)
+            index = ordinal - first
+            if values[index] is None or row.value > values[index]:
+                values[index] = row.value
+                times[index] = row.event_date or row.date
+        return first, values, times
+
+    @staticmethod
+    def peaks_numpy(rows):
+        """Same as `peaks`, the maximum of each day is found by sorting the rows per day and value with NumPy."""
+        rows = list(rows)
+        if not rows:
+            return None, [], []
+        days = numpy.fromiter((row.date.toordinal() for row in rows), dtype=numpy.int64, count=len(rows))
+        first = int(days[0])
+        days -= first
+        values = numpy.array([row.value for row in rows])
+        # Sorted per day, then by decreasing value: the maximum of a day is its first row (the first read on a tie).
+        order = numpy.lexsort((numpy.arange(len(rows)), -values, days))
+        maximums = order[numpy.append(True, days[order][1:] != days[order][:-1])]
+        peak_values = [None] * (int(days[-1]) + 1)
+        peak_times = [None] * (int(days[-1]) + 1)
+        for index in maximums.tolist():
+            peak_values[days[index]] = rows[index].value
+            peak_times[days[index]] = rows[index].event_date or rows[index].date
+        return first, peak_values, peak_times
+
+    @staticmethod
+    def total(first, values, begin, end):
+        if first is None:
+            return 0
+        low = max(begin.toordinal() - first, 0)
+        high = min(end.toordinal() - first + 1, len(values) - 1)
+        if high <= low:
+            return 0
+        value = values[high] - values[low]
+        # A NumPy scalar would not be serializable in JSON by the exports.
+        return value.item() if hasattr(value, "item") else value
+
+    def daily_value(self, begin, end):
+        """Sum the daily readings of the days between `begin` and `end` (both included)."""
+        return self.total(self.daily_first, self.daily["value"], begin, end)
+
+    def rollup_value(self, begin, end, column="value"):
+        """Sum a rollup column over the days between `begin` and `end`, as `Database.get_rollup`.
+
+        Args:
+            begin (datetime): The start of the range, a day which starts after midnight is left out.
+            end (datetime): The end of the range, its day is included.
+            column (str, optional): "value", "hc" or "hp". Defaults to "value".
+
+        Returns:
+            float: The energy in Wh.
+        """
+        first_day = begin.date()
+        if begin.time() != datetime.min.time():
+            first_day = first_day + timedelta(days=1)
+        return self.total(self.rollup_first, self.rollup[column], first_day, end)
+
+    def max_power(self, day):
+        """Return the maximum power (W) of a day and the time it was reached, (None, None) without reading."""
+        if self.max_power_first is None:
+            return None, None
+        index = day.toordinal() - self.max_power_first
+        if index < 0 or index >= len(self.max_power_values):
+            return None, None
+        return self.max_power_values[index], self.max_power_times[index]
+
+
+def stat_snapshot(db, usage_point_id, measurement_direction):
+    """Return the snapshot of the statistics of a usage point, loading it again if its readings changed."""
+    key = (usage_point_id, measurement_direction)
+    snapshot = SNAPSHOTS.get(key)
+    if snapshot is None or snapshot.version != db.readings_version(usage_point_id):
+        snapshot = StatSnapshot(db, usage_point_id, measurement_direction)
+        SNAPSHOTS[key] = snapshot
+    return snapshot
+
 
 class Stat:  # pylint: disable=R0902,R0904
     """The 'Stat' class represents a statistical analysis tool for a usage point.
@@ -87,7 +267,7 @@ class Stat:  # pylint: disable=R0902,R0904
         - get_week_linear(idx, measure_type=None): Returns the linear weekly data for the specified index and measure type.
         - get_price(): Returns the price data.
         - get_mesure_type(date): Returns the measure type for the specified date.
-        - generate_price(): Generates and saves the price data.
+        - generate_price(full=False): Generates and saves the price data, only for the months which changed.
         - get_daily(date, mesure_type): Returns the daily data for the specified date and measure type.
         - delete(): Deletes the statistical data for the usage point.
         - is_between(time, time_range): Checks if the given time is between the given time range.
@@ -140,6 +320,7 @@ class Stat:  # pylint: disable=R0902,R0904
         self.usage_point_id = usage_point_id
         self.measurement_direction = measurement_direction
         self.usage_point_id_config = self.db.get_usage_point(self.usage_point_id)
+        self.offpeak_calendar = offpeak.offpeak_calendar(offpeak.offpeak_hours(self.usage_point_id_config))
         self.usage_point_id_contract = self.db.get_contract(self.usage_point_id)
         self.date_format = "%Y-%m-%d"
         self.date_format_detail = "%Y-%m-%d %H:%M:%S"
@@ -168,14 +349,23 @@ class Stat:  # pylint: disable=R0902,R0904
         self.value_yearly_evolution = 0
         self.usage_point_id_contract = self.db.get_contract(self.usage_point_id)
 
+    @property
+    def snapshot(self):
+        """The statistics of the usage point, shared with the other consumers until its readings change."""
+        return stat_snapshot(self.db, self.usage_point_id, self.measurement_direction)
+
+    @property
+    def max_power_snapshot(self):
+        """The snapshot of the consumption, which keeps the maximum power of each day whatever the direction."""
+        return stat_snapshot(self.db, self.usage_point_id, "consumption")
+
     def daily(self, index=0):
         now_date = datetime.now(timezone.utc)
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
         value = 0
-        for data in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            value = value + data.value
+        value = value + self.snapshot.daily_value(begin, end)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -187,13 +377,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        value = 0
-        for data in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-            day_measure_type = self.get_mesure_type(data.date)
-            if measure_type is None or (measure_type == "HP" and day_measure_type == "HP"):
-                value = value + data.value / (60 / data.interval)
-            elif measure_type is None or (measure_type == "HC" and day_measure_type == "HC"):
-                value = value + data.value / (60 / data.interval)
+        value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -213,43 +397,25 @@ class Stat:  # pylint: disable=R0902,R0904
             "red_hc": 0,
             "red_hp": 0,
         }
-        for data in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-            # print(data)
-            hour = int(datetime.strftime(data.date, "%H"))
-            
-            # CORRECTION : Vérification avant l'accès à l'index pour éviter IndexError
-            if hour < 6:
-                previous_day_data = self.db.get_tempo_range(begin - timedelta(days=1), end - timedelta(days=1))
-                if previous_day_data:
-                    color = previous_day_data[0].color
-                else:
-                    color = "UNKNOWN"
-                    logging.warning(f"No tempo data found for previous day: {begin - timedelta(days=1)}")
-                color = f"{color.lower()}_hc"
-            elif hour >= 22:
-                next_day_data = self.db.get_tempo_range(begin + timedelta(days=1), end + timedelta(days=1))
-                if next_day_data:
-                    color = next_day_data[0].color
-                else:
-                    color = "UNKNOWN"
-                    logging.warning(f"No tempo data found for next day: {begin + timedelta(days=1)}")
-                color = f"{color.lower()}_hc"
-            else:
-                current_day_data = self.db.get_tempo_range(begin, end)
-                if current_day_data:
-                    color = current_day_data[0].color
-                else:
+        colors = {
+            tempo.date: tempo.color
+            for tempo in self.db.get_tempo_range(begin - timedelta(days=1), end + timedelta(days=1))
+        }
+        # Tempo days run from 6h to 6h : the off-peak hours before 6h are counted with the color of the previous day.
+        parts = [
+            ("tempo_hc_morning", begin - timedelta(days=1), "hc", "previous"),
+            ("tempo_hp", begin, "hp", "current"),
+            ("tempo_hc_evening", begin + timedelta(days=1), "hc", "next"),
+        ]
+        for data in self.db.get_rollup_range(self.usage_point_id, begin, end, self.measurement_direction):
+            for column, day, suffix, name in parts:
+                color = colors.get(day)
+                if color is None:
                     color = "UNKNOWN"
-                    logging.warning(f"No tempo data found for current day: {begin}")
-                color = f"{color.lower()}_hp"
-                
-            # Ajouter la valeur à la couleur correspondante
-            if color in value:
-                value[color] += data.value / (60 / data.interval)
-            else:
-                # Si la couleur n'existe pas dans le dictionnaire, créer une nouvelle entrée
-                value[color] = data.value / (60 / data.interval)
-                
+                    logging.warning(f"No tempo data found for {name} day: {day}")
+                color = f"{color.lower()}_{suffix}"
+                value[color] = value.get(color, 0) + getattr(data, column)
+
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -276,11 +442,9 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        value = 0
-        # print(self.db.get_daily_max_power_range(self.usage_point_id, begin, end))
-        for data in self.db.get_daily_max_power_range(self.usage_point_id, begin, end):
-            # print(data)
-            value = value + data.value
+        value, _ = self.max_power_snapshot.max_power(begin)
+        if value is None:
+            value = 0
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -298,12 +462,10 @@ class Stat:  # pylint: disable=R0902,R0904
             max_power = int(self.usage_point_id_contract.subscribed_power.split(" ")[0])
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        value = 0
+        value, _ = self.max_power_snapshot.max_power(begin)
         boolv = "true"
-        for data in self.db.get_daily_max_power_range(self.usage_point_id, begin, end):
-            value = value + data.value
-            if (value / 1000) < max_power:
-                boolv = "false"
+        if value is not None and (value / 1000) < max_power:
+            boolv = "false"
         return {
             "value": boolv,
             "begin": begin.strftime(self.date_format),
@@ -315,14 +477,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=index), datetime.min.time())
         end = datetime.combine(begin, datetime.max.time())
-        max_power_time = ""
-        # print(self.db.get_daily_max_power_range(self.usage_point_id, begin, end))
-        for data in self.db.get_daily_max_power_range(self.usage_point_id, begin, end):
-            # print(data)
-            if data.event_date is None or data.event_date == "":
-                max_power_time = data.date
-            else:
-                max_power_time = data.event_date
+        _, max_power_time = self.max_power_snapshot.max_power(begin)
         if isinstance(max_power_time, datetime):
             value = max_power_time.strftime(self.date_format_detail)
         else:
@@ -343,11 +498,7 @@ class Stat:  # pylint: disable=R0902,R0904
         day_idx = 0
         daily_obj = []
         while day_idx < 7:
-            day = self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction)
-            if day:
-                daily_obj.append({"date": day[0].date, "value": day[0].value})
-            else:
-                daily_obj.append({"date": begin, "value": 0})
+            daily_obj.append({"date": begin, "value": self.snapshot.daily_value(begin, end)})
             begin = begin - timedelta(days=1)
             end = end - timedelta(days=1)
             day_idx = day_idx + 1
@@ -358,8 +509,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date - relativedelta(weeks=1), datetime.min.time())
         end = datetime.combine(yesterday_date, datetime.max.time())
-        for data in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_current_week = self.value_current_week + data.value
+        self.value_current_week = self.value_current_week + self.snapshot.daily_value(begin, end)
         logging.debug(f" current_week => {self.value_current_week}")
         return {
             "value": self.value_current_week,
@@ -393,8 +543,7 @@ class Stat:  # pylint: disable=R0902,R0904
         #     begin = begin - timedelta(days=1)
         #     end = end - timedelta(days=1)
         #     day_idx = day_idx + 1
-        for data in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_last_week = self.value_last_week + data.value
+        self.value_last_week = self.value_last_week + self.snapshot.daily_value(begin, end)
         logging.debug(f" last_week => {self.value_last_week}")
         return {
             "value": self.value_last_week,
@@ -413,11 +562,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date, datetime.min.time())
         end = datetime.combine(yesterday_date, datetime.max.time())
-        data = self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction)
-        if data:
-            self.value_yesterday = data[0].value
-        else:
-            self.value_yesterday = 0
+        self.value_yesterday = self.snapshot.daily_value(begin, end)
         logging.debug(f" yesterday => {self.value_yesterday}")
         return {
             "value": self.value_yesterday,
@@ -430,11 +575,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date - timedelta(days=1), datetime.min.time())
         end = datetime.combine(yesterday_date - timedelta(days=1), datetime.max.time())
-        data = self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction)
-        if data:
-            self.value_yesterday_1 = data[0].value
-        else:
-            self.value_yesterday_1 = 0
+        self.value_yesterday_1 = self.snapshot.daily_value(begin, end)
         logging.debug(f" yesterday_1 => {self.value_yesterday_1}")
         return {
             "value": self.value_yesterday_1,
@@ -469,8 +610,7 @@ class Stat:  # pylint: disable=R0902,R0904
             datetime.min.time(),
         )
         end = datetime.combine(yesterday_date - relativedelta(years=1), datetime.max.time())
-        for data in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_current_week_last_year = self.value_current_week_last_year + data.value
+        self.value_current_week_last_year = self.value_current_week_last_year + self.snapshot.daily_value(begin, end)
         logging.debug(f" current_week_last_year => {self.value_current_week_last_year}")
         return {
             "value": self.value_current_week_last_year,
@@ -486,8 +626,7 @@ class Stat:  # pylint: disable=R0902,R0904
             datetime.min.time(),
         )
         end = datetime.combine(yesterday_date.replace(day=1) - timedelta(days=1), datetime.max.time())
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_last_month = self.value_last_month + day.value
+        self.value_last_month = self.value_last_month + self.snapshot.daily_value(begin, end)
         logging.debug(f" last_month => {self.value_last_month}")
         return {
             "value": self.value_last_month,
@@ -500,8 +639,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date.replace(day=1), datetime.min.time())
         end = yesterday_date
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_current_month = self.value_current_month + day.value
+        self.value_current_month = self.value_current_month + self.snapshot.daily_value(begin, end)
         logging.debug(f" current_month => {self.value_current_month}")
         return {
             "value": self.value_current_month,
@@ -514,8 +652,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date.replace(day=1), datetime.min.time()) - relativedelta(years=1)
         end = yesterday_date - relativedelta(years=1)
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_current_month_last_year = self.value_current_month_last_year + day.value
+        self.value_current_month_last_year = self.value_current_month_last_year + self.snapshot.daily_value(begin, end)
         logging.debug(f" current_month_last_year => {self.value_current_month_last_year}")
         return {
             "value": self.value_current_month_last_year,
@@ -541,8 +678,7 @@ class Stat:  # pylint: disable=R0902,R0904
         end = datetime.combine(yesterday_date.replace(day=1) - timedelta(days=1), datetime.max.time()) - relativedelta(
             years=1
         )
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_last_month_last_year = self.value_last_month_last_year + day.value
+        self.value_last_month_last_year = self.value_last_month_last_year + self.snapshot.daily_value(begin, end)
         logging.debug(f" last_month_last_year => {self.value_last_month_last_year}")
         return {
             "value": self.value_last_month_last_year,
@@ -563,8 +699,7 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(now_date.replace(month=1, day=1), datetime.min.time())
         end = yesterday_date
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_current_year = self.value_current_year + day.value
+        self.value_current_year = self.value_current_year + self.snapshot.daily_value(begin, end)
         logging.debug(f" current_year => {self.value_current_year}")
         return {
             "value": self.value_current_year,
@@ -580,8 +715,7 @@ class Stat:  # pylint: disable=R0902,R0904
             datetime.min.time(),
         )
         end = yesterday_date - relativedelta(years=1)
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_current_year_last_year = self.value_current_year_last_year + day.value
+        self.value_current_year_last_year = self.value_current_year_last_year + self.snapshot.daily_value(begin, end)
         logging.debug(f" current_year_last_year => {self.value_current_year_last_year}")
         return {
             "value": self.value_current_year_last_year,
@@ -597,8 +731,7 @@ class Stat:  # pylint: disable=R0902,R0904
         )
         last_day_of_month = calendar.monthrange(int(begin.strftime("%Y")), 12)[1]
         end = datetime.combine(begin.replace(month=1, day=last_day_of_month), datetime.max.time())
-        for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-            self.value_last_year = self.value_last_year + day.value
+        self.value_last_year = self.value_last_year + self.snapshot.daily_value(begin, end)
         logging.debug(f" last_year => {self.value_last_year}")
         return {
             "value": self.value_last_year,
@@ -619,12 +752,8 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = datetime.combine(yesterday_date, datetime.min.time())
         end = datetime.combine(now_date, datetime.max.time())
-        for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-            measure_type = self.get_mesure_type(day.date)
-            if measure_type == "HP":
-                self.value_yesterday_hp = self.value_yesterday_hp + (day.value / (60 / day.interval))
-            if measure_type == "HC":
-                self.value_yesterday_hc = self.value_yesterday_hc + (day.value / (60 / day.interval))
+        self.value_yesterday_hp = self.value_yesterday_hp + self.snapshot.rollup_value(begin, end, "hp")
+        self.value_yesterday_hc = self.value_yesterday_hc + self.snapshot.rollup_value(begin, end, "hc")
         logging.debug(f" yesterday_hc => HC : {self.value_yesterday_hc}")
         logging.debug(f" yesterday_hp => HP : {self.value_yesterday_hp}")
         return {
@@ -638,15 +767,9 @@ class Stat:  # pylint: disable=R0902,R0904
         yesterday_date = datetime.combine(now_date - relativedelta(days=1), datetime.max.time())
         begin = yesterday_date - relativedelta(years=1)
         end = yesterday_date
-        value_peak_offpeak_percent_hp = 0
-        value_peak_offpeak_percent_hc = 0
         value_peak_offpeak_percent_hp_vs_hc = 0
-        for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-            measure_type = self.get_mesure_type(day.date)
-            if measure_type == "HP":
-                value_peak_offpeak_percent_hp = value_peak_offpeak_percent_hp + day.value
-            if measure_type == "HC":
-                value_peak_offpeak_percent_hc = value_peak_offpeak_percent_hc + day.value
+        value_peak_offpeak_percent_hp = self.snapshot.rollup_value(begin, end, "hp")
+        value_peak_offpeak_percent_hc = self.snapshot.rollup_value(begin, end, "hc")
         if value_peak_offpeak_percent_hc != 0:
             value_peak_offpeak_percent_hp_vs_hc = abs(
                 ((100 * value_peak_offpeak_percent_hc) / value_peak_offpeak_percent_hp) - 100
@@ -665,13 +788,9 @@ class Stat:  # pylint: disable=R0902,R0904
         )
         value = 0
         if measure_type is None:
-            for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-                value = value + day.value
+            value = value + self.snapshot.daily_value(begin, end)
         else:
-            for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    value = value + (day.value / (60 / day.interval))
+            value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -685,13 +804,9 @@ class Stat:  # pylint: disable=R0902,R0904
         begin = datetime.combine(end - relativedelta(years=1), datetime.min.time())
         value = 0
         if measure_type is None:
-            for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-                value = value + day.value
+            value = value + self.snapshot.daily_value(begin, end)
         else:
-            for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    value = value + (day.value / (60 / day.interval))
+            value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -710,13 +825,9 @@ class Stat:  # pylint: disable=R0902,R0904
         )
         value = 0
         if measure_type is None:
-            for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-                value = value + day.value
+            value = value + self.snapshot.daily_value(begin, end)
         else:
-            for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    value = value + (day.value / (60 / day.interval))
+            value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -730,13 +841,9 @@ class Stat:  # pylint: disable=R0902,R0904
         begin = datetime.combine(end - relativedelta(months=1), datetime.min.time())
         value = 0
         if measure_type is None:
-            for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-                value = value + day.value
+            value = value + self.snapshot.daily_value(begin, end)
         else:
-            for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    value = value + (day.value / (60 / day.interval))
+            value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -764,13 +871,9 @@ class Stat:  # pylint: disable=R0902,R0904
         )
         value = 0
         if measure_type is None:
-            for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-                value = value + day.value
+            value = value + self.snapshot.daily_value(begin, end)
         else:
-            for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    value = value + (day.value / (60 / day.interval))
+            value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -784,13 +887,9 @@ class Stat:  # pylint: disable=R0902,R0904
         begin = datetime.combine(end - timedelta(days=7), datetime.min.time())
         value = 0
         if measure_type is None:
-            for day in self.db.get_daily_range(self.usage_point_id, begin, end, self.measurement_direction):
-                value = value + day.value
+            value = value + self.snapshot.daily_value(begin, end)
         else:
-            for day in self.db.get_detail_range(self.usage_point_id, begin, end, self.measurement_direction):
-                day_measure_type = self.get_mesure_type(day.date)
-                if day_measure_type == measure_type:
-                    value = value + (day.value / (60 / day.interval))
+            value = self.rollup_value(begin, end, measure_type)
         return {
             "value": value,
             "begin": begin.strftime(self.date_format),
@@ -802,6 +901,22 @@ class Stat:  # pylint: disable=R0902,R0904
         return json.loads(data[0].value)
         # return ast.literal_eval()
 
+    def rollup_value(self, begin, end, measure_type=None):
+        """Return the energy of the whole days between begin and end, read from the rollups.
+
+        Args:
+            begin (datetime): The start of the period.
+            end (datetime): The end of the period.
+            measure_type (str, optional): "HP" or "HC", the whole energy if None. Defaults to None.
+
+        Returns:
+            float: The energy in Wh.
+        """
+        column = {None: "value", "HP": "hp", "HC": "hc"}.get(measure_type)
+        if column is None:
+            return 0
+        return self.snapshot.rollup_value(begin, end, column)
+
     def get_mesure_type(self, measurement_date):
         """Determine the measurement type (HP or HC) based on the given date and off-peak hours.
 
@@ -811,29 +926,7 @@ class Stat:  # pylint: disable=R0902,R0904
         Returns:
             str: The measurement type, either "HP" (high peak) or "HC" (off-peak).
         """
-        offpeak_hours = {}
-        for i in range(0, 7):
-            offpeak_hours[i] = getattr(self.usage_point_id_config, f"offpeak_hours_{i}")
-        # GET WEEKDAY
-        date_days = measurement_date.weekday()
-        date_hour_minute = measurement_date.strftime("%H:%M")
-        measure_type = "HP"
-        day_offpeak_hours = offpeak_hours[date_days]
-        if day_offpeak_hours is not None:
-            for offpeak_hour in day_offpeak_hours.split(";"):
-                if offpeak_hour != "None" and offpeak_hour != "" and offpeak_hour is not None:
-                    offpeak_begin = offpeak_hour.split("-")[0].replace("h", ":").replace("H", ":")
-                    # FORMAT HOUR WITH 2 DIGIT
-                    offpeak_begin = datetime.strptime(offpeak_begin, "%H:%M")
-                    offpeak_begin = datetime.strftime(offpeak_begin, "%H:%M")
-                    offpeak_stop = offpeak_hour.split("-")[1].replace("h", ":").replace("H", ":")
-                    # FORMAT HOUR WITH 2 DIGIT
-                    offpeak_stop = datetime.strptime(offpeak_stop, "%H:%M")
-                    offpeak_stop = datetime.strftime(offpeak_stop, "%H:%M")
-                    result = self.is_between(date_hour_minute, (offpeak_begin, offpeak_stop))
-                    if result:
-                        measure_type = "HC"
-        return measure_type
+        return self.offpeak_calendar.mesure_type(measurement_date)
 
     def is_between(self, time, time_range):
         """Check if a given time is between a specified time range.
@@ -845,112 +938,153 @@ class Stat:  # pylint: disable=R0902,R0904
         Returns:
             bool: True if the time is between the time range, False otherwise.
         """
-        time = time.replace(":", "")
-        start = time_range[0].replace(":", "")
-        end = time_range[1].replace(":", "")
-        if end < start:
-            return time >= start or time < end
-        return start <= time < end
-
-    def generate_price(self):
+        return offpeak.is_between(time, time_range)
+
+    @staticmethod
+    def empty_price():
+        """Return the costs of a period before any reading, per subscription type."""
+        return {
+            "BASE": {"euro": 0, "kWh": 0, "Wh": 0},
+            "TEMPO": {
+                "BLUE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
+                "BLUE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
+                "WHITE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
+                "WHITE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
+                "RED_HC": {"euro": 0, "kWh": 0, "Wh": 0},
+                "RED_HP": {"euro": 0, "kWh": 0, "Wh": 0},
+            },
+            "HC": {"euro": 0, "kWh": 0, "Wh": 0},
+            "HP": {"euro": 0, "kWh": 0, "Wh": 0},
+        }
+
+    @staticmethod
+    def add_price(total, costs):
+        """Add the costs of a period to `total`, in place."""
+        for measure_type, cost in costs.items():
+            if measure_type == "TEMPO":
+                Stat.add_price(total["TEMPO"], cost)
+            else:
+                for unit in ["euro", "kWh", "Wh"]:
+                    total[measure_type][unit] += cost[unit]
+        return total
+
+    def price_month(self, data, price, tempo_config, tempo_data):
+        """Return the costs of the daily rollups of a month, per subscription type.
+
+        Args:
+            data (list): The daily rollups of the month.
+            price (float): The price of the BASE subscription (or of the production).
+            tempo_config (dict): The Tempo prices, per color and HC/HP.
+            tempo_data (dict): The Tempo colors, indexed by day.
+
+        Returns:
+            dict: The `euro`, `kWh` and `Wh` of BASE, HC, HP and each Tempo color.
+        """
+        result = self.empty_price()
+        for item in data:
+            prices = [
+                ("BASE", item.value, price),
+                ("HP", item.hp, self.usage_point_id_config.consumption_price_hp),
+                ("HC", item.hc, self.usage_point_id_config.consumption_price_hc),
+            ]
+            # TEMPO
+            if tempo_config and item.date in tempo_data:
+                color = tempo_data[item.date]
+                tempo_hc = item.tempo_hc_morning + item.tempo_hc_evening
+                for measure_type, wh in [("HC", tempo_hc), ("HP", item.tempo_hp)]:
+                    tempo_price = tempo_config[f"{color.lower()}_{measure_type.lower()}"]
+                    if isinstance(tempo_price, str):
+                        tempo_price = float(tempo_price.replace(",", "."))
+                    prices.append((f"{color}_{measure_type}", wh, tempo_price))
+
+            for measure_type, wh, measure_price in prices:
+                kwh = wh / 1000
+                target = result if measure_type in ["BASE", "HP", "HC"] else result["TEMPO"]
+                target[measure_type]["Wh"] += wh
+                target[measure_type]["kWh"] += kwh
+                target[measure_type]["euro"] += kwh * measure_price
+        return result
+
+    def generate_price(self, full=False):
         """Generates the price for the usage point based on the measurement data.
 
+        The costs are kept per month with the fingerprint of what they were computed from: the rollup of the month,
+        the prices and the Tempo colors of its days. Only the months whose fingerprint changed (new readings, reset,
+        new prices or colors) are computed again, from their daily rollups.
+
+        Args:
+            full (bool, optional): Compute every month again. Defaults to False.
+
         Returns:
             str: JSON string representing the calculated price.
         """
-        data = self.db.get_detail_all(
-            usage_point_id=self.usage_point_id, measurement_direction=self.measurement_direction
+        months = self.db.get_rollup_range(
+            self.usage_point_id, measurement_direction=self.measurement_direction, period="month"
         )
         result = {}
-        last_month = ""
-        if data:
+        if months:
             tempo_config = self.db.get_tempo_config("price")
-            tempo_data = self.db.get_tempo_range(data[0].date, data[-1].date)
-            for item in data:
-                year = item.date.strftime("%Y")
-                month = item.date.strftime("%m")
-                if month != last_month:
-                    logging.info(f" - {year} / {month}")
+            last_day = rollup.period_end(months[-1].date, "month") - timedelta(days=1)
+            tempo_data = {tempo.date: tempo.color for tempo in self.db.get_tempo_range(months[0].date, last_day)}
+            tempo_colors = {}
+            for day, color in sorted(tempo_data.items()):
+                tempo_colors[day.strftime("%Y-%m")] = tempo_colors.get(day.strftime("%Y-%m"), "") + color[0]
+            if self.measurement_direction == "consumption":
+                price = self.usage_point_id_config.consumption_price_base
+            else:
+                price = self.usage_point_id_config.production_price
+            prices = [
+                price,
+                self.usage_point_id_config.consumption_price_hc,
+                self.usage_point_id_config.consumption_price_hp,
+                tempo_config,
+            ]
+            cache = {}
+            if not full:
+                data = self.db.get_stat(self.usage_point_id, f"price_{self.measurement_direction}_month")
+                if data:
+                    cache = json.loads(data[0].value)
 
-                measure_type = self.get_mesure_type(item.date)
+            costs = {}
+            dirty = []
+            for item in months:
+                key = item.date.strftime("%Y-%m")
+                # Through JSON, to be compared with the fingerprints read back from the database.
+                fingerprint = json.loads(
+                    json.dumps([[getattr(item, column) for column in rollup.COLUMNS], prices, tempo_colors.get(key)])
+                )
+                if key in cache and cache[key]["fingerprint"] == fingerprint:
+                    costs[key] = cache[key]
+                else:
+                    costs[key] = {"fingerprint": fingerprint}
+                    dirty.append(item.date)
+            logging.info(f" - {len(dirty)} mois à recalculer sur {len(months)}")
+            if dirty:
+                days = {}
+                for day in self.db.get_rollup_range(
+                    self.usage_point_id,
+                    dirty[0],
+                    rollup.period_end(dirty[-1], "month") - timedelta(days=1),
+                    self.measurement_direction,
+                ):
+                    days.setdefault(day.date.strftime("%Y-%m"), []).append(day)
+                for month in dirty:
+                    key = month.strftime("%Y-%m")
+                    logging.info(f" - {month.strftime('%Y')} / {month.strftime('%m')}")
+                    costs[key]["price"] = self.price_month(days.get(key, []), price, tempo_config, tempo_data)
 
-                tempo_date = datetime.combine(item.date, datetime.min.time())
-                interval = item.interval
+            # YEARS & MONTH
+            for key, cost in costs.items():
+                year, month = key.split("-")
                 if year not in result:
-                    result[year] = {
-                        "BASE": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "TEMPO": {
-                            "BLUE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "BLUE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                        },
-                        "HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "month": {},
-                    }
-                if month not in result[year]["month"]:
-                    result[year]["month"][month] = {
-                        "BASE": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "TEMPO": {
-                            "BLUE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "BLUE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "WHITE_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                            "RED_HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                        },
-                        "HC": {"euro": 0, "kWh": 0, "Wh": 0},
-                        "HP": {"euro": 0, "kWh": 0, "Wh": 0},
-                    }
-                if self.measurement_direction == "consumption":
-                    price = self.usage_point_id_config.consumption_price_base
-                else:
-                    price = self.usage_point_id_config.production_price
-                if measure_type == "HP":
-                    price_hc_hp = self.usage_point_id_config.consumption_price_hp
-                else:
-                    price_hc_hp = self.usage_point_id_config.consumption_price_hc
-                wh = (item.value) / (60 / interval)
-                kwh = wh / 1000
-                # YEARS
-                result[year]["BASE"]["Wh"] += wh
-                result[year]["BASE"]["kWh"] += kwh
-                result[year]["BASE"]["euro"] += kwh * price
-                result[year][measure_type]["Wh"] += wh
-                result[year][measure_type]["kWh"] += kwh
-                result[year][measure_type]["euro"] += kwh * price_hc_hp
-
-                # MONTH
-                result[year]["month"][month]["BASE"]["Wh"] += wh
-                result[year]["month"][month]["BASE"]["kWh"] += kwh
-                result[year]["month"][month]["BASE"]["euro"] += kwh * price
-                result[year]["month"][month][measure_type]["Wh"] += wh
-                result[year]["month"][month][measure_type]["kWh"] += kwh
-                result[year]["month"][month][measure_type]["euro"] += kwh * price_hc_hp
-
-                # TEMPO
-                if tempo_config:
-                    hour = int(item.date.strftime("%H"))
-                    if 6 <= hour < 22:
-                        measure_type = "HP"
-                    else:
-                        measure_type = "HC"
-                    tempo_output = [x for x in tempo_data if x.date == tempo_date]
-                    if tempo_output:
-                        color = tempo_output[0].color
-                        tempo_price = tempo_config[f"{color.lower()}_{measure_type.lower()}"]
-                        if isinstance(tempo_price, str):
-                            tempo_price = float(tempo_price.replace(",", "."))
-                        result[year]["TEMPO"][f"{color}_{measure_type}"]["Wh"] += wh
-                        result[year]["TEMPO"][f"{color}_{measure_type}"]["kWh"] += kwh
-                        result[year]["TEMPO"][f"{color}_{measure_type}"]["euro"] += kwh * tempo_price
-                        result[year]["month"][month]["TEMPO"][f"{color}_{measure_type}"]["Wh"] += wh
-                        result[year]["month"][month]["TEMPO"][f"{color}_{measure_type}"]["kWh"] += kwh
-                        result[year]["month"][month]["TEMPO"][f"{color}_{measure_type}"]["euro"] += kwh * tempo_price
-                last_month = month
+                    result[year] = {**self.empty_price(), "month": {}}
+                self.add_price(result[year], cost["price"])
+                result[year]["month"][month] = cost["price"]
+            self.db.set_stat(
+                self.usage_point_id,
+                f"price_{self.measurement_direction}_month",
+                json.dumps(costs),
+            )
             self.db.set_stat(
                 self.usage_point_id,
                 f"price_{self.measurement_direction}",
@@ -970,8 +1104,6 @@ class Stat:  # pylint: disable=R0902,R0904
         """
         begin = datetime.combine(specific_date, datetime.min.time())
         end = datetime.combine(specific_date, datetime.max.time())
-        value = 0
-        for item in self.db.get_detail_range(self.usage_point_id, begin, end):
-            if self.get_mesure_type(item.date).upper() == mesure_type.upper():
-                value += item.value / (60 / item.interval)
-        return value
+        if mesure_type.lower() not in StatSnapshot.ROLLUP_COLUMNS:
+            return 0
+        return stat_snapshot(self.db, self.usage_point_id, "consumption").rollup_value(begin, end, mesure_type.lower())
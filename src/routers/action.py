@@ -62,6 +62,43 @@ def delete_all_data(usage_point_id: str = Path(..., description=DOCUMENTATION["u
     return Ajax(usage_point_id).delete_all_data()
 
 
+@ROUTER.get(
+    "/rollup/{usage_point_id}/rebuild",
+    summary="Recalcule les agrégats (heure, jour, mois, année) des données détaillées.",
+)
+@ROUTER.get("/rollup/{usage_point_id}/rebuild/", include_in_schema=False)
+def rebuild_rollup(usage_point_id: str = Path(..., description=DOCUMENTATION["usage_point_id"])):
+    """Recalcule les agrégats (heure, jour, mois, année) des données détaillées."""
+    return Ajax(usage_point_id).rebuild_rollup()
+
+
+@ROUTER.get(
+    "/rollup/{usage_point_id}/check",
+    summary="Vérifie les agrégats par rapport aux données détaillées.",
+)
+@ROUTER.get("/rollup/{usage_point_id}/check/", include_in_schema=False)
+def check_rollup(usage_point_id: str = Path(..., description=DOCUMENTATION["usage_point_id"])):
+    """Vérifie les agrégats par rapport aux données détaillées."""
+    return Ajax(usage_point_id).check_rollup()
+
+
+@ROUTER.get(
+    "/price/{usage_point_id}/rebuild",
+    summary="Recalcule tous les mois du comparateur d'abonnements.",
+)
+@ROUTER.get("/price/{usage_point_id}/rebuild/", include_in_schema=False)
+def rebuild_price(usage_point_id: str = Path(..., description=DOCUMENTATION["usage_point_id"])):
+    """Recalcule tous les mois du comparateur d'abonnements, et non seulement ceux qui ont changé."""
+    return Ajax(usage_point_id).rebuild_price()
+
+
+@ROUTER.get("/unlock", summary="Libère les baux d'importation de tous les jobs, même en cours.")
+@ROUTER.get("/unlock/", include_in_schema=False)
+def unlock():
+    """Libère les baux d'importation de tous les jobs, même en cours."""
+    return Ajax().unlock()
+
+
 @ROUTER.get(
     "/reset_gateway/{usage_point_id}",
     summary="Efface le cache du point de livraison sur la passerelle.",
@@ -837,17 +837,14 @@ class UsagePoint:
             logging.error("Pas de données.")
 
     def generate_data(self, measurement_direction):
-        data = self.db.get_daily_all(self.usage_point_id, measurement_direction)
         result = {}
-        for item in data:
-            year = item.date.strftime("%Y")
-            month = item.date.strftime("%m")
+        months = self.db.get_daily_totals(self.usage_point_id, "month", measurement_direction=measurement_direction)
+        for item in months:
+            year = str(item.year)
             if year not in result:
                 result[year] = {"value": 0, "month": {}}
-            if month not in result[year]["month"]:
-                result[year]["month"][month] = 0
             result[year]["value"] = result[year]["value"] + item.value
-            result[year]["month"][month] = result[year]["month"][month] + item.value
+            result[year]["month"][f"{item.month:02d}"] = item.value
         if measurement_direction == "consumption":
             self.recap_consumption_data = result
         else:
@@ -76,6 +76,34 @@ def update_paths():
             yield
 
 
+@pytest.fixture
+def usage_point():
+    """Return a factory creating a disabled usage point with its readings, deleted with its statistics after the test.
+
+    Example usage:
+        @pytest.fixture
+        def db(usage_point):
+            return usage_point("rollup", OFFPEAK_HOURS, detail=[{"date": ..., "value": 100, "interval": 30}])
+    """
+    from init import DB
+
+    created = []
+
+    def create(usage_point_id, config=None, daily=None, detail=None):
+        DB.set_usage_point(usage_point_id, {"token": "abcd", "enable": False, **(config or {})})
+        created.append(usage_point_id)
+        if daily:
+            DB.insert_daily_bulk(usage_point_id, daily)
+        if detail:
+            DB.insert_detail_bulk(usage_point_id, detail)
+        return DB
+
+    yield create
+    for usage_point_id in created:
+        DB.del_stat(usage_point_id)
+        DB.delete_usage_point(usage_point_id)
+
+
 def contains_logline(caplog, expected_log: str, expected_level: int = None):
     for logger_name, level, message in caplog.record_tuples:
         is_log_match = expected_log == message
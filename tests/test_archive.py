@@ -0,0 +1,74 @@
+import datetime
+import os
+
+import pytest
+
+USAGE_POINT_ID = "archive"
+BEGIN = datetime.datetime(2023, 1, 1)
+END = datetime.datetime(2023, 4, 1)
+
+
+@pytest.fixture
+def db(usage_point):
+    detail = [
+        {"date": BEGIN + datetime.timedelta(minutes=30 * i), "value": i, "interval": 30, "measure_type": "HP"}
+        for i in range(int((END - BEGIN).total_seconds() // 1800))
+    ]
+    return usage_point(USAGE_POINT_ID, detail=detail)
+
+
+def readings(db):
+    rows = db.get_detail_range(USAGE_POINT_ID, BEGIN, END, order="asc")
+    return [(row.date, row.value, row.interval) for row in rows]
+
+
+def test_encode_decode():
+    from models.archive import ArchiveRow, decode, encode
+
+    rows = [
+        ArchiveRow(datetime.datetime(2023, 3, 26, 1, 30), 120, 30, "HC", 0, 0),
+        ArchiveRow(datetime.datetime(2023, 3, 26, 2, 0), 2**40, 30, "HP", 1, 2),
+        ArchiveRow(datetime.datetime(2023, 3, 26, 2, 10), 0, 10, "", 0, 0),
+    ]
+    assert decode(encode(rows)) == rows
+
+
+def test_archive_detail(db):
+    expected = readings(db)
+    count = db.get_detail_count(USAGE_POINT_ID)
+
+    archived = db.archive_detail(datetime.datetime(2023, 3, 15), USAGE_POINT_ID, "consumption")
+
+    assert archived == (31 + 28) * 48
+    assert sorted(db.archive.months(USAGE_POINT_ID, "consumption")) == [
+        datetime.datetime(2023, 1, 1),
+        datetime.datetime(2023, 2, 1),
+    ]
+    assert os.path.isfile(db.archive.file(USAGE_POINT_ID, "consumption", datetime.datetime(2023, 1, 1)))
+    assert readings(db) == expected
+    assert [(row.date, row.value) for row in db.stream_detail_all(USAGE_POINT_ID, order_dir="desc")] == [
+        (date, value) for date, value, interval in reversed(expected)
+    ]
+    assert db.get_detail_count(USAGE_POINT_ID) == count
+    assert db.get_detail_last_date(USAGE_POINT_ID) == BEGIN
+    assert len(db.get_detail_timestamps(USAGE_POINT_ID, BEGIN, END)) == count
+    assert db.get_detail_date(USAGE_POINT_ID, BEGIN).value == 0
+    assert db.get_detail_state(USAGE_POINT_ID, BEGIN) is True
+    datatable = db.get_detail_datatable(USAGE_POINT_ID, order_dir="desc")
+    assert [(row.date, row.value) for row in datatable] == [(date, value) for date, value, interval in expected]
+    assert [row.value for row in db.get_detail_datatable(USAGE_POINT_ID, search="2023-01-01 00:30")] == [1]
+    assert db.check_rollup(USAGE_POINT_ID) == []
+
+
+def test_write_restores_archived_month(db):
+    db.archive_detail(datetime.datetime(2023, 3, 1), USAGE_POINT_ID, "consumption")
+    date = datetime.datetime(2023, 2, 10, 12)
+    db.insert_detail(USAGE_POINT_ID, date, 5000, 30, "HP")
+
+    assert sorted(db.archive.months(USAGE_POINT_ID, "consumption")) == [datetime.datetime(2023, 1, 1)]
+    assert db.get_detail_date(USAGE_POINT_ID, date).value == 5000
+    assert db.get_detail_count(USAGE_POINT_ID) == int((END - BEGIN).total_seconds() // 1800)
+    assert db.check_rollup(USAGE_POINT_ID) == []
+
+    db.delete_detail(USAGE_POINT_ID)
+    assert db.archive.months(USAGE_POINT_ID, "consumption") == {}
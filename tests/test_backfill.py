@@ -0,0 +1,79 @@
+import datetime
+import threading
+
+import pytest
+
+
+def windows(count):
+    end = datetime.datetime(2024, 1, 1)
+    return [(end - datetime.timedelta(days=7 * (i + 1)), end - datetime.timedelta(days=7 * i)) for i in range(count)]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_backfill_merges_in_date_order(mocker, workers):
+    from models.backfill import Backfill
+
+    m_progress = mocker.patch("models.database.Database.progress")
+
+    def fetch(begin, end, priority):
+        return [{"date": str(end - datetime.timedelta(days=1))}, {"date": str(begin)}]
+
+    result = Backfill("pdl1", fetch, workers=workers).run(windows(10))
+
+    dates = [reading["date"] for reading in result]
+    assert dates == sorted(dates)
+    assert len(dates) == 20
+    assert m_progress.call_count == 10
+
+
+def test_backfill_stops_on_error(mocker):
+    from models.backfill import Backfill
+    from models.quota import Quota
+
+    mocker.patch("models.database.Database.progress")
+    calls = []
+    lock = threading.Lock()
+
+    def fetch(begin, end, priority):
+        with lock:
+            calls.append(priority)
+        if priority == Quota.RECENT:
+            return [{"date": str(begin)}]
+        return {"error": True, "description": "conflict", "status_code": 409}
+
+    result = Backfill("pdl1", fetch, workers=1).run(windows(10))
+
+    assert result == [{"date": "2023-12-25 00:00:00"}]
+    assert calls == [Quota.RECENT, Quota.BACKFILL]
+
+
+def test_backfill_calls_capped_per_token(mocker):
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from models.backfill import Backfill
+
+    mocker.patch("models.database.Database.progress")
+    mocker.patch("models.config.Config.import_config", return_value={"concurrency_per_token": 2})
+    mocker.patch("models.database.Database.get_usage_point", return_value=mocker.Mock(token="abcd"))
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetch(begin, end, priority):
+        with lock:
+            in_flight.append(begin)
+            peak.append(len(in_flight))
+        time.sleep(0.01)
+        with lock:
+            in_flight.remove(begin)
+        return [{"date": str(begin)}]
+
+    # Two usage points with the same token are imported at the same time.
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(Backfill(usage_point_id, fetch, workers=4).run, windows(8))
+            for usage_point_id in ["pdl1", "pdl2"]
+        ]
+        assert [len(future.result()) for future in futures] == [8, 8]
+    assert max(peak) == 2
@@ -0,0 +1,495 @@
+"""Benchmarks of the hot paths of the import job.
+
+They are skipped by default, run them with:
+    BENCHMARK=true python -m pytest tests/test_benchmark.py -s
+"""
+import datetime
+import os
+import time
+import tracemalloc
+
+import pytest
+
+benchmark = pytest.mark.skipif(not os.getenv("BENCHMARK"), reason="BENCHMARK n'est pas défini")
+
+
+def report(name, count, elapsed, unit="rows/s"):
+    print(f"\n{name}: {count} en {round(elapsed, 3)}s => {round(count / elapsed)} {unit}")
+
+
+def detail_readings(begin, count):
+    return [{"date": begin + datetime.timedelta(minutes=30 * i), "value": i, "interval": 30} for i in range(count)]
+
+
+@benchmark
+def test_benchmark_insert_detail():
+    from init import DB
+
+    count = 2000
+    data = detail_readings(datetime.datetime(2002, 1, 1), count)
+    try:
+        start = time.time()
+        for item in data:
+            DB.insert_detail(
+                usage_point_id="pdl1",
+                date=item["date"],
+                value=item["value"],
+                interval=item["interval"],
+                measure_type="",
+            )
+        report("insert_detail", count, time.time() - start)
+
+        start = time.time()
+        DB.insert_detail_bulk("pdl1", data)
+        report("insert_detail_bulk", count, time.time() - start)
+    finally:
+        for item in data:
+            DB.delete_detail("pdl1", item["date"])
+
+
+@benchmark
+def test_benchmark_parse_load_curve():
+    import re
+
+    from models.load_curve import LoadCurve
+
+    count = 35000
+    begin = datetime.datetime(2022, 1, 1)
+    interval_reading = [
+        {
+            "interval_length": "PT30M",
+            "value": str(i),
+            "date": (begin + datetime.timedelta(minutes=30 * i)).strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        for i in range(count)
+    ]
+
+    start = time.time()
+    dates = []
+    for reading in interval_reading:
+        interval = re.findall(r"\d+", reading["interval_length"])[0]
+        dates.append(
+            datetime.datetime.strptime(reading["date"], "%Y-%m-%d %H:%M:%S")
+            - datetime.timedelta(minutes=int(interval))
+        )
+    report("re.findall + strptime", len(dates), time.time() - start)
+
+    start = time.time()
+    curve = LoadCurve.parse(interval_reading)
+    report("LoadCurve.parse", len(curve), time.time() - start)
+
+
+def storage_workload(engine, count):
+    """Mimic the queries of the web routes and of an import cycle: small reads and single-row writes."""
+    from sqlalchemy import delete, select
+    from sqlalchemy.orm import scoped_session, sessionmaker
+
+    from db_schema import Config, ConsumptionDaily
+
+    session = scoped_session(sessionmaker(engine, autocommit=True, autoflush=True))
+    begin = datetime.datetime(2004, 1, 1)
+    start = time.time()
+    for i in range(count):
+        session.scalars(select(Config).where(Config.key == "version")).one_or_none()
+        session.execute(
+            select(ConsumptionDaily.date, ConsumptionDaily.value)
+            .where(ConsumptionDaily.usage_point_id == "benchmark")
+            .where(ConsumptionDaily.date >= begin)
+        ).all()
+        session.add(Config(key=f"benchmark/{i}", value=str(i)))
+        session.flush()
+        session.close()
+    elapsed = time.time() - start
+    session.execute(delete(Config).where(Config.key.like("benchmark/%")).execution_options(synchronize_session=False))
+    session.remove()
+    return elapsed
+
+
+@benchmark
+@pytest.mark.parametrize("backend", ["sqlite", "postgresql"])
+def test_benchmark_storage_profile(tmp_path, backend):
+    from sqlalchemy import create_engine
+    from sqlalchemy.pool import NullPool
+
+    from db_schema import Base
+    from models.database import storage_engine, storage_profile
+
+    if backend == "sqlite":
+        uri = f"sqlite:///{tmp_path}/benchmark.db?check_same_thread=False"
+    else:
+        uri = os.getenv("BENCHMARK_POSTGRESQL_URI")
+        if not uri:
+            pytest.skip("BENCHMARK_POSTGRESQL_URI n'est pas défini")
+
+    count = 500
+    legacy = create_engine(uri, echo=False, query_cache_size=0, isolation_level="READ UNCOMMITTED", poolclass=NullPool)
+    Base.metadata.create_all(legacy)
+    report(f"{backend} NullPool, sans cache", count * 3, storage_workload(legacy, count), "requêtes/s")
+    legacy.dispose()
+
+    tuned = storage_engine(uri, storage_profile(uri))
+    report(f"{backend} storage profile", count * 3, storage_workload(tuned, count), "requêtes/s")
+    tuned.dispose()
+
+
+@benchmark
+def test_benchmark_row_keys(tmp_path):
+    import hashlib
+    import random
+
+    from sqlalchemy import Column, ForeignKey, Index, MetaData, String, Table, Text, create_engine, select
+
+    from db_schema import ConsumptionDetail
+    from models.database import row_id
+
+    # 3 usage points, 2 years of 30 minutes readings each.
+    usage_points = {"benchmark_1": 1, "benchmark_2": 2, "benchmark_3": 3}
+    dates = [datetime.datetime(2022, 1, 1) + datetime.timedelta(minutes=30 * i) for i in range(2 * 365 * 48)]
+    lookups = [(random.choice(list(usage_points)), random.choice(dates)) for _ in range(20000)]
+
+    # Layout before the integer keys: md5 string id, with its own index, and an index on usage_point_id.
+    key_columns = ["id", "usage_point_id"]
+    metadata = MetaData()
+    Table("usage_points", metadata, Column("usage_point_id", Text, primary_key=True))
+    md5_table = Table(
+        "consumption_detail",
+        metadata,
+        Column("id", String, primary_key=True, index=True, unique=True),
+        Column("usage_point_id", Text, ForeignKey("usage_points.usage_point_id"), nullable=False, index=True),
+        *[column.copy() for column in ConsumptionDetail.__table__.columns if column.name not in key_columns],
+        Index("ix_consumption_detail_usage_point_id_date", "usage_point_id", "date"),
+    )
+
+    layouts = {
+        "md5": (md5_table, lambda up, date: hashlib.md5(f"{up}/{date}".encode()).hexdigest()),
+        "integer": (ConsumptionDetail.__table__, lambda up, date: row_id(usage_points[up], date)),
+    }
+    for name, (table, key) in layouts.items():
+        path = tmp_path / f"{name}.db"
+        engine = create_engine(f"sqlite:///{path}")
+        table.metadata.create_all(engine, tables=[table])
+        rows = [
+            {
+                "id": key(usage_point_id, date),
+                "usage_point_id": usage_point_id,
+                "date": date,
+                "value": i,
+                "interval": 30,
+                "measure_type": "BRUT",
+                "blacklist": 0,
+                "fail_count": 0,
+            }
+            for usage_point_id in usage_points
+            for i, date in enumerate(dates)
+        ]
+        with engine.begin() as connection:
+            connection.execute(table.insert(), rows)
+        with engine.connect() as connection:
+            connection.exec_driver_sql("VACUUM")
+        print(f"\n{name}: {len(rows)} lignes => {round(path.stat().st_size / 1024 / 1024, 1)} Mo")
+
+        start = time.time()
+        with engine.connect() as connection:
+            for usage_point_id, date in lookups:
+                connection.execute(select(table.c.value).where(table.c.id == key(usage_point_id, date))).scalar_one()
+        report(f"{name} lookup", len(lookups), time.time() - start, "lookups/s")
+        engine.dispose()
+
+
+@benchmark
+def test_benchmark_rollup():
+    from init import DB
+    from models.offpeak import mesure_type, offpeak_hours
+
+    begin = datetime.datetime(2003, 1, 1)
+    end = datetime.datetime(2003, 12, 31)
+    DB.insert_detail_bulk("pdl1", detail_readings(begin, 365 * 48))
+    usage_point = offpeak_hours(DB.get_usage_point("pdl1"))
+    try:
+        rounds = 20
+        start = time.time()
+        for _ in range(rounds):
+            total = {"HC": 0, "HP": 0}
+            for item in DB.get_detail_range("pdl1", begin, end + datetime.timedelta(days=1)):
+                total[mesure_type(usage_point, item.date)] += item.value / (60 / item.interval)
+        report("Année HC/HP depuis le détail", rounds, time.time() - start, "requêtes/s")
+
+        start = time.time()
+        for _ in range(rounds):
+            total = DB.get_rollup("pdl1", begin, end)
+        report("Année HC/HP depuis les agrégats", rounds, time.time() - start, "requêtes/s")
+    finally:
+        DB.delete_detail("pdl1")
+
+
+@benchmark
+def test_benchmark_stream_detail():
+    from init import DB
+
+    count = 2 * 365 * 48
+    DB.insert_detail_bulk("pdl1", detail_readings(datetime.datetime(2004, 1, 1), count))
+    try:
+        for name, read in [
+            ("get_detail_all", lambda: DB.get_detail_all("pdl1")),
+            ("stream_detail_all", lambda: DB.stream_detail_all("pdl1")),
+        ]:
+            tracemalloc.start()
+            start = time.time()
+            total = sum(item.value for item in read())
+            elapsed = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            assert total == sum(range(count))
+            report(f"{name} (pic mémoire {round(peak / 1024 / 1024, 1)} Mo)", count, elapsed)
+    finally:
+        DB.delete_detail("pdl1")
+
+
+@benchmark
+def test_benchmark_archive_detail():
+    from init import DB
+
+    count = 2 * 365 * 48
+    begin = datetime.datetime(2005, 1, 1)
+    DB.insert_detail_bulk("pdl1", detail_readings(begin, count))
+    try:
+        for name in ["table", "archive"]:
+            if name == "archive":
+                size = os.path.getsize(DB.db_path)
+                DB.archive_detail(begin + datetime.timedelta(days=2 * 365), "pdl1", "consumption")
+                files = sum(
+                    os.path.getsize(DB.archive.file("pdl1", "consumption", month))
+                    for month in DB.archive.months("pdl1", "consumption")
+                )
+                print(
+                    f"\ncache.db : {round(size / 1024 / 1024, 1)} Mo -> "
+                    f"{round(os.path.getsize(DB.db_path) / 1024 / 1024, 1)} Mo, archive : {round(files / 1024)} Ko"
+                )
+            start = time.time()
+            total = sum(item.value for item in DB.stream_detail_all("pdl1"))
+            report(f"Lecture de l'historique ({name})", count, time.time() - start)
+            assert total == sum(range(count))
+    finally:
+        DB.delete_detail("pdl1")
+
+
+@benchmark
+def test_benchmark_import_database(tmp_path):
+    import sqlite3
+
+    from init import DB
+    from models.migration import Migration
+
+    count = 2 * 365 * 48
+    begin = datetime.datetime(2006, 1, 1)
+    path = tmp_path / "enedisgateway.db"
+    connection = sqlite3.connect(path)
+    connection.execute(
+        "CREATE TABLE consumption_detail (pdl TEXT, date TEXT, value INTEGER, interval INTEGER, measure_type TEXT)"
+    )
+    connection.executemany(
+        "INSERT INTO consumption_detail VALUES ('pdl1', ?, ?, 30, 'HP')",
+        ((f"{item['date']:%Y-%m-%d %H:%M:%S}", item["value"]) for item in detail_readings(begin, count)),
+    )
+    connection.commit()
+    connection.close()
+    try:
+        tracemalloc.start()
+        start = time.time()
+        Migration(DB, str(path), schema="v7").run()
+        elapsed = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        report(f"Migration v7 (pic mémoire {round(peak / 1024 / 1024, 1)} Mo)", count, elapsed)
+        assert DB.get_detail_count("pdl1") == count
+    finally:
+        DB.delete_detail("pdl1")
+
+
+@benchmark
+def test_benchmark_startup(tmp_path):
+    import subprocess
+
+    from dependencies import APPLICATION_PATH
+    from init import CONFIG
+    from models.database import Database
+
+    start = time.time()
+    db = Database(CONFIG, str(tmp_path))
+    report("Database() sur une base vide", 1, time.time() - start, "démarrages/s")
+
+    count = 5
+    start = time.time()
+    for _ in range(count):
+        subprocess.run(
+            "alembic upgrade head", shell=True, cwd=APPLICATION_PATH, env={**os.environ, "DB_URL": db.uri}, check=True
+        )
+    report("alembic upgrade head (processus)", count, time.time() - start, "démarrages/s")
+
+    start = time.time()
+    for _ in range(count):
+        Database(CONFIG, str(tmp_path))
+    report("Database() sur une base à jour", count, time.time() - start, "démarrages/s")
+
+
+@benchmark
+def test_benchmark_offpeak_calendar():
+    from test_offpeak import reference_mesure_type
+
+    from models.offpeak import offpeak_calendar
+
+    day_offpeak_hours = {weekday: "22H00-6H00;12H30-14H00" for weekday in range(0, 7)}
+    dates = [datetime.datetime(2023, 1, 1) + datetime.timedelta(minutes=30 * i) for i in range(365 * 48)]
+
+    start = time.time()
+    expected = [reference_mesure_type(day_offpeak_hours, date) for date in dates]
+    report("Classement HC/HP (analyse des plages)", len(dates), time.time() - start)
+
+    start = time.time()
+    calendar = offpeak_calendar(day_offpeak_hours)
+    assert [calendar.mesure_type(date) for date in dates] == expected
+    report("Classement HC/HP (calendrier compilé)", len(dates), time.time() - start)
+
+    start = time.time()
+    assert calendar.classify(dates) == expected
+    report("Classement HC/HP (classify)", len(dates), time.time() - start)
+
+
+@benchmark
+def test_benchmark_stat_snapshot():
+    from init import DB
+    from models.stat import SNAPSHOTS, Stat
+
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+    begin = today - datetime.timedelta(days=3 * 365)
+    DB.insert_daily_bulk(
+        "pdl1", [{"date": begin + datetime.timedelta(days=day), "value": day} for day in range(3 * 365)]
+    )
+    # The periods read by the exports and the usage point page: 12 months of 3 years, then the last 7 days.
+    periods = [
+        (datetime.datetime(year, month, 1), datetime.datetime(year, month, 28, 23, 59, 59))
+        for year in range(today.year - 2, today.year + 1)
+        for month in range(1, 13)
+    ] + [(today - datetime.timedelta(days=day), today - datetime.timedelta(days=day)) for day in range(1, 8)]
+    try:
+        start = time.time()
+        expected = [
+            sum(data.value for data in DB.get_daily_range("pdl1", period_begin, period_end, "consumption"))
+            for period_begin, period_end in periods
+        ]
+        report("Une requête par période", len(periods), time.time() - start, "périodes/s")
+
+        SNAPSHOTS.clear()
+        start = time.time()
+        snapshot = Stat("pdl1", "consumption").snapshot
+        values = [snapshot.daily_value(period_begin, period_end) for period_begin, period_end in periods]
+        report("StatSnapshot (chargement compris)", len(periods), time.time() - start, "périodes/s")
+        assert values == expected
+    finally:
+        DB.delete_daily("pdl1")
+
+
+@benchmark
+@pytest.mark.parametrize("years", [1, 3, 5])
+def test_benchmark_stat_backends(years):
+    from types import SimpleNamespace
+
+    from init import DB
+    from models import rollup
+    from models.stat import StatSnapshot, numpy
+
+    if numpy is None:
+        pytest.skip("NumPy n'est pas installé")
+    days = 365 * years
+    begin = datetime.datetime.combine(datetime.date.today(), datetime.time.min) - datetime.timedelta(days=days)
+    detail = detail_readings(begin, days * 48)
+    DB.insert_daily_bulk("pdl1", [{"date": begin + datetime.timedelta(days=day), "value": day} for day in range(days)])
+    DB.insert_daily_bulk(
+        "pdl1",
+        [{"date": begin + datetime.timedelta(days=day), "value": day % 9000} for day in range(days)],
+        "consumption_max_power",
+    )
+    DB.insert_detail_bulk("pdl1", detail)
+    try:
+        readings = [SimpleNamespace(**reading) for reading in detail]
+        offpeak_hours = {weekday: "22H00-6H00" for weekday in range(0, 7)}
+        results = {}
+        for backend in ["python", "numpy"]:
+            start = time.time()
+            results[backend] = rollup.aggregate(readings, offpeak_hours, backend)
+            report(f"rollup.aggregate {backend} ({years} an(s) au pas 30 min)", len(readings), time.time() - start)
+        assert results["numpy"] == results["python"]
+
+        periods = [
+            (begin + datetime.timedelta(days=day), begin + datetime.timedelta(days=day + 30))
+            for day in range(0, days, 30)
+        ]
+        results = {}
+        for backend in ["python", "numpy"]:
+            rounds = 10
+            start = time.time()
+            for _ in range(rounds):
+                snapshot = StatSnapshot(DB, "pdl1", "consumption", backend=backend)
+            report(
+                f"StatSnapshot {backend} ({years} an(s) au pas 30 min)", rounds, time.time() - start, "chargements/s"
+            )
+            results[backend] = [
+                (snapshot.daily_value(*period), snapshot.rollup_value(*period, "hc"), snapshot.max_power(period[0]))
+                for period in periods
+            ]
+        assert results["numpy"] == results["python"]
+    finally:
+        DB.delete_detail("pdl1")
+        DB.delete_daily("pdl1")
+        DB.delete_daily_max_power("pdl1")
+
+
+@benchmark
+def test_benchmark_daily_totals():
+    from init import DB
+
+    begin = datetime.datetime(2015, 1, 1)
+    days = 10 * 365
+    DB.insert_daily_bulk("pdl1", [{"date": begin + datetime.timedelta(days=day), "value": day} for day in range(days)])
+    try:
+        rounds = 20
+        start = time.time()
+        for _ in range(rounds):
+            totals = {}
+            for item in DB.stream_daily_all("pdl1"):
+                key = (item.date.strftime("%Y"), item.date.strftime("%m"))
+                totals[key] = totals.get(key, 0) + item.value
+        report("Mois sommés en Python", rounds, time.time() - start, "requêtes/s")
+
+        start = time.time()
+        for _ in range(rounds):
+            rows = DB.get_daily_totals("pdl1", "month")
+        report("Mois sommés par la base (GROUP BY)", rounds, time.time() - start, "requêtes/s")
+        assert [row.value for row in rows] == list(totals.values())
+    finally:
+        DB.delete_daily("pdl1")
+
+
+@benchmark
+def test_benchmark_price():
+    from init import DB
+    from models.stat import Stat
+
+    begin = datetime.datetime(2006, 1, 1)
+    DB.insert_detail_bulk("pdl1", detail_readings(begin, 3 * 365 * 48))
+    try:
+        rounds = 5
+        start = time.time()
+        for _ in range(rounds):
+            Stat("pdl1", "consumption").generate_price(full=True)
+        report("Comparateur, recalcul complet (3 ans)", rounds, time.time() - start, "calculs/s")
+
+        start = time.time()
+        for day in range(rounds):
+            DB.insert_detail("pdl1", begin + datetime.timedelta(days=day), 0, 30, "HP")
+            result = Stat("pdl1", "consumption").generate_price()
+        report("Comparateur, mois modifiés seulement", rounds, time.time() - start, "calculs/s")
+        assert result == Stat("pdl1", "consumption").generate_price(full=True)
+    finally:
+        DB.delete_detail("pdl1")
+        DB.del_stat("pdl1")
@@ -0,0 +1,75 @@
+import datetime
+
+import pytest
+
+USAGE_POINT_ID = "totals"
+# Crosses the end of 2020, whose last ISO week is the 53rd, and the 29th of February 2024.
+BEGIN = datetime.datetime(2020, 11, 20)
+DAYS = [BEGIN + datetime.timedelta(days=day) for day in range(1300) if day % 9 != 4]
+
+
+@pytest.fixture
+def db(usage_point):
+    return usage_point(USAGE_POINT_ID, daily=[{"date": date, "value": index} for index, date in enumerate(DAYS)])
+
+
+def expected_totals(period, begin, end):
+    totals = {}
+    for index, date in enumerate(DAYS):
+        if begin <= date <= end:
+            if period == "week":
+                key = date.isocalendar()[:2]
+            elif period == "month":
+                key = (date.year, date.month)
+            else:
+                key = (date.year,)
+            total = totals.setdefault(key, {"value": 0, "count": 0, "begin": date, "end": date})
+            total["value"] += index
+            total["count"] += 1
+            total["end"] = date
+    return [(*key, total["value"], total["count"], total["begin"], total["end"]) for key, total in totals.items()]
+
+
+@pytest.mark.parametrize("period", ["year", "month", "week"])
+@pytest.mark.parametrize(
+    "begin, end",
+    [
+        (datetime.datetime.min, datetime.datetime.max),
+        (datetime.datetime(2020, 12, 24), datetime.datetime(2021, 1, 12, 23, 59, 59)),
+        (datetime.datetime(2024, 2, 1), datetime.datetime(2024, 3, 3)),
+    ],
+)
+def test_daily_totals(db, period, begin, end):
+    rows = db.get_daily_totals(USAGE_POINT_ID, period, begin, end)
+    assert [tuple(row) for row in rows] == expected_totals(period, begin, end)
+
+
+def test_daily_totals_unknown_period(db):
+    with pytest.raises(ValueError):
+        db.get_daily_totals(USAGE_POINT_ID, "quarter")
+
+
+def test_mqttv1_daily_data(db, mocker):
+    from models.export_mqttv1 import ExportMqtt
+
+    begin = datetime.datetime(2022, 1, 1)
+    end = datetime.datetime(2022, 12, 31, 23, 59, 59)
+    export = ExportMqtt(USAGE_POINT_ID)
+    export.mqtt_config = mocker.Mock()
+    export.load_daily_data(begin, end, 0.2, "prefix")
+
+    data = export.mqtt_config.publish_multiple.call_args.args[0]
+    days = {date: index for index, date in enumerate(DAYS) if begin <= date <= end}
+    march = {date: value for date, value in days.items() if date.month == 3}
+    assert data["prefix/thisYear/base/Wh"] == sum(days.values())
+    assert data["prefix/thisYear/dateBegin"] == "2022-01-01"
+    assert data["prefix/months/03/base/Wh"] == sum(march.values())
+    assert data["prefix/months/03/base/euro"] == round(sum(march.values()) / 1000 * 0.2, 2)
+    assert data["prefix/months/03/dateBegin"] == min(march).strftime("%Y-%m-%d")
+    assert data["prefix/months/03/dateEnd"] == max(march).strftime("%Y-%m-%d")
+    last_days = sorted(days)[-7:]
+    assert data["prefix/thisWeek/dateBegin"] == last_days[0].strftime("%Y-%m-%d")
+    # With a missing day the 7 last readings span 8 days, the oldest of a weekday is published last.
+    week = {date.strftime("%A"): days[date] for date in reversed(last_days)}
+    for weekday, value in week.items():
+        assert data[f"prefix/thisWeek/{weekday}/base/Wh"] == value
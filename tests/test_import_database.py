@@ -0,0 +1,98 @@
+import datetime
+import sqlite3
+
+import pytest
+
+USAGE_POINT_ID = "migration"
+BEGIN = datetime.datetime(2021, 1, 1)
+DAYS = 20
+
+
+@pytest.fixture
+def db(usage_point):
+    return usage_point(USAGE_POINT_ID)
+
+
+@pytest.fixture
+def v7(tmp_path):
+    """An enedisgateway.db of the v7, dating each reading at the end of its interval."""
+    path = tmp_path / "enedisgateway.db"
+    connection = sqlite3.connect(path)
+    for direction in ["consumption", "production"]:
+        connection.execute(f"CREATE TABLE {direction}_daily (pdl TEXT, date TEXT, value INTEGER)")
+        connection.execute(
+            f"CREATE TABLE {direction}_detail "
+            "(pdl TEXT, date TEXT, value INTEGER, interval INTEGER, measure_type TEXT)"
+        )
+    for day in range(DAYS):
+        date = BEGIN + datetime.timedelta(days=day)
+        connection.execute("INSERT INTO consumption_daily VALUES (?, ?, ?)", (USAGE_POINT_ID, f"{date:%Y-%m-%d}", day))
+        for index in range(48):
+            end = date + datetime.timedelta(minutes=30 * (index + 1))
+            connection.execute(
+                "INSERT INTO consumption_detail VALUES (?, ?, ?, 30, 'HP')",
+                (USAGE_POINT_ID, f"{end:%Y-%m-%d %H:%M:%S}", index),
+            )
+    connection.commit()
+    connection.close()
+    return path
+
+
+def test_migrate_v7_resumes_after_interruption(db, v7, mocker):
+    from models.migration import Migration
+
+    insert = db.insert_detail_bulk
+    calls = []
+
+    def interrupted(*args, **kwargs):
+        calls.append(args)
+        if len(calls) == 3:
+            raise MemoryError()
+        return insert(*args, **kwargs)
+
+    mocker.patch.object(db, "insert_detail_bulk", side_effect=interrupted)
+    with pytest.raises(MemoryError):
+        Migration(db, str(v7), schema="v7", batch_size=100).run()
+    progress = Migration(db, str(v7), schema="v7").checkpoint("consumption_detail")
+    assert progress == {"rowid": 200, "rows": 200, "done": False}
+
+    result = Migration(db, str(v7), schema="v7", batch_size=100).run()
+
+    assert result == {
+        "consumption_daily": DAYS,
+        "consumption_detail": DAYS * 48,
+        "production_daily": 0,
+        "production_detail": 0,
+    }
+    # 3 pages before the interruption, then the 8 pages left: the pages already written are not read again.
+    assert len(calls) == 3 + 8
+    assert db.get_detail_count(USAGE_POINT_ID) == DAYS * 48
+    first = next(db.stream_detail_all(USAGE_POINT_ID))
+    assert (first.date, first.value) == (BEGIN, 0)
+    assert db.get_daily_count(USAGE_POINT_ID) == DAYS
+
+
+def test_import_database(db, tmp_path):
+    from sqlalchemy import create_engine, text
+
+    from db_schema import Base
+
+    path = tmp_path / "cache.db"
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    with engine.begin() as connection:
+        for usage_point_id in [USAGE_POINT_ID, "unknown"]:
+            connection.execute(
+                text(
+                    "INSERT INTO consumption_daily (id, usage_point_id, date, value, blacklist, fail_count) "
+                    "VALUES (:id, :usage_point_id, '2022-03-01 00:00:00.000000', 1200, 0, 0)"
+                ),
+                {"id": hash(usage_point_id) & 0xFFFF, "usage_point_id": usage_point_id},
+            )
+    engine.dispose()
+
+    assert db.import_database(str(path))["consumption_daily"] == 2
+    assert db.get_daily_date(USAGE_POINT_ID, datetime.datetime(2022, 3, 1)).value == 1200
+    assert db.get_usage_point("unknown") is None
+    # The tables are not imported a second time.
+    assert db.import_database(str(path))["consumption_daily"] == 2
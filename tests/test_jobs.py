@@ -70,6 +70,29 @@ def test_job_import_data(mocker, job, caplog):
         m.reset_mock()
 
 
+def test_job_import_data_concurrently(mocker):
+    from models.jobs import Job
+
+    job = Job()
+    job.wait_job_start = 1
+    job.import_concurrency = 2
+    job.usage_points = [
+        UsagePoints(usage_point_id="pdl1", token="abcd", enable=True),
+        UsagePoints(usage_point_id="pdl2", token="abcd", enable=True),
+        UsagePoints(usage_point_id="pdl3", token="efgh", enable=False),
+    ]
+    for method in PER_JOB_METHODS + ["stat_price"] + EXPORT_METHODS:
+        mocker.patch(f"models.jobs.Job.{method}")
+    m_worker = mocker.patch("models.jobs.Job._fetch_usage_point_worker")
+    m_fetch = mocker.patch("models.jobs.Job.fetch_usage_point")
+
+    res = job.job_import_data(target=None)
+
+    assert res["status"] is True
+    assert sorted(call.args[0] for call in m_worker.call_args_list) == ["pdl1", "pdl2"]
+    assert m_fetch.call_count == 0
+
+
 def test_header_generate(job, caplog):
     from dependencies import get_version
 
@@ -0,0 +1,111 @@
+import pytest
+from sqlalchemy import select
+
+from db_schema import JobLease, UsagePoints
+
+PER_JOB_METHODS = ["get_gateway_status", "get_tempo", "get_ecowatt"]
+PER_USAGE_POINT_METHODS = [
+    "fetch_usage_point",
+    "stat_price",
+    "export_influxdb",
+    "export_home_assistant_ws",
+    "export_home_assistant",
+    "export_mqtt",
+]
+
+
+@pytest.fixture
+def db():
+    from init import DB
+
+    DB.unlock(force=True)
+    yield DB
+    DB.unlock(force=True)
+
+
+@pytest.mark.parametrize(
+    "held, requested, acquired",
+    [
+        (("pdl1", "*"), ("pdl1", "consumption"), False),
+        (("pdl1", "consumption"), ("pdl1", "*"), False),
+        (("pdl1", "consumption"), ("pdl1", "consumption"), False),
+        (("pdl1", "consumption"), ("pdl1", "production"), True),
+        (("pdl1", "*"), ("pdl2", "*"), True),
+        (("*", "tempo"), ("pdl1", "*"), True),
+    ],
+)
+def test_acquire_lease(db, held, requested, acquired):
+    assert db.acquire_lease(*held, "job1", 60) is True
+    assert db.acquire_lease(*requested, "job2", 60) is acquired
+    assert db.lock_status() is True
+
+
+def test_expired_lease(db):
+    assert db.acquire_lease("pdl1", "*", "job1", -1) is True
+    assert db.lock_status() is False
+    assert db.acquire_lease("pdl1", "*", "job2", 60) is True
+    assert [lease.holder for lease in db.get_leases()] == ["job2"]
+
+
+def test_unlock_keeps_running_leases(db):
+    assert db.acquire_lease("pdl1", "*", "job1", 60) is True
+    assert db.acquire_lease("pdl2", "*", "job2", -1) is True
+    assert db.unlock() is True
+    assert [lease.holder for lease in db.session.scalars(select(JobLease))] == ["job1"]
+    assert db.unlock(force=True) is False
+
+
+def test_renew_and_release(db):
+    from models.lease import Leases
+
+    leases = Leases(db, ttl=60)
+    assert leases.acquire("pdl1", "consumption") is True
+    assert leases.acquire("pdl2", "*") is True
+    assert db.renew_leases(leases.holder, -1) == 2
+    assert db.lock_status() is False
+    assert db.renew_leases(leases.holder, 60) == 2
+    assert db.lock_status() is True
+
+    leases.release("pdl1")
+    assert leases.held == {("pdl2", "*")}
+    assert [lease.usage_point_id for lease in db.get_leases()] == ["pdl2"]
+    leases.release_all()
+    assert db.lock_status() is False
+
+
+def test_job_skips_leased_usage_point(db, mocker):
+    from models.jobs import Job
+
+    job = Job()
+    job.usage_points = [
+        UsagePoints(usage_point_id="pdl1", token="abcd", enable=True),
+        UsagePoints(usage_point_id="pdl2", token="abcd", enable=True),
+    ]
+    mockers = {method: mocker.patch(f"models.jobs.Job.{method}") for method in PER_JOB_METHODS}
+    mockers.update({method: mocker.patch(f"models.jobs.Job.{method}") for method in PER_USAGE_POINT_METHODS})
+    db.acquire_lease("pdl1", "*", "other", 60)
+
+    res = job.job_import_data(wait=False, target=None)
+
+    assert res["status"] is True
+    assert mockers["fetch_usage_point"].call_count == 1
+    for method in PER_JOB_METHODS:
+        assert mockers[method].call_count == 1
+    assert [(lease.usage_point_id, lease.holder) for lease in db.get_leases()] == [("pdl1", "other")]
+
+
+def test_job_rejected_when_everything_is_leased(db, mocker):
+    from models.jobs import Job
+
+    job = Job("pdl1")
+    mockers = {method: mocker.patch(f"models.jobs.Job.{method}") for method in PER_JOB_METHODS}
+    mockers.update({method: mocker.patch(f"models.jobs.Job.{method}") for method in PER_USAGE_POINT_METHODS})
+    db.acquire_lease("pdl1", "consumption", "other", 60)
+
+    res = job.job_import_data(wait=False, target="consumption")
+    assert res == {"status": False, "notif": "Importation déjà en cours..."}
+    assert mockers["fetch_usage_point"].call_count == 0
+
+    # Another target of the same usage point is not blocked.
+    assert job.job_import_data(wait=False, target="production")["status"] is True
+    assert mockers["fetch_usage_point"].call_count == 1
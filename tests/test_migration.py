@@ -0,0 +1,105 @@
+import calendar
+import datetime
+import hashlib
+
+import pytest
+from sqlalchemy import create_engine, text
+
+USAGE_POINT = (
+    "INSERT INTO usage_points (usage_point_id, name, cache, consumption, consumption_detail, production, "
+    "production_detail, consumption_price_base, consumption_price_hc, consumption_price_hp, production_price, plan, "
+    "refresh_addresse, refresh_contract, token, progress, progress_status, enable, consumption_max_power) "
+    "VALUES (:usage_point_id, '', 0, 1, 1, 0, 0, 0, 0, 0, 0, 'BASE', 0, 0, 'abcd', 0, '', 1, 1)"
+)
+DETAIL = (
+    "INSERT INTO consumption_detail (id, usage_point_id, date, value, interval, measure_type, blacklist, fail_count) "
+    "VALUES (:id, :usage_point_id, :date, :value, 30, 'BRUT', 0, 0)"
+)
+
+
+@pytest.fixture
+def alembic_config(tmp_path, monkeypatch):
+    from alembic.config import Config
+
+    from dependencies import APPLICATION_PATH
+
+    monkeypatch.setenv("DB_URL", f"sqlite:///{tmp_path}/cache.db")
+    config = Config()
+    config.set_main_option("script_location", f"{APPLICATION_PATH}/alembic")
+    return config
+
+
+def test_row_id():
+    from models.database import row_id
+
+    date = datetime.datetime(2023, 3, 26, 2, 30)
+    assert row_id(3, date) == (3 << 32) + calendar.timegm(date.timetuple())
+    assert row_id(3, date) == row_id(3, "2023-03-26 02:30:00")
+    assert row_id(3, date) < row_id(3, date + datetime.timedelta(minutes=30)) < row_id(4, date)
+
+
+def test_insert_uses_integer_keys():
+    from init import DB
+    from models.database import row_id
+
+    date = datetime.datetime(2001, 1, 1)
+    DB.insert_daily("pdl1", date, 12)
+    try:
+        assert DB.get_daily_date("pdl1", date).id == row_id(DB.usage_point_key("pdl1"), date)
+    finally:
+        DB.delete_daily("pdl1", date)
+    with pytest.raises(ValueError):
+        DB.usage_point_key("unknown")
+
+
+def test_migrate_integer_time_series_keys(alembic_config):
+    from alembic import command
+
+    from models.database import row_id
+
+    command.upgrade(alembic_config, "c3d81b5e0f27")
+    engine = create_engine(alembic_config.get_main_option("sqlalchemy.url"))
+    dates = [datetime.datetime(2023, 1, 1) + datetime.timedelta(minutes=30 * i) for i in range(20)]
+    with engine.begin() as connection:
+        for usage_point_id in ["pdl_b", "pdl_a"]:
+            connection.execute(text(USAGE_POINT), {"usage_point_id": usage_point_id})
+            for value, date in enumerate(dates):
+                connection.execute(
+                    text(DETAIL),
+                    {
+                        "id": hashlib.md5(f"{usage_point_id}/{date}".encode("utf-8")).hexdigest(),
+                        "usage_point_id": usage_point_id,
+                        "date": f"{date}.000000",
+                        "value": value,
+                    },
+                )
+
+    command.upgrade(alembic_config, "d5e2a9c41b08")
+    with engine.connect() as connection:
+        keys = dict(connection.execute(text("SELECT usage_point_id, id FROM usage_points")).all())
+        rows = connection.execute(text("SELECT id, usage_point_id, value FROM consumption_detail ORDER BY id")).all()
+    assert keys == {"pdl_a": 1, "pdl_b": 2}
+    assert [row.id for row in rows] == [row_id(keys[u], date) for u in ["pdl_a", "pdl_b"] for date in dates]
+    assert [row.value for row in rows] == list(range(20)) * 2
+
+    command.downgrade(alembic_config, "c3d81b5e0f27")
+    with engine.connect() as connection:
+        ids = connection.execute(text("SELECT id FROM consumption_detail WHERE usage_point_id = 'pdl_a'")).scalars()
+        assert sorted(ids) == sorted(hashlib.md5(f"pdl_a/{date}".encode("utf-8")).hexdigest() for date in dates)
+    engine.dispose()
+
+
+def test_upgrade_schema_only_when_needed(tmp_path, mocker):
+    from alembic import command
+
+    from init import CONFIG
+    from models.database import Database
+
+    upgrade = mocker.spy(command, "upgrade")
+    db = Database(CONFIG, str(tmp_path))
+    assert upgrade.call_count == 1
+    assert "job_lease" in db.inspector.get_table_names()
+
+    assert db.upgrade_schema() is False
+    assert Database(CONFIG, str(tmp_path)).upgrade_schema() is False
+    assert upgrade.call_count == 1
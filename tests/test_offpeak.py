@@ -0,0 +1,53 @@
+import datetime
+
+import pytest
+
+WEEK = [datetime.datetime(2024, 1, 1) + datetime.timedelta(minutes=minute) for minute in range(7 * 24 * 60)]
+
+
+def reference_mesure_type(day_offpeak_hours, measurement_date):
+    """The classification parsing the off-peak hours strings for each reading, as before the compiled calendar."""
+    from models.offpeak import is_between
+
+    date_hour_minute = measurement_date.strftime("%H:%M")
+    measure_type = "HP"
+    day_offpeak_hour = day_offpeak_hours[measurement_date.weekday()]
+    if day_offpeak_hour is not None:
+        for offpeak_hour in day_offpeak_hour.split(";"):
+            if offpeak_hour != "None" and offpeak_hour != "" and offpeak_hour is not None:
+                offpeak_begin = offpeak_hour.split("-")[0].replace("h", ":").replace("H", ":")
+                offpeak_begin = datetime.datetime.strptime(offpeak_begin, "%H:%M").strftime("%H:%M")
+                offpeak_stop = offpeak_hour.split("-")[1].replace("h", ":").replace("H", ":")
+                offpeak_stop = datetime.datetime.strptime(offpeak_stop, "%H:%M").strftime("%H:%M")
+                if is_between(date_hour_minute, (offpeak_begin, offpeak_stop)):
+                    measure_type = "HC"
+    return measure_type
+
+
+@pytest.mark.parametrize(
+    "day_offpeak_hours",
+    [
+        {weekday: "22H00-6H00" for weekday in range(0, 7)},
+        {weekday: "22h30-06h30;12H15-14H00" for weekday in range(0, 7)},
+        {0: "1H00-7H00", 1: None, 2: "", 3: "None", 4: "23H00-23H00", 5: "0H00-8H00;20H00-0H00", 6: "2H01-3H59"},
+    ],
+)
+def test_offpeak_calendar(day_offpeak_hours):
+    from models.offpeak import mesure_type, offpeak_calendar
+
+    calendar = offpeak_calendar(day_offpeak_hours)
+    expected = [reference_mesure_type(day_offpeak_hours, date) for date in WEEK]
+    assert [calendar.mesure_type(date) for date in WEEK] == expected
+    assert calendar.classify(WEEK) == expected
+    assert mesure_type(day_offpeak_hours, WEEK[0]) == expected[0]
+
+
+def test_offpeak_calendar_follows_configuration():
+    from models.offpeak import offpeak_calendar
+
+    day_offpeak_hours = {weekday: "22H00-6H00" for weekday in range(0, 7)}
+    night = datetime.datetime(2024, 1, 1, 23)
+    assert offpeak_calendar(day_offpeak_hours) is offpeak_calendar(dict(day_offpeak_hours))
+    assert offpeak_calendar(day_offpeak_hours).mesure_type(night) == "HC"
+    day_offpeak_hours[0] = "12H00-14H00"
+    assert offpeak_calendar(day_offpeak_hours).mesure_type(night) == "HP"
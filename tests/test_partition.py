@@ -0,0 +1,44 @@
+import datetime
+
+USAGE_POINT_ID = "partition"
+
+
+def test_months():
+    from models.partition import add_months, months, partition_month, partition_name
+
+    assert add_months(datetime.datetime(2023, 11, 15, 12), 3) == datetime.datetime(2024, 2, 1)
+    assert add_months(datetime.datetime(2024, 1, 31), -1) == datetime.datetime(2023, 12, 1)
+    assert months(datetime.datetime(2023, 11, 30), datetime.datetime(2024, 1, 1)) == [
+        datetime.datetime(2023, 11, 1),
+        datetime.datetime(2023, 12, 1),
+        datetime.datetime(2024, 1, 1),
+    ]
+    name = partition_name("consumption_detail", datetime.datetime(2024, 2, 1))
+    assert name == "consumption_detail_2024_02"
+    assert partition_month(name) == datetime.datetime(2024, 2, 1)
+    assert partition_month("consumption_detail") is None
+
+
+def test_create_partition():
+    from models.partition import create_partition
+
+    assert str(create_partition("production_detail", datetime.datetime(2023, 12, 1))) == (
+        "CREATE TABLE IF NOT EXISTS production_detail_2023_12 PARTITION OF production_detail "
+        "FOR VALUES FROM ('2023-12-01 00:00:00') TO ('2024-01-01 00:00:00')"
+    )
+
+
+def test_purge_detail_without_partitions(usage_point):
+    begin = datetime.datetime(2023, 1, 1)
+    db = usage_point(
+        USAGE_POINT_ID,
+        detail=[
+            {"date": begin + datetime.timedelta(minutes=30 * i), "value": 100, "interval": 30} for i in range(90 * 48)
+        ],
+    )
+    assert db.partitions == {}
+    before = datetime.datetime(2023, 2, 15)
+    assert db.purge_detail(before, "consumption") == 0
+    assert next(db.stream_detail_all(USAGE_POINT_ID)).date == before
+    assert db.get_rollup(USAGE_POINT_ID, begin, before)["count"] == 48
+    assert db.check_rollup(USAGE_POINT_ID) == []
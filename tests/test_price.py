@@ -0,0 +1,95 @@
+import datetime
+import json
+from types import SimpleNamespace
+
+import pytest
+
+USAGE_POINT_ID = "price"
+BEGIN = datetime.datetime(2005, 1, 20)
+DAYS = 80
+PRICES = {"consumption_price_base": 0.2, "consumption_price_hc": 0.15, "consumption_price_hp": 0.25}
+TEMPO_PRICE = {f"{color}_{measure}": 0.1 for color in ["blue", "white", "red"] for measure in ["hc", "hp"]}
+
+
+@pytest.fixture
+def db(usage_point, mocker):
+    tempo = {BEGIN + datetime.timedelta(days=day): ["BLUE", "WHITE", "RED"][day % 3] for day in range(DAYS)}
+
+    def get_tempo_range(begin, end, order="desc"):
+        return [SimpleNamespace(date=date, color=color) for date, color in tempo.items() if begin <= date <= end]
+
+    db = usage_point(
+        USAGE_POINT_ID,
+        {"offpeak_hours_0": "22H00-6H00", **PRICES},
+        detail=[
+            {"date": BEGIN + datetime.timedelta(minutes=30 * index), "value": index % 11, "interval": 30}
+            for index in range(DAYS * 48)
+        ],
+    )
+    mocker.patch.object(db, "get_tempo_range", side_effect=get_tempo_range)
+    mocker.patch.object(db, "get_tempo_config", return_value=TEMPO_PRICE)
+    db.tempo = tempo
+    return db
+
+
+def generate(db, full=False):
+    from models.stat import Stat
+
+    return json.loads(Stat(USAGE_POINT_ID, "consumption").generate_price(full))
+
+
+def assert_same(result, expected):
+    assert result.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            assert_same(result[key], value)
+        else:
+            assert result[key] == pytest.approx(value)
+
+
+def test_price_per_month(db):
+    from models.rollup import period_end
+
+    result = generate(db)
+    assert list(result) == ["2005"]
+    assert list(result["2005"]["month"]) == ["01", "02", "03", "04"]
+    for month in ["01", "02", "03", "04"]:
+        begin = datetime.datetime(2005, int(month), 1)
+        rollup = db.get_rollup(USAGE_POINT_ID, begin, period_end(begin, "month") - datetime.timedelta(days=1))
+        costs = result["2005"]["month"][month]
+        assert costs["BASE"]["Wh"] == pytest.approx(rollup["value"])
+        assert costs["HC"]["euro"] == pytest.approx(rollup["hc"] / 1000 * 0.15)
+        assert costs["HP"]["euro"] == pytest.approx(rollup["hp"] / 1000 * 0.25)
+    year = result["2005"]
+    assert year["BASE"]["Wh"] == pytest.approx(sum(month["BASE"]["Wh"] for month in year["month"].values()))
+    assert year["TEMPO"]["RED_HP"]["euro"] == pytest.approx(
+        sum(month["TEMPO"]["RED_HP"]["euro"] for month in year["month"].values())
+    )
+    assert json.loads(db.get_stat(USAGE_POINT_ID, "price_consumption")[0].value) == result
+
+
+def test_price_recomputes_dirty_months(db, mocker):
+    from models.stat import Stat
+
+    price_month = mocker.spy(Stat, "price_month")
+    generate(db)
+    assert price_month.call_count == 4
+
+    generate(db)
+    assert price_month.call_count == 4
+
+    db.insert_detail(USAGE_POINT_ID, datetime.datetime(2005, 3, 3, 12), 5000, 30, "HP")
+    result = generate(db)
+    assert price_month.call_count == 5
+    assert price_month.call_args.args[1][0].date.month == 3
+    assert_same(result, generate(db, full=True))
+    assert price_month.call_count == 9
+
+    db.tempo[datetime.datetime(2005, 2, 10)] = "RED"
+    generate(db)
+    assert price_month.call_count == 10
+
+    db.set_usage_point(USAGE_POINT_ID, {**PRICES, "consumption_price_hc": 0.1})
+    result = generate(db)
+    assert price_month.call_count == 14
+    assert result["2005"]["HC"]["euro"] == pytest.approx(result["2005"]["HC"]["kWh"] * 0.1)
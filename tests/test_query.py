@@ -0,0 +1,92 @@
+import pytest
+
+
+@pytest.fixture
+def fresh_session():
+    from models.query import close_session
+
+    close_session()
+    yield
+    close_session()
+
+
+def test_session_is_shared(fresh_session):
+    from models.query import Query
+
+    assert Query(endpoint="https://any/1").session is Query(endpoint="https://any/2").session
+
+
+def test_session_pool_configuration(mocker, fresh_session):
+    from models.query import get_session
+
+    mocker.patch("models.config.Config.gateway_config", return_value={"pool_maxsize": "3", "timeout": None})
+    adapter = get_session().get_adapter("https://myelectricaldata.fr")
+    assert adapter._pool_maxsize == 3
+
+
+def test_get_uses_shared_session(mocker, fresh_session, requests_mock):
+    from models.query import Query
+
+    rm = requests_mock.get("https://myelectricaldata.fr/ping", json={"status": True})
+    m_request = mocker.spy(Query(endpoint="https://any").session, "request")
+
+    for _ in range(3):
+        response = Query(endpoint="https://myelectricaldata.fr/ping").get()
+        assert response.status_code == 200
+
+    assert len(rm.request_history) == 3
+    assert m_request.call_count == 3
+    assert m_request.call_args.kwargs["timeout"] == (10, 60)
+
+
+def test_iter_json_items_streams_array(fresh_session, requests_mock):
+    from models.query import Query, iter_json_items
+
+    items = [{"value": str(i), "date": f"2024-01-01 00:{i:02d}:00", "note": "é]}"} for i in range(50)]
+    requests_mock.get(
+        "https://myelectricaldata.fr/curve",
+        json={"meter_reading": {"usage_point_id": "pdl1", "interval_reading": items, "reading_type": {}}},
+    )
+
+    response = Query(endpoint="https://myelectricaldata.fr/curve").get(stream=True)
+
+    assert list(iter_json_items(response, "interval_reading", chunk_size=7)) == items
+
+
+@pytest.mark.parametrize("remainder, drained", [(10, True), (1000, False)])
+def test_iter_json_items_releases_connection(mocker, remainder, drained):
+    from models.query import iter_json_items
+
+    # The items are followed by `remainder` chunks of 1 KiB which are not part of the array.
+    chunks = [b'{"interval_reading": [{"value": "1"}, {"value": "2"}], "padding": "'] + [b"x" * 1024] * remainder
+    read = []
+
+    def iter_content(chunk_size):
+        for chunk in chunks + [b'"}']:
+            read.append(chunk)
+            yield chunk
+
+    response = mocker.Mock(encoding="utf-8", iter_content=iter_content)
+    assert list(iter_json_items(response, "interval_reading")) == [{"value": "1"}, {"value": "2"}]
+    assert (len(read) == len(chunks) + 1) is drained
+    response.close.assert_called_once()
+
+
+def test_iter_json_items_without_array():
+    import dataclasses
+
+    from models.query import iter_json_items
+
+    @dataclasses.dataclass
+    class MockResponse:
+        text: str
+
+    with pytest.raises(ValueError):
+        list(iter_json_items(MockResponse('{"detail": "error"}'), "interval_reading"))
+
+
+def test_truncate():
+    from models.query import truncate
+
+    assert truncate("abc", 5) == "abc"
+    assert truncate("a" * 10, 5) == "aaaaa... (10 caractères)"
@@ -0,0 +1,66 @@
+import datetime
+from unittest import mock
+
+
+def test_get_daily_coverage():
+    from init import DB
+
+    day = datetime.datetime(2003, 1, 1)
+    DB.insert_daily("pdl1", day, 12)
+    DB.insert_daily("pdl1", day + datetime.timedelta(days=1), 0)
+    DB.insert_daily("pdl1", day + datetime.timedelta(days=2), 0, blacklist=1, fail_count=3)
+    try:
+        coverage = DB.get_daily_coverage("pdl1", day, day + datetime.timedelta(days=3))
+
+        assert coverage["missing_data"] is True
+        assert {date: data["state"] for date, data in coverage["date"].items()} == {
+            "2003-01-01": "present",
+            "2003-01-02": "zero",
+            "2003-01-03": "blacklisted",
+            "2003-01-04": "missing",
+        }
+        assert coverage["date"]["2003-01-03"]["fail_count"] == 3
+        assert DB.get_daily_coverage("pdl1", day, day)["missing_data"] is False
+    finally:
+        DB.delete_daily("pdl1")
+
+
+def test_get_daily_power():
+    from init import DB
+
+    day = datetime.datetime(2003, 1, 1)
+    DB.insert_daily_max_power("pdl1", day, day + datetime.timedelta(hours=19), 6000)
+    DB.insert_daily_max_power("pdl1", day + datetime.timedelta(days=1), day + datetime.timedelta(days=1), 0)
+    try:
+        coverage = DB.get_daily_power("pdl1", day, day + datetime.timedelta(days=2))
+
+        assert coverage["missing_data"] is True
+        assert {date: (data["status"], data["value"]) for date, data in coverage["date"].items()} == {
+            "2003-01-01": (True, 6000),
+            "2003-01-02": (False, 0),
+            "2003-01-03": (False, 0),
+        }
+        assert DB.get_daily_power("pdl1", day, day)["missing_data"] is False
+    finally:
+        DB.delete_daily_max_power("pdl1")
+
+
+def test_run_uses_cache(mocker):
+    from models.query_daily import Daily
+
+    m_get: mock.Mock = mocker.patch("models.query.Query.get")
+    m_coverage: mock.Mock = mocker.patch("models.database.Database.get_daily_coverage")
+    m_coverage.return_value = {
+        "missing_data": False,
+        "date": {
+            "2003-01-01": {"state": "present", "value": 12},
+            "2003-01-02": {"state": "missing", "value": 0},
+        },
+    }
+
+    daily = Daily(headers="any", usage_point_id="pdl1")
+    result = daily.run(datetime.datetime(2003, 1, 1), datetime.datetime(2003, 1, 2))
+
+    assert result == [{"date": "2003-01-01", "value": 12}]
+    m_coverage.assert_called_once()
+    m_get.assert_not_called()
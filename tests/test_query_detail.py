@@ -16,7 +16,7 @@ def test_get(mocker, measure_type):
     from models.query_detail import Detail
 
     m_get: mock.Mock = mocker.patch("models.query.Query.get")
-    m_insert_detail: mock.Mock = mocker.patch("models.database.Database.insert_detail")
+    m_insert_detail: mock.Mock = mocker.patch("models.database.Database.insert_detail_bulk")
     m_get.return_value = MockResponse(
         status_code=200,
         text='{"meter_reading": {"interval_reading": [{"interval_length": "30", '
@@ -34,15 +34,128 @@ def test_get(mocker, measure_type):
     # - call m_insert_detail with parameters that are consistent with the value returned at the previous step
     d.get()
 
-    # Query.get() should only be called once, with no parameter
-    m_get.assert_called_once_with()
-    # Database.insert_details() should only be called once, with parameters below
-    m_insert_detail.assert_called_once_with(
-        date=datetime.datetime(2023, 12, 31, 23, 30, 00),
-        interval="30",
-        measure_type="",
-        mesure_type=measure_type,
-        usage_point_id="pdl1",
-        value="10",
-        blacklist=0,
+    # Query.get() should only be called once, streaming the response
+    m_get.assert_called_once_with(stream=True)
+    # Database.insert_detail_bulk() should only be called once, with parameters below
+    m_insert_detail.assert_called_once()
+    usage_point_id, readings, mesure_type = m_insert_detail.call_args.args
+    assert (usage_point_id, mesure_type) == ("pdl1", measure_type)
+    assert list(readings) == [{"date": datetime.datetime(2023, 12, 31, 23, 30, 00), "value": 10, "interval": 30}]
+
+
+def test_missing_ranges():
+    from models.query_detail import missing_ranges
+
+    begin = datetime.datetime(2024, 1, 1)
+    end = datetime.datetime(2024, 1, 2)
+    readings = [(begin + datetime.timedelta(minutes=30 * i), 30) for i in range(48) if i not in (10, 11, 47)]
+
+    assert missing_ranges(readings, begin, end) == [
+        (datetime.datetime(2024, 1, 1, 5), datetime.datetime(2024, 1, 1, 6)),
+        (datetime.datetime(2024, 1, 1, 23, 30), end),
+    ]
+    assert missing_ranges(readings, begin, end, datetime.timedelta(minutes=60)) == []
+
+
+def test_plan_requests():
+    from models.query_detail import plan_requests
+
+    day = datetime.datetime(2024, 1, 1)
+    gaps = [
+        (day + datetime.timedelta(days=1, hours=5), day + datetime.timedelta(days=1, hours=6)),
+        (day + datetime.timedelta(days=3), day + datetime.timedelta(days=4, hours=1)),
+        (day + datetime.timedelta(days=10), day + datetime.timedelta(days=30)),
+    ]
+
+    assert plan_requests(gaps, 7) == [
+        (day + datetime.timedelta(days=23), day + datetime.timedelta(days=30)),
+        (day + datetime.timedelta(days=16), day + datetime.timedelta(days=23)),
+        (day + datetime.timedelta(days=10), day + datetime.timedelta(days=16)),
+        (day + datetime.timedelta(days=1), day + datetime.timedelta(days=5)),
+    ]
+    assert plan_requests([], 7) == []
+
+
+def test_get_without_missing_data(mocker):
+    from models.query_detail import Detail
+
+    m_get: mock.Mock = mocker.patch("models.query.Query.get")
+    m_get_detail: mock.Mock = mocker.patch("models.database.Database.get_detail")
+    mocker.patch("models.query_detail.missing_ranges", return_value=[])
+
+    assert Detail(headers="any", usage_point_id="pdl1").get() == []
+    m_get.assert_not_called()
+    m_get_detail.assert_not_called()
+
+
+@pytest.mark.parametrize("measure_type", ["consumption", "production"])
+def test_insert_detail_bulk(measure_type):
+    from init import DB
+
+    begin = datetime.datetime(2001, 1, 1)
+    data = [{"date": begin + datetime.timedelta(minutes=30 * i), "value": i, "interval": 30} for i in range(5)]
+    try:
+        assert DB.insert_detail_bulk("pdl1", data, measure_type, batch_size=2) == 5
+        data[0]["value"] = 42
+        assert DB.insert_detail_bulk("pdl1", data[:1], measure_type) == 1
+
+        stored = DB.get_detail_range("pdl1", begin, begin + datetime.timedelta(days=1), measure_type, order="asc")
+        assert [(item.value, item.interval) for item in stored] == [(42, 30), (1, 30), (2, 30), (3, 30), (4, 30)]
+    finally:
+        for item in data:
+            DB.delete_detail("pdl1", item["date"], measure_type)
+
+
+def test_load_curve_parse():
+    from models.load_curve import LoadCurve, parse_datetime, parse_epoch
+
+    curve = LoadCurve.parse(
+        [
+            {"interval_length": "PT30M", "value": "10", "date": "2024-01-01 00:00:00"},
+            {"interval_length": "PT10M", "value": "20", "date": "2024-03-31 02:10:00"},
+        ]
     )
+
+    assert len(curve) == 2
+    assert list(curve) == [
+        {"date": datetime.datetime(2023, 12, 31, 23, 30), "value": 10, "interval": 30},
+        {"date": datetime.datetime(2024, 3, 31, 2, 0), "value": 20, "interval": 10},
+    ]
+    assert parse_epoch("2024-01-01T00:00:00") == parse_epoch("2024-01-01 00:00:00") == 1704067200
+    assert parse_epoch("2024-01-01 00:00:00.000") == 1704067200
+    assert parse_datetime("2024-02-29 23:59:59") == datetime.datetime(2024, 2, 29, 23, 59, 59)
+
+
+def test_sync_state():
+    from init import DB
+
+    day = datetime.datetime(2024, 1, 1)
+    gaps = [{"begin": day, "end": day + datetime.timedelta(hours=1), "tries": 2}]
+    try:
+        assert DB.get_sync_state("pdl1", "test_detail") == {"watermark": None, "gaps": []}
+        DB.set_sync_state("pdl1", "test_detail", day + datetime.timedelta(days=5), gaps)
+        state = DB.get_sync_state("pdl1", "test_detail")
+        assert state == {"watermark": day + datetime.timedelta(days=5), "gaps": gaps}
+
+        DB.rewind_sync_state("pdl1", "test_detail", datetime.date(2024, 1, 3))
+        assert DB.get_sync_state("pdl1", "test_detail")["watermark"] == day + datetime.timedelta(days=2)
+    finally:
+        DB.rewind_sync_state("pdl1", "test_detail")
+    assert DB.get_sync_state("pdl1", "test_detail")["watermark"] is None
+
+
+def test_get_starts_from_watermark(mocker):
+    from init import DB
+    from models.query_detail import Detail
+
+    today = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+    m_run: mock.Mock = mocker.patch("models.query_detail.Backfill.run", return_value=[])
+    try:
+        DB.set_sync_state("pdl1", "consumption_detail", today - datetime.timedelta(days=2))
+
+        Detail(headers="any", usage_point_id="pdl1").get()
+
+        m_run.assert_called_once_with([(today - datetime.timedelta(days=2), today)])
+        assert DB.get_sync_state("pdl1", "consumption_detail")["watermark"] == today - datetime.timedelta(days=2)
+    finally:
+        DB.rewind_sync_state("pdl1", "consumption_detail")
@@ -0,0 +1,86 @@
+import datetime
+
+import pytest
+from sqlalchemy import event
+
+USAGE_POINT_ID = "query_plan"
+BEGIN = datetime.datetime(2019, 1, 1)
+END = datetime.datetime(2024, 1, 1)
+
+
+@pytest.fixture(scope="module")
+def seeded_database():
+    """Seed 5 years of daily and detail readings, the query plans are checked on a realistic volume."""
+    from init import DB
+
+    DB.set_usage_point(USAGE_POINT_ID, {"token": "abcd", "enable": False})
+    detail = [
+        {"date": BEGIN + datetime.timedelta(minutes=30 * i), "value": i % 1000, "interval": 30}
+        for i in range(int((END - BEGIN).total_seconds() // 1800))
+    ]
+    for measurement_direction in ["consumption", "production"]:
+        DB.insert_detail_bulk(USAGE_POINT_ID, detail, measurement_direction)
+        for i in range((END - BEGIN).days):
+            DB.insert_daily(
+                USAGE_POINT_ID, BEGIN + datetime.timedelta(days=i), i, measurement_direction=measurement_direction
+            )
+    yield DB
+    DB.delete_usage_point(USAGE_POINT_ID)
+
+
+def query_plans(db, call):
+    """Run `call` and return the SQLite query plan of every SELECT it sends."""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    try:
+        call()
+    finally:
+        event.remove(db.engine, "before_cursor_execute", capture)
+    assert statements
+    with db.engine.connect() as connection:
+        return [
+            " ".join(row[-1] for row in connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters))
+            for statement, parameters in statements
+        ]
+
+
+@pytest.mark.parametrize("measurement_direction", ["consumption", "production"])
+@pytest.mark.parametrize(
+    "name, call",
+    [
+        ("detail_range", lambda db, m: db.get_detail_range(USAGE_POINT_ID, BEGIN, END, m)),
+        ("detail_all", lambda db, m: db.get_detail_all(USAGE_POINT_ID, BEGIN, END, m)),
+        ("detail_stream", lambda db, m: list(db.stream_detail_all(USAGE_POINT_ID, BEGIN, END, m, "desc"))),
+        ("detail_timestamps", lambda db, m: db.get_detail_timestamps(USAGE_POINT_ID, BEGIN, END, m)),
+        ("daily_range", lambda db, m: db.get_daily_range(USAGE_POINT_ID, BEGIN, END, m)),
+        ("daily_coverage", lambda db, m: db.get_daily_coverage(USAGE_POINT_ID, BEGIN, END, m)),
+        ("daily_stream", lambda db, m: list(db.stream_daily_all(USAGE_POINT_ID, BEGIN, END, m, "desc"))),
+        ("daily_last_date", lambda db, m: db.get_daily_last_date(USAGE_POINT_ID, m)),
+        ("daily_first_date", lambda db, m: db.get_daily_first_date(USAGE_POINT_ID, m)),
+    ],
+)
+def test_time_series_queries_use_usage_point_date_index(seeded_database, measurement_direction, name, call):
+    table = f"{measurement_direction}_{'detail' if name.startswith('detail') else 'daily'}"
+    plans = query_plans(seeded_database, lambda: call(seeded_database, measurement_direction))
+
+    plan = next(plan for plan in plans if f"{table} " in f"{plan} " or table in plan)
+    assert f"INDEX ix_{table}_usage_point_id_date" in plan
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan
+
+
+@pytest.mark.parametrize("order_dir", ["asc", "desc"])
+def test_stream_detail_all(seeded_database, order_dir):
+    begin = datetime.datetime(2021, 1, 1)
+    end = datetime.datetime(2021, 2, 1)
+    expected = seeded_database.get_detail_all(USAGE_POINT_ID, begin, end, "production", "desc")
+    if order_dir == "desc":
+        expected = expected[::-1]
+    rows = seeded_database.stream_detail_all(USAGE_POINT_ID, begin, end, "production", order_dir, batch_size=100)
+    assert [(row.date, row.value, row.interval) for row in rows] == [
+        (item.date, item.value, item.interval) for item in expected
+    ]
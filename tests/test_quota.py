@@ -0,0 +1,60 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+
+@pytest.fixture
+def quota_usage_point(mocker):
+    from models import quota
+
+    quota._BUCKETS.clear()
+    quota_usage_point = SimpleNamespace(
+        quota_limit=15,
+        call_number=2,
+        quota_reached=False,
+        quota_reset_at=datetime.datetime.utcnow() + datetime.timedelta(hours=1),
+    )
+    mocker.patch("models.database.Database.get_usage_point", return_value=quota_usage_point)
+    yield quota_usage_point
+    quota._BUCKETS.clear()
+
+
+def test_backfill_keeps_reserve_for_recent_windows(quota_usage_point):
+    from models.quota import Quota
+
+    quota = Quota("pdl1")
+    quota.reserve = 10
+
+    assert quota.remaining() == 13
+    assert [quota.acquire(Quota.BACKFILL) for _ in range(4)] == [True, True, True, False]
+    assert quota.remaining() == 10
+    assert all(quota.acquire(Quota.RECENT) for _ in range(10))
+    assert quota.acquire(Quota.RECENT) is False
+
+
+def test_bucket_follows_account_status(quota_usage_point):
+    from models.quota import Quota
+
+    quota = Quota("pdl1")
+    quota_usage_point.quota_reached = True
+    assert quota.acquire() is False
+
+    quota_usage_point.quota_reset_at = datetime.datetime.utcnow() - datetime.timedelta(seconds=1)
+    assert quota.remaining() == 15
+
+    quota_usage_point.quota_limit = 0
+    assert quota.remaining() is None
+    assert quota.acquire() is True
+
+
+def test_daily_get_defers_when_quota_is_reached(mocker, quota_usage_point):
+    from models.query_daily import Daily
+
+    quota_usage_point.quota_reached = True
+    m_get = mocker.patch("models.query.Query.get")
+    mocker.patch("models.database.Database.get_contract", return_value=None)
+    mocker.patch("models.database.Database.get_daily", return_value={"missing_data": True})
+
+    assert Daily(headers="any", usage_point_id="pdl1").get() == []
+    m_get.assert_not_called()
@@ -0,0 +1,105 @@
+import datetime
+
+import pytest
+
+USAGE_POINT_ID = "rollup"
+BEGIN = datetime.datetime(2022, 12, 30)
+END = datetime.datetime(2023, 3, 2)
+OFFPEAK_HOURS = {f"offpeak_hours_{weekday}": "22H00-6H00" for weekday in range(0, 7)}
+
+
+@pytest.fixture
+def db(usage_point):
+    detail = [
+        {"date": BEGIN + datetime.timedelta(minutes=30 * i), "value": i % 100, "interval": 30}
+        for i in range(int((END - BEGIN).total_seconds() // 1800))
+    ]
+    return usage_point(USAGE_POINT_ID, OFFPEAK_HOURS, detail=detail)
+
+
+def expected(begin, end):
+    """Sum the readings of the fixture the way the statistics did before the rollups."""
+    total = {"value": 0, "hc": 0, "hp": 0}
+    for i in range(int((END - BEGIN).total_seconds() // 1800)):
+        date = BEGIN + datetime.timedelta(minutes=30 * i)
+        if begin <= date < end:
+            wh = (i % 100) / 2
+            total["value"] += wh
+            total["hc" if date.hour >= 22 or date.hour < 6 else "hp"] += wh
+    return total
+
+
+def test_cover():
+    from models.rollup import cover
+
+    segments = cover(datetime.date(2022, 12, 30), datetime.date(2024, 3, 1))
+    assert segments["year"] == [datetime.datetime(2023, 1, 1)]
+    assert segments["month"] == [datetime.datetime(2024, 1, 1), datetime.datetime(2024, 2, 1)]
+    assert segments["day"] == [
+        datetime.datetime(2022, 12, 30),
+        datetime.datetime(2022, 12, 31),
+        datetime.datetime(2024, 3, 1),
+    ]
+
+
+@pytest.mark.parametrize(
+    "begin, end",
+    [
+        (datetime.datetime(2023, 1, 1), datetime.datetime(2023, 1, 31)),
+        (datetime.datetime(2022, 12, 30), datetime.datetime(2023, 3, 1)),
+        (datetime.datetime(2023, 2, 10), datetime.datetime(2023, 2, 10)),
+    ],
+)
+def test_get_rollup(db, begin, end):
+    total = db.get_rollup(USAGE_POINT_ID, begin, end)
+    for column, value in expected(begin, end + datetime.timedelta(days=1)).items():
+        assert total[column] == pytest.approx(value)
+    assert total["count"] == ((end - begin).days + 1) * 48
+
+
+def test_rollup_follows_detail(db):
+    day = datetime.datetime(2023, 2, 10)
+    db.delete_detail(USAGE_POINT_ID, day + datetime.timedelta(hours=23, minutes=30))
+    assert db.get_rollup(USAGE_POINT_ID, day, day)["count"] == 47
+    assert db.get_rollup(USAGE_POINT_ID, day, day + datetime.timedelta(days=18))["count"] == 19 * 48 - 1
+
+    db.set_usage_point(USAGE_POINT_ID, {f"offpeak_hours_{weekday}": "" for weekday in range(0, 7)})
+    assert db.get_rollup(USAGE_POINT_ID, day, day)["hc"] == 0
+    assert db.check_rollup(USAGE_POINT_ID) == []
+
+
+def test_check_and_rebuild_rollup(db):
+    from db_schema import Rollup
+
+    assert db.check_rollup(USAGE_POINT_ID) == []
+    db.session.query(Rollup).filter(Rollup.usage_point_id == USAGE_POINT_ID, Rollup.period == "month").update(
+        {"value": 0}
+    )
+    db.session.flush()
+    errors = db.check_rollup(USAGE_POINT_ID)
+    assert [(error["period"], error["date"].month) for error in errors] == [
+        ("month", 12),
+        ("month", 1),
+        ("month", 2),
+        ("month", 3),
+    ]
+
+    assert db.rebuild_rollup(USAGE_POINT_ID) == (END - BEGIN).days
+    assert db.check_rollup(USAGE_POINT_ID) == []
+
+
+def test_aggregate_backends():
+    pytest.importorskip("numpy")
+    from types import SimpleNamespace
+
+    from models import rollup
+
+    offpeak_hours = {weekday: "22H00-6H00;12H30-14H00" for weekday in range(0, 6)}
+    readings = [
+        SimpleNamespace(
+            date=BEGIN + datetime.timedelta(minutes=30 * i), value=i % 100, interval=[30, 10, 0, None][i % 4]
+        )
+        for i in range(48 * 20)
+    ]
+    assert rollup.aggregate(readings, offpeak_hours, "numpy") == rollup.aggregate(readings, offpeak_hours, "python")
+    assert rollup.aggregate([], offpeak_hours, "numpy") == {}
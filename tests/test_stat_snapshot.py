@@ -0,0 +1,156 @@
+import datetime
+
+import pytest
+
+USAGE_POINT_ID = "snapshot"
+TODAY = datetime.datetime.combine(datetime.date.today(), datetime.time.min)
+BEGIN = TODAY - datetime.timedelta(days=800)
+OFFPEAK_HOURS = {f"offpeak_hours_{weekday}": "22H00-6H00" for weekday in range(0, 7)}
+
+
+@pytest.fixture
+def db(usage_point):
+    return usage_point(
+        USAGE_POINT_ID,
+        OFFPEAK_HOURS,
+        # A day without reading every 10 days.
+        daily=[{"date": BEGIN + datetime.timedelta(days=day), "value": day} for day in range(800) if day % 10 != 3],
+        detail=[
+            {"date": TODAY - datetime.timedelta(minutes=30 * (index + 1)), "value": index % 7, "interval": 30}
+            for index in range(48 * 40)
+        ],
+    )
+
+
+def daily_sum(db, begin, end):
+    return sum(data.value for data in db.get_daily_range(USAGE_POINT_ID, begin, end, "consumption"))
+
+
+@pytest.mark.parametrize(
+    "begin, end",
+    [
+        (BEGIN, TODAY),
+        (BEGIN - datetime.timedelta(days=30), BEGIN + datetime.timedelta(days=2, hours=23)),
+        (TODAY - datetime.timedelta(days=400), TODAY - datetime.timedelta(days=370, seconds=1)),
+        (TODAY - datetime.timedelta(days=3), TODAY - datetime.timedelta(days=3)),
+        (TODAY + datetime.timedelta(days=1), TODAY + datetime.timedelta(days=30)),
+    ],
+)
+def test_snapshot_matches_queries(db, begin, end):
+    from models.stat import stat_snapshot
+
+    snapshot = stat_snapshot(db, USAGE_POINT_ID, "consumption")
+    assert snapshot.daily_value(begin, end) == daily_sum(db, begin, end)
+    rollup = db.get_rollup(USAGE_POINT_ID, begin, end, "consumption")
+    for column in ["value", "hc", "hp"]:
+        assert snapshot.rollup_value(begin, end, column) == pytest.approx(rollup[column])
+
+
+def test_stat_reads_snapshot(db, mocker):
+    from models.stat import Stat
+
+    year = TODAY.year - 1
+    expected = daily_sum(db, datetime.datetime(year, 1, 1), datetime.datetime(year, 12, 31, 23, 59, 59))
+    stat = Stat(USAGE_POINT_ID, "consumption")
+    get_daily_range = mocker.spy(db, "get_daily_range")
+    get_rollup = mocker.spy(db, "get_rollup")
+    assert stat.get_year(year)["value"] == expected
+    for month in range(1, 13):
+        stat.get_month(year, month)
+    stat.current_week()
+    stat.yesterday()
+    stat.peak_offpeak_percent()
+    assert Stat(USAGE_POINT_ID, "consumption").detail(1, "HC")["value"] > 0
+    assert get_daily_range.call_count == 0
+    assert get_rollup.call_count == 0
+
+
+def test_snapshot_invalidated_on_insert(db):
+    from models.stat import stat_snapshot
+
+    snapshot = stat_snapshot(db, USAGE_POINT_ID, "consumption")
+    assert stat_snapshot(db, USAGE_POINT_ID, "consumption") is snapshot
+    day = BEGIN + datetime.timedelta(days=3)
+    assert snapshot.daily_value(day, day) == 0
+
+    db.insert_daily(USAGE_POINT_ID, day, 1000)
+    assert stat_snapshot(db, USAGE_POINT_ID, "consumption").daily_value(day, day) == 1000
+
+    yesterday = TODAY - datetime.timedelta(days=1)
+    hc = stat_snapshot(db, USAGE_POINT_ID, "consumption").rollup_value(yesterday, yesterday, "hc")
+    # The reading of 23h00 was 1 W over 30 minutes (0.5 Wh), it becomes 2000 W (1000 Wh).
+    db.insert_detail(USAGE_POINT_ID, yesterday + datetime.timedelta(hours=23), 2000, 30, "HC")
+    hc_after = stat_snapshot(db, USAGE_POINT_ID, "consumption").rollup_value(yesterday, yesterday, "hc")
+    assert hc_after == pytest.approx(hc - 0.5 + 1000)
+
+
+def test_snapshot_load_does_not_block_writes(db, mocker):
+    import threading
+
+    from models.stat import StatSnapshot, stat_snapshot
+
+    day = BEGIN + datetime.timedelta(days=13)
+    stream_daily_all = db.stream_daily_all
+
+    def write_during_load(*args, **kwargs):
+        # A write of another thread during the load: it would wait for the end of the load if the lock was held.
+        writer = threading.Thread(target=db.insert_daily, args=(USAGE_POINT_ID, day, 1000))
+        writer.start()
+        writer.join(timeout=10)
+        assert not writer.is_alive()
+        return stream_daily_all(*args, **kwargs)
+
+    mocker.patch.object(db, "stream_daily_all", side_effect=write_during_load)
+    snapshot = StatSnapshot(db, USAGE_POINT_ID, "consumption")
+    assert snapshot.version != db.readings_version(USAGE_POINT_ID)
+
+    mocker.stopall()
+    assert stat_snapshot(db, USAGE_POINT_ID, "consumption").daily_value(day, day) == 1000
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_snapshot_backends(db, backend):
+    from models.stat import StatSnapshot
+
+    if backend == "numpy":
+        pytest.importorskip("numpy")
+    db.insert_daily_bulk(
+        USAGE_POINT_ID,
+        [
+            {"date": TODAY - datetime.timedelta(days=day), "value": 1000 + day % 5, "event_date": None}
+            for day in range(30)
+        ],
+        "consumption_max_power",
+    )
+    snapshot = StatSnapshot(db, USAGE_POINT_ID, "consumption", backend=backend)
+    reference = StatSnapshot(db, USAGE_POINT_ID, "consumption", backend="python")
+    for days in [1, 7, 31, 365, 1000]:
+        begin = TODAY - datetime.timedelta(days=days)
+        assert snapshot.daily_value(begin, TODAY) == reference.daily_value(begin, TODAY)
+        assert type(snapshot.daily_value(begin, TODAY)) is int
+        for column in StatSnapshot.ROLLUP_COLUMNS:
+            assert snapshot.rollup_value(begin, TODAY, column) == pytest.approx(
+                reference.rollup_value(begin, TODAY, column)
+            )
+        assert snapshot.max_power(begin) == reference.max_power(begin)
+    assert snapshot.max_power(TODAY - datetime.timedelta(days=31)) == (None, None)
+
+
+def test_stat_reads_max_power(db, mocker):
+    from models.stat import Stat
+
+    yesterday = TODAY - datetime.timedelta(days=1)
+    event_date = yesterday + datetime.timedelta(hours=19, minutes=12)
+    db.insert_daily_max_power(USAGE_POINT_ID, yesterday, event_date, 7000)
+    stat = Stat(USAGE_POINT_ID, "production")
+    get_daily_max_power_range = mocker.spy(db, "get_daily_max_power_range")
+    assert stat.max_power(0)["value"] == 7000
+    assert stat.max_power_time(0)["value"] == event_date.strftime("%Y-%m-%d %H:%M:%S")
+    assert stat.max_power(1)["value"] == 0
+    assert stat.max_power_time(1)["value"] is None
+    assert get_daily_max_power_range.call_count == 0
+
+    # The snapshot follows the writes of the maximum power.
+    db.reset_daily_max_power(USAGE_POINT_ID, yesterday)
+    assert stat.max_power(0)["value"] == 0
+    assert stat.max_power_time(0)["value"] == yesterday.strftime("%Y-%m-%d %H:%M:%S")